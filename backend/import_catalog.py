@@ -0,0 +1,78 @@
+"""
+Bulk catalog import for Kantik Tracks Studio
+
+Sends a CSV of song metadata and an optional ZIP of PDFs to
+POST /api/admin/songs/import and prints the per-row report.
+
+    python import_catalog.py songs.csv --zip pdfs.zip --api http://localhost:8001/api
+    python import_catalog.py songs.csv --zip pdfs.zip --dry-run
+
+CSV columns: number, title, language (fr|ht), keyOriginal, tempo, tags (separated
+by ';'), accessTier (STANDARD|PREMIUM). PDFs are matched by the song number at the
+start of the file name (012.pdf, 12-chords.pdf, 12_lyrics.pdf).
+Admin credentials come from --email/--password or ADMIN_EMAIL/ADMIN_PASSWORD.
+"""
+
+import os
+import sys
+import argparse
+
+import requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import songs and PDFs into Kantik Tracks Studio")
+    parser.add_argument("csv", help="CSV file of song metadata")
+    parser.add_argument("--zip", dest="archive", help="ZIP file of PDFs named by song number")
+    parser.add_argument("--api", default=os.environ.get("KANTIK_API_URL", "http://localhost:8001/api"))
+    parser.add_argument("--email", default=os.environ.get("ADMIN_EMAIL"))
+    parser.add_argument("--password", default=os.environ.get("ADMIN_PASSWORD"))
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    parser.add_argument("--optimize", choices=["yes", "no"], help="Override PDF optimisation for this import")
+    args = parser.parse_args()
+
+    if not args.email or not args.password:
+        parser.error("admin credentials are required (--email/--password or ADMIN_EMAIL/ADMIN_PASSWORD)")
+
+    login = requests.post(f"{args.api}/auth/login", json={"email": args.email, "password": args.password}, timeout=30)
+    if login.status_code != 200:
+        sys.exit(f"Login failed: {login.status_code} {login.text}")
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    data = {"dryRun": "true" if args.dry_run else "false"}
+    if args.optimize:
+        data["optimize"] = "true" if args.optimize == "yes" else "false"
+
+    with open(args.csv, "rb") as catalog:
+        files = {"catalog": (os.path.basename(args.csv), catalog, "text/csv")}
+        archive = open(args.archive, "rb") if args.archive else None
+        try:
+            if archive:
+                files["archive"] = (os.path.basename(args.archive), archive, "application/zip")
+            response = requests.post(f"{args.api}/admin/songs/import", headers=headers, data=data, files=files, timeout=3600)
+        finally:
+            if archive:
+                archive.close()
+
+    if response.status_code != 200:
+        sys.exit(f"Import failed: {response.status_code} {response.text}")
+    report = response.json()
+
+    for row in report["rows"]:
+        pdfs = ", ".join(f"{kind}={result}" for kind, result in row.get("pdfs", {}).items())
+        errors = "; ".join(row["errors"])
+        print(f"row {row['row']:>4}  #{row.get('number') or '?':<5} {row['status']:<10} {row.get('songId', '')}  {pdfs}{errors}")
+    for name in report["unmatchedFiles"]:
+        print(f"unmatched file: {name}")
+
+    summary = report["summary"]
+    print(
+        f"\n{'Dry run: ' if report['dryRun'] else ''}"
+        f"{summary['created']} created, {summary['updated']} updated, "
+        f"{summary['unchanged']} unchanged, {summary['error']} with errors; PDFs: {summary['pdfs']}"
+    )
+    sys.exit(1 if summary["error"] or summary["pdfs"].get("error") else 0)
+
+
+if __name__ == "__main__":
+    main()
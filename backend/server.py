@@ -1,22 +1,26 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, BackgroundTasks, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import Response, FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 import base64
-import io
-import fitz  # PyMuPDF
-from PIL import Image, ImageDraw, ImageFont
+import hashlib
+import asyncio
+import zipfile
+from urllib.parse import quote
+from collections import defaultdict
 
 # Email service imports
 from services.email import (
@@ -24,13 +28,40 @@ from services.email import (
     send_payment_approved_email,
     send_payment_rejected_email
 )
+from services.dates import IsoDatetime, utcnow, parse_datetime, ensure_ttl_indexes
+from services.transactions import run_in_transaction
+from services.entitlements import ENTITLEMENT_FIELDS, team_entitlements, apply_team_entitlement, is_entitlement_active
+from services.playlist_ops import apply_playlist_ops, PlaylistOpError
+from services.workers import run_in_process, shutdown_pool, PDF_WORKERS
+from services.setlist_export import merge_setlist_pdf, export_cache_key, export_cache
+from services.zip_stream import stream_zip, safe_member_name
+from services.watermark import should_stamp, stamp_download, subscriber_footer
+from services.pdf_optimize import optimize_pdf, PDF_OPTIMIZE_ON_UPLOAD, PDF_MAX_IMAGE_DPI
+from services.song_search import song_search, extract_pdf_text, SEARCHABLE_TYPES
+from services.song_suggest import song_suggest
+from services.trending import trending_update, recompute_trending, TRENDING_INDEX
+from services.recommendations import rebuild_recommendations, next_run
+from services.download_rollups import (
+    record_downloads, ensure_rollup_state, backfill_rollups, reconcile_rollups, compact_downloads,
+    analytics_pipeline, all_time_downloads, ROLLUP_INDEX, DOWNLOADS_COMPACT_HOUR
+)
+from services.view_tracking import view_tracker, unique_viewers
+from services.favorites import favorite_song_ids, mark_favorites, apply_favorite_changes, FAVORITES_INDEX, FAVORITES_MAX_BATCH
+from services.catalog_import import parse_catalog_csv, match_pdf_members, song_changes, SONG_KEY_INDEX
+from services.delta_sync import changes_filter, encode_change_token, resource_manifest, InvalidChangeToken, MANIFEST_FIELDS
+from services.catalog_cache import catalog_version, catalog_etag, etag_matches, catalog_cache_headers, trending_window
+from services.fast_json import fast_response, parse_fields, field_projection
+from services.compression import CompressionMiddleware
+from services.catalog_facets import song_filters, facet_pipeline, facet_counts, facet_cache
+from services.previews import generate_pdf_preview, preview_resource, regenerate_previews
+from services.jobs import job_queue, JobContext, JOB_STATUSES, PRIORITY_HIGH, PRIORITY_LOW
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # JWT Config
@@ -38,6 +69,9 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'kantik-tracks-secret-key-change-in-pr
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
+# Reverse proxies in front of the app that append to X-Forwarded-For; 0 ignores the header
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
 # Create the main app
 app = FastAPI(title="Kantik Tracks Studio API")
 
@@ -63,13 +97,13 @@ class UserResponse(BaseModel):
     email: str
     displayName: str
     plan: Literal["FREE", "STANDARD", "TEAM"] = "FREE"
-    planExpiresAt: Optional[str] = None
-    graceUntil: Optional[str] = None
+    planExpiresAt: Optional[IsoDatetime] = None
+    graceUntil: Optional[IsoDatetime] = None
     teamId: Optional[str] = None
     roleInTeam: Optional[Literal["OWNER", "ADMIN", "MEMBER"]] = None
     role: Literal["USER", "ADMIN"] = "USER"
     isAdmin: bool = False  # Keep for backward compatibility
-    createdAt: str
+    createdAt: IsoDatetime
 
 class UserAdminUpdate(BaseModel):
     role: Optional[Literal["USER", "ADMIN"]] = None
@@ -107,12 +141,61 @@ class SongResponse(BaseModel):
     tags: List[str] = []
     accessTier: str
     active: bool = True
-    createdAt: str
-    updatedAt: str
+    createdAt: IsoDatetime
+    updatedAt: IsoDatetime
     downloadsCount: int = 0
     favoritesCount: int = 0
+    # Only for a signed-in caller
+    isFavorite: Optional[bool] = None
     resources: List[dict] = []
 
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class SongFacetsResponse(BaseModel):
+    language: List[FacetCount]
+    accessTier: List[FacetCount]
+    tags: List[FacetCount]
+    total: int
+
+class SongSuggestion(BaseModel):
+    id: str
+    number: Optional[int] = None
+    title: str
+    language: Optional[str] = None
+
+class FavoriteChanges(BaseModel):
+    add: List[str] = []
+    remove: List[str] = []
+
+class FavoriteChangesResult(BaseModel):
+    added: int
+    removed: int
+
+class FavoriteStatus(BaseModel):
+    songId: str
+    isFavorite: bool
+    favoritesCount: int
+
+class SongRecommendation(SongSuggestion):
+    score: float
+
+class SongSearchResult(BaseModel):
+    song: SongResponse
+    score: float
+    snippet: Optional[str] = None
+
+class SongChange(BaseModel):
+    id: str
+    deleted: bool = False
+    song: Optional[SongResponse] = None
+
+class SongChangesResponse(BaseModel):
+    changes: List[SongChange]
+    nextToken: Optional[str] = None
+    hasMore: bool = False
+
 class PlaylistCreate(BaseModel):
     name: str
     ownerType: Literal["USER", "TEAM"] = "USER"
@@ -121,6 +204,15 @@ class PlaylistUpdate(BaseModel):
     name: Optional[str] = None
     songIds: Optional[List[str]] = None
 
+class PlaylistOp(BaseModel):
+    op: Literal["move", "insert", "remove"]
+    songId: str
+    index: Optional[int] = Field(default=None, ge=0)  # target position for move/insert
+
+class PlaylistPatch(BaseModel):
+    version: int  # version the client's ops were computed against
+    ops: List[PlaylistOp] = Field(min_length=1, max_length=200)
+
 class PlaylistResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -128,8 +220,9 @@ class PlaylistResponse(BaseModel):
     ownerType: str
     ownerId: str
     songIds: List[str] = []
-    createdAt: str
-    updatedAt: str
+    version: int = 0
+    createdAt: IsoDatetime
+    updatedAt: IsoDatetime
 
 class TeamCreate(BaseModel):
     name: str
@@ -145,7 +238,7 @@ class TeamResponse(BaseModel):
     ownerUid: str
     maxMembers: int = 7
     members: List[dict] = []
-    createdAt: str
+    createdAt: IsoDatetime
 
 class PaymentCreate(BaseModel):
     planRequested: Literal["STANDARD", "TEAM"]
@@ -176,9 +269,65 @@ class PaymentResponse(BaseModel):
     receiptPath: Optional[str] = None
     status: str
     reviewedBy: Optional[str] = None
-    reviewedAt: Optional[str] = None
+    reviewedAt: Optional[IsoDatetime] = None
     note: Optional[str] = None
-    createdAt: str
+    createdAt: IsoDatetime
+
+class DownloadBucket(BaseModel):
+    bucket: str
+    count: int
+
+class DownloadBreakdown(BaseModel):
+    key: str
+    label: Optional[str] = None
+    count: int
+
+class DownloadAnalyticsResponse(BaseModel):
+    granularity: str
+    start: str
+    end: str
+    total: int
+    series: List[DownloadBucket]
+    breakdown: List[DownloadBreakdown] = []
+
+class SongViewStats(BaseModel):
+    songId: str
+    label: Optional[str] = None
+    uniqueViewers: int
+    views: int
+    downloads: int
+    conversion: Optional[float] = None
+
+class ViewAnalyticsResponse(BaseModel):
+    start: str
+    end: str
+    views: int
+    downloads: int
+    songs: List[SongViewStats]
+
+class PreviewRegenerateRequest(BaseModel):
+    force: bool = False
+
+class JobResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    type: str
+    payload: dict = {}
+    status: str
+    priority: int = 0
+    attempts: int = 0
+    maxAttempts: int
+    progress: dict = {}
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    cancelRequested: bool = False
+    leaseOwner: Optional[str] = None
+    createdBy: Optional[str] = None
+    runAt: IsoDatetime
+    startedAt: Optional[IsoDatetime] = None
+    heartbeatAt: Optional[IsoDatetime] = None
+    finishedAt: Optional[IsoDatetime] = None
+    createdAt: IsoDatetime
 
 # ============ HELPERS ============
 
@@ -203,9 +352,40 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0, "password": 0})
-        return user
     except:
         return None
+    
+    # Team members get the team's plan, resolved from the (cached) team entitlement
+    if user and user.get("teamId"):
+        entitlement = await team_entitlements.get(db, user["teamId"])
+        user = apply_team_entitlement(user, entitlement)
+    return user
+
+def token_user_id(request: Request) -> Optional[str]:
+    """The user id in a valid bearer token, without loading the user"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])["sub"]
+        except Exception:
+            return None
+    return None
+
+def viewer_key(request: Request) -> str:
+    """
+    Who is viewing, for unique-viewer counts: the token's user id when there
+    is one, else the client address and agent.
+    """
+    uid = token_user_id(request)
+    if uid:
+        return f"u:{uid}"
+    address = request.client.host if request.client else ""
+    if TRUSTED_PROXY_HOPS:
+        # Entries left of what our own proxies appended are client-supplied
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            address = forwarded[-TRUSTED_PROXY_HOPS]
+    return f"a:{address}|{request.headers.get('user-agent', '')}"
 
 async def require_auth(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     user = await get_current_user(credentials)
@@ -221,19 +401,28 @@ async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(secu
     return user
 
 def is_plan_active(user: dict) -> bool:
-    """Check if user's plan is active (not expired or within grace period)"""
+    """
+    Check if user's plan is active (not expired or within grace period).
+    Expects the user as returned by get_current_user, with team entitlements applied.
+    """
     if user.get("plan") == "FREE":
         return True
-    
-    expires_at = user.get("planExpiresAt")
-    grace_until = user.get("graceUntil")
-    now = datetime.now(timezone.utc).isoformat()
-    
-    if expires_at and expires_at >= now:
-        return True
-    if grace_until and grace_until >= now:
-        return True
-    return False
+    return is_entitlement_active(user)
+
+def attachment_headers(filename: str) -> dict:
+    """Content-Disposition for a download, safe for non-ASCII filenames"""
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename or 'download')}"}
+
+def requested_fields(fields: Optional[str], model) -> Optional[Tuple[str, ...]]:
+    """Validated `fields=` selection for a listing, or None for full documents"""
+    try:
+        return parse_fields(fields, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
 
 def can_download(user: dict, access_tier: str) -> bool:
     """Check if user can download a song based on their plan and song tier"""
@@ -256,7 +445,7 @@ async def register(data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     user = {
         "id": user_id,
@@ -289,6 +478,8 @@ async def login(data: UserLogin):
     
     token = create_token(user["id"], user["email"], user.get("isAdmin", False))
     user_response = {k: v for k, v in user.items() if k not in ["password", "_id"]}
+    if user.get("teamId"):
+        user_response = apply_team_entitlement(user_response, await team_entitlements.get(db, user["teamId"]))
     
     return {"token": token, "user": user_response}
 
@@ -298,16 +489,47 @@ async def get_me(user: dict = Depends(require_auth)):
 
 # ============ SONGS ROUTES ============
 
-@api_router.get("/songs", response_model=List[SongResponse])
-async def get_songs(
-    search: Optional[str] = None,
-    language: Optional[str] = None,
-    accessTier: Optional[str] = None,
-    tags: Optional[str] = None,
-    sort: Optional[str] = "number"
-):
+async def catalog_cache_check(request: Request, *parts) -> Tuple[Optional[Response], dict]:
+    """
+    Catalog ETag and Cache-Control headers for this representation, plus a 304
+    response when the client already has it. Usually answered without a query.
+    """
+    etag = catalog_etag(await catalog_version.current(db), *parts)
+    headers = catalog_cache_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
+
+async def attach_resources(songs: List[dict]) -> List[dict]:
+    """Each song's resource metadata (no file bodies), with one query for the whole page"""
+    by_song = defaultdict(list)
+    async for resource in db.resources.find({"songId": {"$in": [song["id"] for song in songs]}}, {"_id": 0, "data": 0}):
+        by_song[resource["songId"]].append(resource)
+    for song in songs:
+        song["resources"] = by_song[song["id"]]
+    return songs
+
+async def favorites_viewer(request: Request) -> Optional[dict]:
+    """
+    The signed-in caller's id and favourites version, for listings that mark
+    favourites. The version goes into the ETag so a cached page is not
+    served after the caller's favourites change.
+    """
+    uid = token_user_id(request)
+    if not uid:
+        return None
+    user = await db.users.find_one({"id": uid}, {"_id": 0, "favoritesVersion": 1})
+    if user is None:
+        return None
+    return {"uid": uid, "version": user.get("favoritesVersion", 0)}
+
+def personal_cache_headers(headers: dict) -> dict:
+    """Catalog headers for a response that includes per-user fields"""
+    return {**headers, "Cache-Control": "private, no-cache"}
+
+def catalog_search_filter(search: Optional[str]) -> dict:
+    """Active songs matching the catalog search box (title or hymn number)"""
     query = {"active": True}
-    
     if search:
         query["$or"] = [
             {"title": {"$regex": search, "$options": "i"}},
@@ -318,224 +540,450 @@ async def get_songs(
                 {"title": {"$regex": search, "$options": "i"}},
                 {"number": int(search)}
             ]
+    return query
+
+def new_song_document(fields: dict, now) -> dict:
+    """A new song from validated SongCreate fields"""
+    title_slug = fields["title"].lower().replace(' ', '-').replace(',', '').replace("'", '')[:40]
+    return {
+        "id": f"{fields['number']:02d}-{title_slug}",
+        **fields,
+        "active": True,
+        "createdAt": now,
+        "updatedAt": now,
+        "changedAt": now,
+        "downloadsCount": 0,
+        "favoritesCount": 0,
+        "trendingLog": None
+    }
+
+@api_router.get("/songs", response_model=List[SongResponse])
+async def get_songs(
+    request: Request,
+    search: Optional[str] = None,
+    language: Optional[str] = None,
+    accessTier: Optional[str] = None,
+    tags: Optional[str] = None,
+    sort: Optional[str] = "number",
+    fields: Optional[str] = None
+):
+    selected = requested_fields(fields, SongResponse)
+    viewer = await favorites_viewer(request) if selected is None or "isFavorite" in selected else None
+    not_modified, cache_headers = await catalog_cache_check(
+        request, "songs", search, language, accessTier, tags, sort, selected,
+        viewer and (viewer["uid"], viewer["version"]),
+        trending_window() if sort == "popular" else None
+    )
+    if viewer:
+        cache_headers = personal_cache_headers(cache_headers)
+        if not_modified:
+            not_modified.headers.update(cache_headers)
+    if not_modified:
+        return not_modified
     
-    if language:
-        query["language"] = language
-    
-    if accessTier:
-        query["accessTier"] = accessTier
-    
-    if tags:
-        tag_list = [t.strip() for t in tags.split(",")]
-        query["tags"] = {"$in": tag_list}
+    query = {**catalog_search_filter(search), **song_filters(language, accessTier, tags)}
     
-    sort_field = "number" if sort == "number" else "downloadsCount" if sort == "popular" else "createdAt"
+    # "popular" is trending: downloads with exponential time decay
+    sort_field = "number" if sort == "number" else "trendingLog" if sort == "popular" else "createdAt"
     sort_order = -1 if sort in ["popular", "newest"] else 1
     
-    songs = await db.songs.find(query, {"_id": 0}).sort(sort_field, sort_order).to_list(1000)
+    songs = await db.songs.find(query, field_projection(selected)).sort(sort_field, sort_order).to_list(1000)
     
-    # Attach resources to each song
-    for song in songs:
-        resources = await db.resources.find({"songId": song["id"]}, {"_id": 0}).to_list(100)
-        song["resources"] = resources
+    if selected is None or "resources" in selected:
+        await attach_resources(songs)
+    if viewer:
+        mark_favorites(songs, await favorite_song_ids(db, viewer["uid"], [song["id"] for song in songs]))
     
-    return songs
+    return fast_response(songs, SongResponse, "get_songs", headers=cache_headers, fields=selected)
+
+@api_router.get("/songs/facets", response_model=SongFacetsResponse)
+async def get_song_facets(
+    request: Request,
+    response: Response,
+    search: Optional[str] = None,
+    language: Optional[str] = None,
+    accessTier: Optional[str] = None,
+    tags: Optional[str] = None
+):
+    """Filter counts for the catalog; each facet ignores its own filter"""
+    key = ("facets", search, language, accessTier, tags)
+    not_modified, cache_headers = await catalog_cache_check(request, *key)
+    if not_modified:
+        return not_modified
+    response.headers.update(cache_headers)
+    
+    version = await catalog_version.current(db)
+    counts = facet_cache.get(version, key)
+    if counts is None:
+        pipeline = facet_pipeline(catalog_search_filter(search), song_filters(language, accessTier, tags))
+        results = await db.songs.aggregate(pipeline).to_list(1)
+        counts = facet_counts(results[0] if results else None)
+        facet_cache.put(version, key, counts)
+    return counts
 
 @api_router.get("/songs/featured", response_model=List[SongResponse])
-async def get_featured_songs():
-    songs = await db.songs.find({"active": True}, {"_id": 0}).sort("downloadsCount", -1).limit(6).to_list(6)
-    for song in songs:
-        resources = await db.resources.find({"songId": song["id"]}, {"_id": 0}).to_list(100)
-        song["resources"] = resources
+async def get_featured_songs(request: Request, response: Response):
+    viewer = await favorites_viewer(request)
+    not_modified, cache_headers = await catalog_cache_check(
+        request, "featured", viewer and (viewer["uid"], viewer["version"]), trending_window()
+    )
+    if viewer:
+        cache_headers = personal_cache_headers(cache_headers)
+        if not_modified:
+            not_modified.headers.update(cache_headers)
+    if not_modified:
+        return not_modified
+    response.headers.update(cache_headers)
+    
+    songs = await db.songs.find({"active": True}, {"_id": 0}).sort("trendingLog", -1).limit(6).to_list(6)
+    await attach_resources(songs)
+    if viewer:
+        mark_favorites(songs, await favorite_song_ids(db, viewer["uid"], [song["id"] for song in songs]))
     return songs
 
+@api_router.get("/songs/suggest", response_model=List[SongSuggestion])
+async def suggest_songs(q: str, limit: int = 8):
+    """Autocomplete on hymn number or the start of a title, answered from memory"""
+    await song_suggest.refresh(db)
+    return song_suggest.suggest(q, limit=min(max(limit, 1), 20))
+
+@api_router.get("/songs/search", response_model=List[SongSearchResult])
+async def search_songs(q: str, limit: int = 20):
+    """Full-text search over titles, lyrics and chord charts, best matches first"""
+    await song_search.refresh(db)
+    hits = song_search.search(q, limit=min(max(limit, 1), 50))
+    if not hits:
+        return []
+    
+    song_ids = [song_id for song_id, _, _ in hits]
+    songs = await db.songs.find({"id": {"$in": song_ids}, "active": True}, {"_id": 0}).to_list(len(song_ids))
+    resources = await db.resources.find({"songId": {"$in": song_ids}}, {"_id": 0, "data": 0}).to_list(len(song_ids) * 10)
+    by_id = {song["id"]: {**song, "resources": []} for song in songs}
+    for resource in resources:
+        if resource["songId"] in by_id:
+            by_id[resource["songId"]]["resources"].append(resource)
+    
+    return [
+        {"song": by_id[song_id], "score": score, "snippet": snippet}
+        for song_id, score, snippet in hits if song_id in by_id
+    ]
+
+@api_router.get("/songs/changes", response_model=SongChangesResponse)
+async def get_song_changes(since: Optional[str] = None, limit: int = 200):
+    """
+    Songs created, updated or deactivated since `since`, with resource manifests.
+    Start without `since` for the full catalog, then pass back `nextToken`.
+    """
+    try:
+        query = changes_filter(since, utcnow())
+    except InvalidChangeToken:
+        raise HTTPException(status_code=400, detail="Invalid change token")
+    limit = min(max(limit, 1), 1000)
+    
+    songs = await db.songs.find(query, {"_id": 0}).sort([("changedAt", 1), ("id", 1)]).limit(limit).to_list(limit)
+    active_ids = [song["id"] for song in songs if song.get("active", True)]
+    manifests = {}
+    if active_ids:
+        async for resource in db.resources.find(
+            {"songId": {"$in": active_ids}},
+            {"_id": 0, "songId": 1, **{field: 1 for field in MANIFEST_FIELDS}}
+        ):
+            manifests.setdefault(resource["songId"], []).append(resource_manifest(resource))
+    
+    changes = []
+    for song in songs:
+        if song.get("active", True):
+            changes.append({"id": song["id"], "song": {**song, "resources": manifests.get(song["id"], [])}})
+        else:
+            changes.append({"id": song["id"], "deleted": True})
+    
+    next_token = since
+    if songs and songs[-1].get("changedAt"):
+        next_token = encode_change_token(parse_datetime(songs[-1]["changedAt"]), songs[-1]["id"])
+    return {"changes": changes, "nextToken": next_token, "hasMore": len(songs) == limit}
+
+@api_router.get("/songs/{song_id}/recommendations", response_model=List[SongRecommendation])
+async def get_song_recommendations(song_id: str, limit: int = 6):
+    """Songs often downloaded or set-listed together with this one, precomputed nightly"""
+    entry = await db.song_recommendations.find_one({"songId": song_id}, {"_id": 0, "neighbours": 1})
+    if not entry:
+        return []
+    neighbours = entry["neighbours"][:min(max(limit, 1), 20)]
+    scores = {n["songId"]: n["score"] for n in neighbours}
+    songs = await db.songs.find(
+        {"id": {"$in": list(scores)}, "active": True},
+        {"_id": 0, "id": 1, "number": 1, "title": 1, "language": 1}
+    ).to_list(len(scores))
+    return sorted(({**song, "score": scores[song["id"]]} for song in songs), key=lambda song: -song["score"])
+
 @api_router.get("/songs/{song_id}", response_model=SongResponse)
-async def get_song(song_id: str):
+async def get_song(song_id: str, request: Request, response: Response):
+    viewer = await favorites_viewer(request)
+    not_modified, cache_headers = await catalog_cache_check(request, "song", song_id, viewer and (viewer["uid"], viewer["version"]))
+    if viewer:
+        cache_headers = personal_cache_headers(cache_headers)
+        if not_modified:
+            not_modified.headers.update(cache_headers)
+    if not_modified:
+        # A revalidation is still a view; only known songs get a sketch.
+        # The refresh is a no-op while the index is fresh, and picks up new songs otherwise
+        await song_suggest.refresh(db)
+        if song_id in song_suggest:
+            view_tracker.record(song_id, viewer_key(request))
+        return not_modified
+    response.headers.update(cache_headers)
+    
     song = await db.songs.find_one({"id": song_id, "active": True}, {"_id": 0})
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
+    view_tracker.record(song_id, viewer_key(request))
     
-    resources = await db.resources.find({"songId": song_id}, {"_id": 0}).to_list(100)
+    resources = await db.resources.find({"songId": song_id}, {"_id": 0, "data": 0}).to_list(100)
     song["resources"] = resources
+    if viewer:
+        mark_favorites([song], await favorite_song_ids(db, viewer["uid"], [song_id]))
     
     return song
 
 @api_router.post("/songs", response_model=SongResponse)
 async def create_song(data: SongCreate, user: dict = Depends(require_admin)):
-    title_slug = data.title.lower().replace(' ', '-').replace(',', '').replace("'", '')[:40]
-    song_id = f"{data.number:02d}-{title_slug}"
-    now = datetime.now(timezone.utc).isoformat()
+    song = new_song_document(data.model_dump(), utcnow())
     
-    song = {
-        "id": song_id,
-        **data.model_dump(),
-        "active": True,
-        "createdAt": now,
-        "updatedAt": now,
-        "downloadsCount": 0,
-        "favoritesCount": 0
-    }
-    
-    await db.songs.insert_one(song)
+    try:
+        await db.songs.insert_one(song)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="A song with this number and language already exists")
+    await catalog_version.bump(db)
+    song_search.mark_stale()
+    song_suggest.mark_stale()
     song["resources"] = []
     return {k: v for k, v in song.items() if k != "_id"}
 
 @api_router.put("/songs/{song_id}", response_model=SongResponse)
 async def update_song(song_id: str, data: SongUpdate, user: dict = Depends(require_admin)):
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
+    update_data["updatedAt"] = update_data["changedAt"] = utcnow()
     
-    result = await db.songs.update_one({"id": song_id}, {"$set": update_data})
+    try:
+        result = await db.songs.update_one({"id": song_id}, {"$set": update_data})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="A song with this number and language already exists")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Song not found")
+    await catalog_version.bump(db)
+    song_search.mark_stale()
+    song_suggest.mark_stale()
     
     song = await db.songs.find_one({"id": song_id}, {"_id": 0})
-    resources = await db.resources.find({"songId": song_id}, {"_id": 0}).to_list(100)
+    resources = await db.resources.find({"songId": song_id}, {"_id": 0, "data": 0}).to_list(100)
     song["resources"] = resources
     return song
 
 @api_router.delete("/songs/{song_id}")
 async def delete_song(song_id: str, user: dict = Depends(require_admin)):
-    result = await db.songs.update_one({"id": song_id}, {"$set": {"active": False}})
+    now = utcnow()
+    result = await db.songs.update_one({"id": song_id}, {"$set": {"active": False, "updatedAt": now, "changedAt": now}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Song not found")
+    await catalog_version.bump(db)
+    song_search.mark_stale()
+    song_suggest.mark_stale()
     return {"message": "Song deleted"}
 
 # ============ RESOURCES ROUTES ============
 
 # ============ PDF PREVIEW GENERATION ============
 
-def generate_pdf_preview(pdf_data: bytes, add_watermark: bool = True) -> bytes:
-    """
-    Generate a preview image from the first page of a PDF.
-    Returns JPEG image bytes.
-    """
-    try:
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
-        
-        # Get first page
-        page = pdf_document[0]
-        
-        # Render page to image at 150 DPI for good quality
-        # Calculate zoom to get approximately 1000px width
-        zoom = 1000 / page.rect.width
-        matrix = fitz.Matrix(zoom, zoom)
-        
-        # Render to pixmap
-        pixmap = page.get_pixmap(matrix=matrix, alpha=False)
-        
-        # Convert to PIL Image
-        img = Image.frombytes("RGB", [pixmap.width, pixmap.height], pixmap.samples)
-        
-        # Add watermark if requested
-        if add_watermark:
-            draw = ImageDraw.Draw(img)
-            watermark_text = "PREVIEW"
-            
-            # Calculate font size based on image width
-            font_size = int(img.width / 8)
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-            
-            # Get text bounding box
-            bbox = draw.textbbox((0, 0), watermark_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            # Position text in center
-            x = (img.width - text_width) / 2
-            y = (img.height - text_height) / 2
-            
-            # Draw semi-transparent watermark (gray with low opacity effect)
-            draw.text((x, y), watermark_text, font=font, fill=(200, 200, 200, 80))
-        
-        # Convert to JPEG bytes
-        output = io.BytesIO()
-        img.save(output, format="JPEG", quality=80)
-        output.seek(0)
-        
-        pdf_document.close()
-        return output.getvalue()
-        
-    except Exception as e:
-        logging.error(f"Failed to generate PDF preview: {e}")
-        return None
-
-async def save_preview_resource(song_id: str, preview_data: bytes):
+async def save_preview_resource(song_id: str, preview_data: bytes, source_sha256: Optional[str] = None):
     """Save the generated preview as a resource in the database."""
-    resource_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
-    
-    resource = {
-        "id": resource_id,
-        "songId": song_id,
-        "type": "PREVIEW_IMAGE",
-        "filename": "preview.jpg",
-        "contentType": "image/jpeg",
-        "data": base64.b64encode(preview_data).decode(),
-        "autoGenerated": True,
-        "updatedAt": now
-    }
+    resource = preview_resource(song_id, preview_data, source_sha256)
     
     # Remove existing auto-generated preview
     await db.resources.delete_many({"songId": song_id, "type": "PREVIEW_IMAGE", "autoGenerated": True})
     await db.resources.insert_one(resource)
+    await db.songs.update_one({"id": song_id}, {"$set": {"changedAt": resource["updatedAt"]}})
+    await catalog_version.bump(db)
     
     logging.info(f"Auto-generated preview saved for song {song_id}")
 
+# ============ BACKGROUND JOBS ============
+
+@job_queue.handler("render_preview")
+async def render_preview_job(job: dict, ctx: JobContext):
+    """Render the preview image from the song's current chord chart"""
+    song_id = job["payload"]["songId"]
+    source = await db.resources.find_one({"songId": song_id, "type": "CHORDS_PDF"}, {"_id": 0, "data": 1, "sha256": 1})
+    if not source:
+        return {"skipped": "No CHORDS_PDF"}
+    
+    preview_data = await run_in_process(generate_pdf_preview, base64.b64decode(source["data"]), True)
+    if not preview_data:
+        raise RuntimeError("Preview rendering failed")
+    await save_preview_resource(song_id, preview_data, source.get("sha256"))
+    return {"size": len(preview_data)}
+
+@job_queue.handler("regenerate_previews")
+async def regenerate_previews_job(job: dict, ctx: JobContext):
+    """Re-render every preview whose chord chart or preview style changed"""
+    return await regenerate_previews(db, ctx, force=job["payload"].get("force", False))
+
+@job_queue.handler("recompute_trending")
+async def recompute_trending_job(job: dict, ctx: JobContext):
+    """Rebuild trending scores from the downloads log"""
+    result = await recompute_trending(db, ctx)
+    await catalog_version.bump(db)
+    return result
+
+@job_queue.handler("rebuild_recommendations")
+async def rebuild_recommendations_job(job: dict, ctx: JobContext):
+    """Fold new downloads and current playlists into song recommendations"""
+    # Book the next night first so a failed run does not end the schedule
+    await schedule_recommendations()
+    return await rebuild_recommendations(db, client, ctx)
+
+@job_queue.handler("backfill_download_rollups")
+async def backfill_download_rollups_job(job: dict, ctx: JobContext):
+    """Add downloads recorded before rollups existed to the rollups"""
+    return await backfill_rollups(db, client, ctx)
+
+@job_queue.handler("compact_downloads")
+async def compact_downloads_job(job: dict, ctx: JobContext):
+    """Correct the rollups from recent events, then drop raw events past the retention window"""
+    await schedule_compaction()
+    now = utcnow()
+    reconciled = await reconcile_rollups(db, now, ctx=ctx)
+    return {"reconciled": reconciled, **await compact_downloads(db, now, ctx=ctx)}
+
+async def schedule_compaction():
+    await job_queue.enqueue(
+        db, "compact_downloads", {}, priority=PRIORITY_LOW,
+        dedupe_key="nightly", run_at=next_run(utcnow(), DOWNLOADS_COMPACT_HOUR)
+    )
+
+async def schedule_recommendations():
+    await job_queue.enqueue(
+        db, "rebuild_recommendations", {}, priority=PRIORITY_LOW,
+        dedupe_key="nightly", run_at=next_run(utcnow())
+    )
+
+@job_queue.handler("index_text")
+async def index_text_job(job: dict, ctx: JobContext):
+    """Extract a PDF's text in the worker pool and store it for the search index"""
+    song_id, resource_type = job["payload"]["songId"], job["payload"]["resourceType"]
+    source = await db.resources.find_one({"songId": song_id, "type": resource_type}, {"_id": 0, "data": 1, "sha256": 1})
+    if not source:
+        return {"skipped": f"No {resource_type}"}
+    
+    pdf_data = base64.b64decode(source["data"])
+    text = await run_in_process(extract_pdf_text, pdf_data)
+    await db.song_texts.update_one(
+        {"songId": song_id, "resourceType": resource_type},
+        {"$set": {
+            "text": text,
+            "sha256": source.get("sha256") or hashlib.sha256(pdf_data).hexdigest(),
+            "updatedAt": utcnow()
+        }},
+        upsert=True
+    )
+    song_search.mark_stale()
+    return {"characters": len(text)}
+
 # ============ RESOURCES ROUTES ============
 
-@api_router.post("/songs/{song_id}/resources")
-async def upload_resource(
+async def store_resource(
     song_id: str,
-    background_tasks: BackgroundTasks,
-    resourceType: str = Form(...),
-    file: UploadFile = File(...),
-    user: dict = Depends(require_admin)
+    resource_type: str,
+    filename: str,
+    content_type: Optional[str],
+    content: bytes,
+    optimize: Optional[bool],
+    user: dict
 ):
-    song = await db.songs.find_one({"id": song_id})
-    if not song:
-        raise HTTPException(status_code=404, detail="Song not found")
-    
+    """
+    Store an uploaded file as the song's resource of that type, then queue
+    text indexing and preview rendering. Returns (resource, optimization, preview job).
+    """
     # Store file as base64 in MongoDB for MVP (in production, use cloud storage)
-    content = await file.read()
-    resource_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    original_size = len(content)
+    original_sha256 = hashlib.sha256(content).hexdigest()
+    
+    optimization = None
+    is_pdf = content_type == "application/pdf" or resource_type.endswith("_PDF")
+    if is_pdf and (PDF_OPTIMIZE_ON_UPLOAD if optimize is None else optimize):
+        try:
+            content, optimization = await run_in_process(optimize_pdf, content, PDF_MAX_IMAGE_DPI)
+        except Exception as e:
+            # A PDF PyMuPDF cannot rewrite is still stored as uploaded
+            logger.warning(f"PDF optimisation failed for {filename}: {e}")
     
+    sha256 = hashlib.sha256(content).hexdigest()
     resource = {
-        "id": resource_id,
+        "id": str(uuid.uuid4()),
         "songId": song_id,
-        "type": resourceType,
-        "filename": file.filename,
-        "contentType": file.content_type,
+        "type": resource_type,
+        "filename": filename,
+        "contentType": content_type,
         "data": base64.b64encode(content).decode(),
-        "updatedAt": now
+        "sha256": sha256,
+        "size": len(content),
+        "originalSha256": original_sha256,
+        "originalSize": original_size,
+        # Only when the rewritten bytes were kept (no saving keeps the upload)
+        "optimized": sha256 != original_sha256,
+        "updatedAt": utcnow()
     }
     
     # Remove existing resource of same type
-    await db.resources.delete_many({"songId": song_id, "type": resourceType})
+    await db.resources.delete_many({"songId": song_id, "type": resource_type})
     await db.resources.insert_one(resource)
+    resource.pop("_id", None)
+    await db.songs.update_one({"id": song_id}, {"$set": {"changedAt": resource["updatedAt"]}})
+    await catalog_version.bump(db)
+    
+    if resource_type in SEARCHABLE_TYPES:
+        await job_queue.enqueue(
+            db, "index_text", {"songId": song_id, "resourceType": resource_type},
+            dedupe_key=f"{song_id}:{resource_type}", created_by=user["id"]
+        )
     
     # If this is a CHORDS_PDF, automatically generate preview
-    if resourceType == "CHORDS_PDF":
-        # Generate preview synchronously for immediate feedback
-        preview_data = generate_pdf_preview(content, add_watermark=True)
-        if preview_data:
-            await save_preview_resource(song_id, preview_data)
-            return {
-                "message": "Resource uploaded and preview generated", 
-                "id": resource_id,
-                "previewGenerated": True
-            }
+    preview_job = None
+    if resource_type == "CHORDS_PDF":
+        preview_job = await job_queue.enqueue(
+            db, "render_preview", {"songId": song_id},
+            priority=PRIORITY_HIGH, dedupe_key=song_id, created_by=user["id"]
+        )
+    
+    return resource, optimization, preview_job
+
+@api_router.post("/songs/{song_id}/resources")
+async def upload_resource(
+    song_id: str,
+    resourceType: str = Form(...),
+    file: UploadFile = File(...),
+    optimize: Optional[bool] = Form(None),
+    user: dict = Depends(require_admin)
+):
+    song = await db.songs.find_one({"id": song_id})
+    if not song:
+        raise HTTPException(status_code=404, detail="Song not found")
+    
+    content = await file.read()
+    resource, optimization, preview_job = await store_resource(
+        song_id, resourceType, file.filename, file.content_type, content, optimize, user
+    )
     
-    return {"message": "Resource uploaded", "id": resource_id, "previewGenerated": False}
+    return {
+        "message": "Resource uploaded",
+        "id": resource["id"],
+        "previewGenerated": False,
+        "previewJobId": preview_job["id"] if preview_job else None,
+        "optimization": optimization
+    }
 
 # Public endpoint for preview images (no auth required)
 @api_router.get("/songs/{song_id}/preview")
-async def get_preview_image(song_id: str):
+async def get_preview_image(song_id: str, request: Request):
     """
     Public endpoint to get preview image for a song.
     This allows the preview to be displayed without authentication.
@@ -543,6 +991,7 @@ async def get_preview_image(song_id: str):
     song = await db.songs.find_one({"id": song_id, "active": True})
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
+    view_tracker.record(song_id, viewer_key(request))
     
     resource = await db.resources.find_one(
         {"songId": song_id, "type": "PREVIEW_IMAGE"}, 
@@ -582,8 +1031,13 @@ async def get_preview_status(song_id: str):
 async def download_resource(
     song_id: str,
     resource_type: str,
+    format: Literal["json", "binary"] = "json",
     user: dict = Depends(require_auth)
 ):
+    """
+    Download a song resource, as base64 JSON (default) or as a binary stream.
+    PDFs are stamped with the subscriber's email when DOWNLOAD_WATERMARK is enabled.
+    """
     song = await db.songs.find_one({"id": song_id, "active": True})
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
@@ -592,29 +1046,97 @@ async def download_resource(
     if not can_download(user, song["accessTier"]):
         raise HTTPException(status_code=403, detail="Upgrade your plan to download this song")
     
-    resource = await db.resources.find_one({"songId": song_id, "type": resource_type}, {"_id": 0})
-    if not resource:
+    # Stamped downloads usually come from the workers' document cache: skip the data
+    meta = await db.resources.find_one({"songId": song_id, "type": resource_type}, {"_id": 0, "data": 0})
+    if not meta:
         raise HTTPException(status_code=404, detail="Resource not found")
     
+    async def load_data() -> bytes:
+        resource = await db.resources.find_one({"id": meta["id"]}, {"_id": 0, "data": 1})
+        return base64.b64decode(resource["data"])
+    
     # Record download
     download_record = {
         "id": str(uuid.uuid4()),
         "uid": user["id"],
         "songId": song_id,
         "resourceType": resource_type,
-        "createdAt": datetime.now(timezone.utc).isoformat()
+        "plan": user.get("plan", "FREE"),
+        "createdAt": utcnow()
     }
-    await db.downloads.insert_one(download_record)
+    await record_downloads(db, [download_record])
+    
+    # Increment download count and trending score (not a catalog change: see trending_window)
+    await db.songs.update_one({"id": song_id}, trending_update(1, download_record["createdAt"]))
     
-    # Increment download count
-    await db.songs.update_one({"id": song_id}, {"$inc": {"downloadsCount": 1}})
+    if should_stamp(meta, song["accessTier"]):
+        content = await stamp_download(
+            meta.get("sha256") or meta["id"],
+            load_data,
+            subscriber_footer(user, utcnow().strftime("%Y-%m-%d"))
+        )
+    elif format == "json":
+        # Unstamped JSON: hand out the stored base64 as-is
+        resource = await db.resources.find_one({"id": meta["id"]}, {"_id": 0, "data": 1})
+        return {"filename": meta["filename"], "contentType": meta["contentType"], "data": resource["data"]}
+    else:
+        content = await load_data()
+    
+    if format == "binary":
+        return StreamingResponse(
+            iter_chunks(content),
+            media_type=meta.get("contentType") or "application/octet-stream",
+            headers=attachment_headers(meta.get("filename"))
+        )
     
     return {
-        "filename": resource["filename"],
-        "contentType": resource["contentType"],
-        "data": resource["data"]
+        "filename": meta["filename"],
+        "contentType": meta["contentType"],
+        "data": base64.b64encode(content).decode()
     }
 
+# ============ FAVORITES ROUTES ============
+
+@api_router.get("/favorites", response_model=List[SongResponse])
+async def get_favorites(user: dict = Depends(require_auth)):
+    """The user's favourite songs, most recently favourited first"""
+    favorites = await db.favorites.find({"uid": user["id"]}, {"_id": 0, "songId": 1}).sort("createdAt", -1).to_list(1000)
+    order = {favorite["songId"]: i for i, favorite in enumerate(favorites)}
+    songs = await attach_resources(
+        await db.songs.find({"id": {"$in": list(order)}, "active": True}, {"_id": 0}).to_list(1000)
+    )
+    for song in songs:
+        song["isFavorite"] = True
+    return sorted(songs, key=lambda song: order[song["id"]])
+
+@api_router.post("/favorites", response_model=FavoriteChangesResult)
+async def update_favorites(data: FavoriteChanges, user: dict = Depends(require_auth)):
+    """Add and remove several favourites at once, e.g. a whole setlist"""
+    if len(data.add) + len(data.remove) > FAVORITES_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {FAVORITES_MAX_BATCH} songs per request")
+    if data.add:
+        found = await db.songs.count_documents({"id": {"$in": list(set(data.add))}, "active": True})
+        if found != len(set(data.add)):
+            raise HTTPException(status_code=404, detail="Song not found")
+    return await apply_favorite_changes(db, user["id"], data.add, data.remove, utcnow())
+
+async def set_favorite(song_id: str, user: dict, favorite: bool) -> dict:
+    # A song removed from the catalog can still be unfavourited
+    query = {"id": song_id, "active": True} if favorite else {"id": song_id}
+    if not await db.songs.count_documents(query, limit=1):
+        raise HTTPException(status_code=404, detail="Song not found")
+    await apply_favorite_changes(db, user["id"], [song_id] if favorite else [], [] if favorite else [song_id], utcnow())
+    song = await db.songs.find_one({"id": song_id}, {"_id": 0, "favoritesCount": 1})
+    return {"songId": song_id, "isFavorite": favorite, "favoritesCount": song.get("favoritesCount", 0)}
+
+@api_router.put("/songs/{song_id}/favorite", response_model=FavoriteStatus)
+async def favorite_song(song_id: str, user: dict = Depends(require_auth)):
+    return await set_favorite(song_id, user, True)
+
+@api_router.delete("/songs/{song_id}/favorite", response_model=FavoriteStatus)
+async def unfavorite_song(song_id: str, user: dict = Depends(require_auth)):
+    return await set_favorite(song_id, user, False)
+
 # ============ LIBRARY ROUTES ============
 
 @api_router.get("/library", response_model=List[dict])
@@ -626,17 +1148,38 @@ async def get_library(user: dict = Depends(require_auth)):
     song_ids = list(set([d["songId"] for d in downloads]))
     
     # Get songs
-    songs = await db.songs.find({"id": {"$in": song_ids}, "active": True}, {"_id": 0}).to_list(1000)
+    songs = await attach_resources(
+        await db.songs.find({"id": {"$in": song_ids}, "active": True}, {"_id": 0}).to_list(1000)
+    )
     
+    first_download = {}
+    for download in downloads:
+        first_download.setdefault(download["songId"], download["createdAt"])
     for song in songs:
-        resources = await db.resources.find({"songId": song["id"]}, {"_id": 0, "data": 0}).to_list(100)
-        song["resources"] = resources
-        song["downloadedAt"] = next((d["createdAt"] for d in downloads if d["songId"] == song["id"]), None)
+        song["downloadedAt"] = first_download.get(song["id"])
+    mark_favorites(songs, await favorite_song_ids(db, user["id"], song_ids))
     
     return songs
 
 # ============ PLAYLISTS ROUTES ============
 
+def playlist_owner_filter(user: dict) -> dict:
+    """Mongo filter matching the playlists a user may modify"""
+    owners = [{"ownerType": "USER", "ownerId": user["id"]}]
+    if user.get("teamId"):
+        owners.append({"ownerType": "TEAM", "ownerId": user["teamId"]})
+    return {"$or": owners}
+
+def playlist_version_filter(version: int) -> dict:
+    """Match a playlist at a given version (playlists created before versioning count as 0)"""
+    return {"version": {"$in": [0, None]}} if version == 0 else {"version": version}
+
+async def raise_playlist_access_error(playlist_id: str):
+    """Failure path of a guarded playlist write: tell 404 from 403"""
+    if await db.playlists.count_documents({"id": playlist_id}, limit=1):
+        raise HTTPException(status_code=403, detail="Access denied")
+    raise HTTPException(status_code=404, detail="Playlist not found")
+
 @api_router.get("/playlists", response_model=List[PlaylistResponse])
 async def get_playlists(user: dict = Depends(require_auth)):
     query = {"$or": [{"ownerId": user["id"], "ownerType": "USER"}]}
@@ -651,7 +1194,7 @@ async def get_playlists(user: dict = Depends(require_auth)):
 @api_router.post("/playlists", response_model=PlaylistResponse)
 async def create_playlist(data: PlaylistCreate, user: dict = Depends(require_auth)):
     playlist_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     owner_id = user["id"]
     if data.ownerType == "TEAM":
@@ -665,6 +1208,7 @@ async def create_playlist(data: PlaylistCreate, user: dict = Depends(require_aut
         "ownerType": data.ownerType,
         "ownerId": owner_id,
         "songIds": [],
+        "version": 0,
         "createdAt": now,
         "updatedAt": now
     }
@@ -684,92 +1228,237 @@ async def get_playlist(playlist_id: str, user: dict = Depends(require_auth)):
     if playlist["ownerType"] == "TEAM" and playlist["ownerId"] != user.get("teamId"):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get songs in playlist
-    songs = []
-    for song_id in playlist["songIds"]:
-        song = await db.songs.find_one({"id": song_id, "active": True}, {"_id": 0})
-        if song:
-            resources = await db.resources.find({"songId": song_id}, {"_id": 0, "data": 0}).to_list(100)
-            song["resources"] = resources
-            songs.append(song)
+    # Get songs in playlist, in playlist order
+    found = await db.songs.find({"id": {"$in": playlist["songIds"]}, "active": True}, {"_id": 0}).to_list(1000)
+    by_id = {song["id"]: song for song in await attach_resources(found)}
+    songs = [by_id[song_id] for song_id in playlist["songIds"] if song_id in by_id]
+    mark_favorites(songs, await favorite_song_ids(db, user["id"], playlist["songIds"]))
     
     playlist["songs"] = songs
     return playlist
 
-@api_router.put("/playlists/{playlist_id}", response_model=PlaylistResponse)
-async def update_playlist(playlist_id: str, data: PlaylistUpdate, user: dict = Depends(require_auth)):
-    playlist = await db.playlists.find_one({"id": playlist_id})
+async def subscriber_copy(resource: dict, access_tier: str, user: dict, content: bytes) -> bytes:
+    """A playlist member as served to `user`: stamped like a single download would be"""
+    if not should_stamp(resource, access_tier):
+        return content
+    
+    async def load_data() -> bytes:
+        return content
+    
+    return await stamp_download(
+        resource.get("sha256") or resource["id"],
+        load_data,
+        subscriber_footer(user, utcnow().strftime("%Y-%m-%d"))
+    )
+
+@api_router.get("/playlists/{playlist_id}/export.pdf")
+async def export_playlist_pdf(playlist_id: str, user: dict = Depends(require_auth)):
+    """
+    Setlist export: the playlist's chord charts merged in order behind a cover
+    and index page. Exports are cached until the playlist, a song or a chart changes.
+    """
+    playlist = await db.playlists.find_one({"id": playlist_id, **playlist_owner_filter(user)}, {"_id": 0})
     if not playlist:
-        raise HTTPException(status_code=404, detail="Playlist not found")
+        await raise_playlist_access_error(playlist_id)
     
-    # Check ownership
-    if playlist["ownerType"] == "USER" and playlist["ownerId"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    if playlist["ownerType"] == "TEAM" and playlist["ownerId"] != user.get("teamId"):
-        raise HTTPException(status_code=403, detail="Access denied")
+    songs = await db.songs.find({"id": {"$in": playlist["songIds"]}, "active": True}, {"_id": 0}).to_list(1000)
+    songs_by_id = {song["id"]: song for song in songs if can_download(user, song["accessTier"])}
+    charts = await db.resources.find(
+        {"songId": {"$in": list(songs_by_id)}, "type": "CHORDS_PDF"},
+        {"_id": 0, "data": 0}
+    ).to_list(1000)
+    charts_by_song = {chart["songId"]: chart for chart in charts}
+    
+    # Playlist order, entitled songs that have a chord chart
+    included = [songs_by_id[song_id] for song_id in playlist["songIds"] if song_id in charts_by_song]
+    if not included:
+        raise HTTPException(status_code=404, detail="No chord charts to export in this playlist")
+    resources = [charts_by_song[song["id"]] for song in included]
+    
+    # The cover shows the export date
+    date = utcnow().strftime("%Y-%m-%d")
+    stamped = any(should_stamp(r, song["accessTier"]) for song, r in zip(included, resources))
+    key = export_cache_key(playlist, included, resources, date, subscriber=user["id"] if stamped else None)
+    path = export_cache.get(key)
+    if not path:
+        data = await db.resources.find(
+            {"id": {"$in": [r["id"] for r in resources]}},
+            {"_id": 0, "id": 1, "data": 1}
+        ).to_list(1000)
+        data_by_id = {r["id"]: base64.b64decode(r["data"]) for r in data}
+        charts = []
+        for song, r in zip(included, resources):
+            if r["id"] in data_by_id:
+                content = await subscriber_copy(r, song["accessTier"], user, data_by_id[r["id"]])
+                charts.append((song["number"], song["title"], content))
+        pdf = await run_in_process(merge_setlist_pdf, playlist["name"], date, charts)
+        path = export_cache.put(key, pdf)
+    
+    filename = f"setlist-{playlist_id[:8]}.pdf"
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=filename,
+        headers={"ETag": f'"{key}"', "Cache-Control": "private, max-age=0, must-revalidate"}
+    )
+
+@api_router.get("/playlists/{playlist_id}/bundle.zip")
+async def download_playlist_bundle(
+    playlist_id: str,
+    types: str = "CHORDS_PDF,LYRICS_PDF,PREVIEW_IMAGE",
+    user: dict = Depends(require_auth)
+):
+    """
+    Every resource of a playlist's songs as a ZIP built on the fly, one
+    folder per song in playlist order. Songs the user cannot download are left out.
+    """
+    playlist = await db.playlists.find_one({"id": playlist_id, **playlist_owner_filter(user)}, {"_id": 0})
+    if not playlist:
+        await raise_playlist_access_error(playlist_id)
     
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
+    songs = await db.songs.find(
+        {"id": {"$in": playlist["songIds"]}, "active": True},
+        {"_id": 0, "id": 1, "number": 1, "title": 1, "accessTier": 1}
+    ).to_list(1000)
+    entitled = {song["id"]: song for song in songs if can_download(user, song["accessTier"])}
+    
+    type_list = [t.strip() for t in types.split(",") if t.strip()]
+    resources = await db.resources.find(
+        {"songId": {"$in": list(entitled)}, "type": {"$in": type_list}},
+        {"_id": 0, "data": 0}
+    ).to_list(5000)
+    if not resources:
+        raise HTTPException(status_code=404, detail="No downloadable resources in this playlist")
     
-    await db.playlists.update_one({"id": playlist_id}, {"$set": update_data})
+    # Record every included download in one batched write per collection
+    now = utcnow()
+    await record_downloads(db, [{
+        "id": str(uuid.uuid4()),
+        "uid": user["id"],
+        "songId": r["songId"],
+        "resourceType": r["type"],
+        "plan": user.get("plan", "FREE"),
+        "createdAt": now
+    } for r in resources])
+    per_song = {}
+    for r in resources:
+        per_song[r["songId"]] = per_song.get(r["songId"], 0) + 1
+    await db.songs.bulk_write(
+        [UpdateOne({"id": song_id}, trending_update(count, now)) for song_id, count in per_song.items()],
+        ordered=False
+    )
+    
+    positions = {song_id: i + 1 for i, song_id in enumerate(playlist["songIds"])}
+    meta = {r["id"]: r for r in resources}
+    
+    async def members():
+        # Small cursor batches: only a few decoded files are in memory at once
+        cursor = db.resources.find({"id": {"$in": list(meta)}}, {"_id": 0, "id": 1, "data": 1}).batch_size(4)
+        async for doc in cursor:
+            r = meta[doc["id"]]
+            song = entitled[r["songId"]]
+            folder = f"{positions[song['id']]:02d} - {song['number']} {song['title']}"
+            yield (
+                # Prefixed with the type: chords and lyrics often share a filename
+                safe_member_name(folder, f"{r['type'].lower()}-{r.get('filename') or 'file'}"),
+                await subscriber_copy(r, song["accessTier"], user, base64.b64decode(doc["data"])),
+                parse_datetime(r.get("updatedAt"))
+            )
     
-    updated = await db.playlists.find_one({"id": playlist_id}, {"_id": 0})
+    filename = f"playlist-{playlist_id[:8]}.zip"
+    return StreamingResponse(
+        stream_zip(members()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.put("/playlists/{playlist_id}", response_model=PlaylistResponse)
+async def update_playlist(playlist_id: str, data: PlaylistUpdate, user: dict = Depends(require_auth)):
+    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
+    update_data["updatedAt"] = utcnow()
+    
+    # Ownership is part of the filter: a single round trip when allowed
+    updated = await db.playlists.find_one_and_update(
+        {"id": playlist_id, **playlist_owner_filter(user)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        await raise_playlist_access_error(playlist_id)
     return updated
 
-@api_router.post("/playlists/{playlist_id}/songs/{song_id}")
-async def add_song_to_playlist(playlist_id: str, song_id: str, user: dict = Depends(require_auth)):
-    playlist = await db.playlists.find_one({"id": playlist_id})
+@api_router.patch("/playlists/{playlist_id}/songs", response_model=PlaylistResponse)
+async def patch_playlist_songs(playlist_id: str, data: PlaylistPatch, user: dict = Depends(require_auth)):
+    """
+    Apply ordered move/insert/remove ops to a playlist.
+    The write only lands if the playlist is still at `version`; otherwise 409.
+    """
+    playlist = await db.playlists.find_one(
+        {"id": playlist_id, **playlist_owner_filter(user)},
+        {"_id": 0, "songIds": 1, "version": 1}
+    )
     if not playlist:
-        raise HTTPException(status_code=404, detail="Playlist not found")
+        await raise_playlist_access_error(playlist_id)
     
-    # Check ownership
-    if playlist["ownerType"] == "USER" and playlist["ownerId"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    if playlist["ownerType"] == "TEAM" and playlist["ownerId"] != user.get("teamId"):
-        raise HTTPException(status_code=403, detail="Access denied")
+    if playlist.get("version", 0) != data.version:
+        raise HTTPException(status_code=409, detail="Playlist was modified by someone else, reload and try again")
     
-    song = await db.songs.find_one({"id": song_id, "active": True})
+    try:
+        song_ids = apply_playlist_ops(playlist.get("songIds", []), [op.model_dump() for op in data.ops])
+    except PlaylistOpError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    inserted = {op.songId for op in data.ops if op.op == "insert"}
+    if inserted:
+        found = await db.songs.count_documents({"id": {"$in": list(inserted)}, "active": True})
+        if found != len(inserted):
+            raise HTTPException(status_code=404, detail="Song not found")
+    
+    # Ownership is checked again at write time: access may have been lost since the read
+    updated = await db.playlists.find_one_and_update(
+        {"id": playlist_id, **playlist_owner_filter(user), **playlist_version_filter(data.version)},
+        {"$set": {"songIds": song_ids, "updatedAt": utcnow()}, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        if not await db.playlists.count_documents({"id": playlist_id, **playlist_owner_filter(user)}, limit=1):
+            await raise_playlist_access_error(playlist_id)
+        raise HTTPException(status_code=409, detail="Playlist was modified by someone else, reload and try again")
+    return updated
+
+@api_router.post("/playlists/{playlist_id}/songs/{song_id}")
+async def add_song_to_playlist(playlist_id: str, song_id: str, user: dict = Depends(require_auth)):
+    song = await db.songs.find_one({"id": song_id, "active": True}, {"_id": 1})
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
     
-    if song_id not in playlist["songIds"]:
-        await db.playlists.update_one(
-            {"id": playlist_id},
-            {"$push": {"songIds": song_id}, "$set": {"updatedAt": datetime.now(timezone.utc).isoformat()}}
-        )
+    result = await db.playlists.update_one(
+        {"id": playlist_id, **playlist_owner_filter(user)},
+        {"$addToSet": {"songIds": song_id}, "$set": {"updatedAt": utcnow()}, "$inc": {"version": 1}}
+    )
+    if result.matched_count == 0:
+        await raise_playlist_access_error(playlist_id)
     
     return {"message": "Song added to playlist"}
 
 @api_router.delete("/playlists/{playlist_id}/songs/{song_id}")
 async def remove_song_from_playlist(playlist_id: str, song_id: str, user: dict = Depends(require_auth)):
-    playlist = await db.playlists.find_one({"id": playlist_id})
-    if not playlist:
-        raise HTTPException(status_code=404, detail="Playlist not found")
-    
-    if playlist["ownerType"] == "USER" and playlist["ownerId"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    if playlist["ownerType"] == "TEAM" and playlist["ownerId"] != user.get("teamId"):
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.playlists.update_one(
-        {"id": playlist_id},
-        {"$pull": {"songIds": song_id}, "$set": {"updatedAt": datetime.now(timezone.utc).isoformat()}}
+    result = await db.playlists.update_one(
+        {"id": playlist_id, **playlist_owner_filter(user)},
+        {"$pull": {"songIds": song_id}, "$set": {"updatedAt": utcnow()}, "$inc": {"version": 1}}
     )
+    if result.matched_count == 0:
+        await raise_playlist_access_error(playlist_id)
     
     return {"message": "Song removed from playlist"}
 
 @api_router.delete("/playlists/{playlist_id}")
 async def delete_playlist(playlist_id: str, user: dict = Depends(require_auth)):
-    playlist = await db.playlists.find_one({"id": playlist_id})
-    if not playlist:
-        raise HTTPException(status_code=404, detail="Playlist not found")
-    
-    if playlist["ownerType"] == "USER" and playlist["ownerId"] != user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    if playlist["ownerType"] == "TEAM" and playlist["ownerId"] != user.get("teamId"):
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.playlists.delete_one({"id": playlist_id})
+    result = await db.playlists.delete_one({"id": playlist_id, **playlist_owner_filter(user)})
+    if result.deleted_count == 0:
+        await raise_playlist_access_error(playlist_id)
     return {"message": "Playlist deleted"}
 
 # ============ TEAMS ROUTES ============
@@ -798,18 +1487,20 @@ async def create_team(data: TeamCreate, user: dict = Depends(require_auth)):
         raise HTTPException(status_code=400, detail="You are already part of a team")
     
     team_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     team = {
         "id": team_id,
         "name": data.name,
         "ownerUid": user["id"],
         "maxMembers": 7,
+        # The TEAM subscription lives on the team; members resolve it at read time
+        "plan": "TEAM",
+        "planExpiresAt": user.get("planExpiresAt"),
+        "graceUntil": user.get("graceUntil"),
         "createdAt": now
     }
     
-    await db.teams.insert_one(team)
-    
     # Add owner as member
     member = {
         "id": str(uuid.uuid4()),
@@ -819,13 +1510,20 @@ async def create_team(data: TeamCreate, user: dict = Depends(require_auth)):
         "role": "OWNER",
         "joinedAt": now
     }
-    await db.team_members.insert_one(member)
     
-    # Update user
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"teamId": team_id, "roleInTeam": "OWNER"}}
-    )
+    async def create(session):
+        # Guard on teamId so concurrent requests cannot create two teams
+        result = await db.users.update_one(
+            {"id": user["id"], "teamId": None},
+            {"$set": {"teamId": team_id, "roleInTeam": "OWNER"}},
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=400, detail="You are already part of a team")
+        await db.teams.insert_one(team, session=session)
+        await db.team_members.insert_one(member, session=session)
+    
+    await run_in_transaction(client, create)
     
     team["members"] = [{k: v for k, v in member.items() if k != "_id"}]
     return {k: v for k, v in team.items() if k != "_id"}
@@ -852,7 +1550,7 @@ async def invite_team_member(team_id: str, data: TeamInvite, user: dict = Depend
     
     # Create invitation
     invite_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     invitation = {
         "id": invite_id,
@@ -861,7 +1559,7 @@ async def invite_team_member(team_id: str, data: TeamInvite, user: dict = Depend
         "role": data.role,
         "status": "PENDING",
         "createdAt": now,
-        "expiresAt": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()
+        "expiresAt": utcnow() + timedelta(days=7)
     }
     
     await db.team_invitations.insert_one(invitation)
@@ -870,7 +1568,13 @@ async def invite_team_member(team_id: str, data: TeamInvite, user: dict = Depend
 
 @api_router.post("/teams/accept-invite/{invite_id}")
 async def accept_team_invite(invite_id: str, user: dict = Depends(require_auth)):
-    invitation = await db.team_invitations.find_one({"id": invite_id, "status": "PENDING"})
+    now = utcnow()
+    
+    invitation = await db.team_invitations.find_one({
+        "id": invite_id,
+        "status": "PENDING",
+        "expiresAt": {"$gt": now}
+    })
     if not invitation:
         raise HTTPException(status_code=404, detail="Invitation not found or expired")
     
@@ -880,13 +1584,6 @@ async def accept_team_invite(invite_id: str, user: dict = Depends(require_auth))
     if user.get("teamId"):
         raise HTTPException(status_code=400, detail="You are already part of a team")
     
-    # Check max members
-    member_count = await db.team_members.count_documents({"teamId": invitation["teamId"]})
-    if member_count >= 7:
-        raise HTTPException(status_code=400, detail="Team has reached maximum capacity")
-    
-    now = datetime.now(timezone.utc).isoformat()
-    
     # Add as member
     member = {
         "id": str(uuid.uuid4()),
@@ -896,28 +1593,34 @@ async def accept_team_invite(invite_id: str, user: dict = Depends(require_auth))
         "role": invitation["role"],
         "joinedAt": now
     }
-    await db.team_members.insert_one(member)
-    
-    # Update user - inherit team's plan
-    team = await db.teams.find_one({"id": invitation["teamId"]})
-    owner = await db.users.find_one({"id": team["ownerUid"]})
     
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {
-            "teamId": invitation["teamId"],
-            "roleInTeam": invitation["role"],
-            "plan": "TEAM",
-            "planExpiresAt": owner.get("planExpiresAt"),
-            "graceUntil": owner.get("graceUntil")
-        }}
-    )
+    async def accept(session):
+        # Claim the invitation first so it can only be used once
+        claimed = await db.team_invitations.update_one(
+            {"id": invite_id, "status": "PENDING"},
+            {"$set": {"status": "ACCEPTED"}},
+            session=session
+        )
+        if claimed.modified_count == 0:
+            raise HTTPException(status_code=404, detail="Invitation not found or expired")
+        
+        # Check max members
+        member_count = await db.team_members.count_documents({"teamId": invitation["teamId"]}, session=session)
+        if member_count >= 7:
+            raise HTTPException(status_code=400, detail="Team has reached maximum capacity")
+        
+        await db.team_members.insert_one(member, session=session)
+        
+        # Update user - the team's plan is resolved from the team at read time
+        joined = await db.users.update_one(
+            {"id": user["id"], "teamId": None},
+            {"$set": {"teamId": invitation["teamId"], "roleInTeam": invitation["role"]}},
+            session=session
+        )
+        if joined.modified_count == 0:
+            raise HTTPException(status_code=400, detail="You are already part of a team")
     
-    # Mark invitation as accepted
-    await db.team_invitations.update_one(
-        {"id": invite_id},
-        {"$set": {"status": "ACCEPTED"}}
-    )
+    await run_in_transaction(client, accept)
     
     return {"message": "You have joined the team"}
 
@@ -935,14 +1638,19 @@ async def remove_team_member(team_id: str, member_uid: str, user: dict = Depends
     if member_uid == team["ownerUid"]:
         raise HTTPException(status_code=400, detail="Cannot remove team owner")
     
-    # Remove member
-    await db.team_members.delete_one({"teamId": team_id, "uid": member_uid})
+    async def remove(session):
+        result = await db.team_members.delete_one({"teamId": team_id, "uid": member_uid}, session=session)
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Member not found in this team")
+        
+        # Members keep their own plan; only the team's is taken away
+        await db.users.update_one(
+            {"id": member_uid, "teamId": team_id},
+            {"$set": {"teamId": None, "roleInTeam": None}},
+            session=session
+        )
     
-    # Update user
-    await db.users.update_one(
-        {"id": member_uid},
-        {"$set": {"teamId": None, "roleInTeam": None, "plan": "FREE", "planExpiresAt": None, "graceUntil": None}}
-    )
+    await run_in_transaction(client, remove)
     
     return {"message": "Member removed from team"}
 
@@ -956,7 +1664,7 @@ async def get_my_payments(user: dict = Depends(require_auth)):
 @api_router.post("/payments", response_model=PaymentResponse)
 async def create_payment(data: PaymentCreate, background_tasks: BackgroundTasks, user: dict = Depends(require_auth)):
     payment_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     payment = {
         "id": payment_id,
@@ -1014,9 +1722,124 @@ async def upload_receipt(payment_id: str, file: UploadFile = File(...), user: di
 
 # ============ ADMIN ROUTES ============
 
+@api_router.get("/admin/analytics/downloads", response_model=DownloadAnalyticsResponse)
+async def admin_download_analytics(
+    start: str,
+    end: str,
+    granularity: Literal["day", "month"] = "day",
+    groupBy: Optional[Literal["song", "resourceType", "plan"]] = None,
+    songId: Optional[str] = None,
+    resourceType: Optional[str] = None,
+    plan: Optional[str] = None,
+    limit: int = 50,
+    user: dict = Depends(require_admin)
+):
+    """
+    Download counts for [start, end] (YYYY-MM-DD, or YYYY-MM by month) from the
+    rollups, as a time series plus an optional breakdown by song, type or plan.
+    """
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d" if granularity == "day" else "%Y-%m")
+        end_date = datetime.strptime(end, "%Y-%m-%d" if granularity == "day" else "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"start and end must be {'YYYY-MM-DD' if granularity == 'day' else 'YYYY-MM'}")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end is before start")
+    
+    filters = {field: value for field, value in (("songId", songId), ("resourceType", resourceType), ("plan", plan)) if value}
+    pipeline = analytics_pipeline(granularity, start, end, groupBy, filters, min(max(limit, 1), 200))
+    results = await db.download_rollups.aggregate(pipeline).to_list(1)
+    facets = results[0] if results else {}
+    
+    series = [{"bucket": row["_id"], "count": row["count"]} for row in facets.get("series", [])]
+    breakdown = [{"key": row["_id"], "count": row["count"]} for row in facets.get("breakdown", [])]
+    if groupBy == "song" and breakdown:
+        titles = {
+            song["id"]: f"{song['number']} - {song['title']}"
+            async for song in db.songs.find({"id": {"$in": [row["key"] for row in breakdown]}}, {"_id": 0, "id": 1, "number": 1, "title": 1})
+        }
+        for row in breakdown:
+            row["label"] = titles.get(row["key"])
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "total": sum(row["count"] for row in series),
+        "series": series,
+        "breakdown": breakdown
+    }
+
+@api_router.get("/admin/analytics/views", response_model=ViewAnalyticsResponse)
+async def admin_view_analytics(
+    start: str,
+    end: str,
+    songId: Optional[str] = None,
+    limit: int = 50,
+    user: dict = Depends(require_admin)
+):
+    """
+    Approximate unique viewers (about 3% error), views and downloads per song
+    for days in [start, end] (YYYY-MM-DD), with view-to-download conversion.
+    """
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d")
+        end_date = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end is before start")
+    
+    # Include this process's views since the last periodic flush
+    await view_tracker.flush(db)
+    viewers = await unique_viewers(db, start, end, songId)
+    match = {"period": "day", "bucket": {"$gte": start, "$lte": end}}
+    if songId:
+        match["songId"] = songId
+    downloads = {
+        row["_id"]: row["count"]
+        async for row in db.download_rollups.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$songId", "count": {"$sum": "$count"}}},
+        ])
+    }
+    
+    rows = [
+        {
+            "songId": song_id,
+            "uniqueViewers": stats["uniqueViewers"],
+            "views": stats["views"],
+            "downloads": downloads.get(song_id, 0),
+            "conversion": round(downloads.get(song_id, 0) / stats["uniqueViewers"], 4) if stats["uniqueViewers"] else None
+        }
+        for song_id, stats in viewers.items()
+    ]
+    rows.sort(key=lambda row: (-row["uniqueViewers"], row["songId"]))
+    rows = rows[:min(max(limit, 1), 200)]
+    titles = {
+        song["id"]: f"{song['number']} - {song['title']}"
+        async for song in db.songs.find({"id": {"$in": [row["songId"] for row in rows]}}, {"_id": 0, "id": 1, "number": 1, "title": 1})
+    }
+    for row in rows:
+        row["label"] = titles.get(row["songId"])
+    return {
+        "start": start,
+        "end": end,
+        "views": sum(stats["views"] for stats in viewers.values()),
+        "downloads": sum(downloads.values()),
+        "songs": rows
+    }
+
+@api_router.post("/admin/downloads/compact", response_model=JobResponse)
+async def admin_compact_downloads(user: dict = Depends(require_admin)):
+    """Queue raw download compaction now instead of waiting for the nightly run"""
+    return await job_queue.enqueue(
+        db, "compact_downloads", {}, priority=PRIORITY_LOW,
+        max_attempts=1, dedupe_key="manual", created_by=user["id"]
+    )
+
 @api_router.get("/admin/stats")
 async def admin_get_stats(user: dict = Depends(require_admin)):
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     total_users = await db.users.count_documents({})
     
@@ -1042,18 +1865,32 @@ async def admin_get_stats(user: dict = Depends(require_admin)):
         "graceUntil": {"$gte": now}
     })
     
+    # Team members inherit the team's plan, so count them through active teams
+    # (paid up or in grace, with legacy teams resolved through their owner),
+    # leaving out members already counted above through their own plan
+    entitlements = await team_entitlements.get_many(db, await db.teams.distinct("id"))
+    active_team_ids = [team_id for team_id, entitlement in entitlements.items() if is_entitlement_active(entitlement)]
+    active_team_members = await db.users.count_documents({
+        "teamId": {"$in": active_team_ids},
+        "plan": {"$ne": "TEAM"},
+        "$nor": [{
+            "plan": "STANDARD",
+            "$or": [{"planExpiresAt": {"$gte": now}}, {"graceUntil": {"$gte": now}}]
+        }]
+    })
+    
     total_songs = await db.songs.count_documents({"active": True})
     inactive_songs = await db.songs.count_documents({"active": False})
-    total_downloads = await db.downloads.count_documents({})
+    total_downloads = await all_time_downloads(db)
     pending_payments = await db.payments.count_documents({"status": "PENDING"})
     total_teams = await db.teams.count_documents({})
     
     return {
         "totalUsers": total_users,
         "activeStandard": active_standard + grace_standard,
-        "activeTeam": active_team + grace_team,
+        "activeTeam": active_team + grace_team + active_team_members,
         "standardUsers": await db.users.count_documents({"plan": "STANDARD"}),
-        "teamUsers": await db.users.count_documents({"plan": "TEAM"}),
+        "teamUsers": await db.users.count_documents({"$or": [{"plan": "TEAM"}, {"teamId": {"$ne": None}}]}),
         "totalSongs": total_songs,
         "inactiveSongs": inactive_songs,
         "totalDownloads": total_downloads,
@@ -1068,7 +1905,7 @@ async def admin_get_payments(status: Optional[str] = None, user: dict = Depends(
         query["status"] = status
     
     payments = await db.payments.find(query, {"_id": 0}).sort("createdAt", -1).to_list(1000)
-    return payments
+    return fast_response(payments, PaymentResponse, "admin_get_payments")
 
 @api_router.get("/admin/payments/{payment_id}")
 async def admin_get_payment_detail(payment_id: str, user: dict = Depends(require_admin)):
@@ -1106,59 +1943,67 @@ async def admin_review_payment(payment_id: str, data: PaymentReview, background_
     if payment["status"] != "PENDING":
         raise HTTPException(status_code=400, detail="Payment has already been reviewed")
     
-    now = datetime.now(timezone.utc)
+    now = utcnow()
     
     update_data = {
         "status": data.decision,
         "reviewedBy": admin["id"],
-        "reviewedAt": now.isoformat(),
+        "reviewedAt": now,
         "note": data.note
     }
     
-    await db.payments.update_one({"id": payment_id}, {"$set": update_data})
-    
     # Get user email for notification
     user_email = payment.get("userEmail")
     
+    target_user = None
+    renews_team = False
     if data.decision == "APPROVED":
-        # Get the user
-        target_user = await db.users.find_one({"id": payment["uid"]})
+        target_user = await db.users.find_one({"id": payment["uid"]}, {"_id": 0, "planExpiresAt": 1, "teamId": 1})
+        if not target_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        # TEAM renewals extend the team's subscription
+        renews_team = payment["planRequested"] == "TEAM" and bool(target_user.get("teamId"))
+        current = await team_entitlements.get(db, target_user["teamId"]) if renews_team else target_user
         
         # Calculate new expiration date
-        current_expires = None
-        if target_user.get("planExpiresAt"):
-            try:
-                current_expires = datetime.fromisoformat(target_user["planExpiresAt"].replace("Z", "+00:00"))
-            except:
-                current_expires = None
+        current_expires = parse_datetime((current or {}).get("planExpiresAt"))
         
         base_date = max(now, current_expires) if current_expires and current_expires > now else now
         new_expires = base_date + timedelta(days=30)
         grace_until = new_expires + timedelta(days=3)
+    
+    async def review(session):
+        # Only a PENDING payment can be reviewed, even under concurrent reviews
+        result = await db.payments.update_one(
+            {"id": payment_id, "status": "PENDING"},
+            {"$set": update_data},
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Payment has already been reviewed")
+        
+        if data.decision != "APPROVED":
+            return
         
         # Update user plan
         user_update = {
             "plan": payment["planRequested"],
-            "planExpiresAt": new_expires.isoformat(),
-            "graceUntil": grace_until.isoformat()
+            "planExpiresAt": new_expires,
+            "graceUntil": grace_until
         }
+        await db.users.update_one({"id": payment["uid"]}, {"$set": user_update}, session=session)
         
-        await db.users.update_one({"id": payment["uid"]}, {"$set": user_update})
-        
-        # If TEAM plan and user has a team, update all team members
-        if payment["planRequested"] == "TEAM" and target_user.get("teamId"):
-            team_members = await db.team_members.find({"teamId": target_user["teamId"]}).to_list(10)
-            for member in team_members:
-                if member["uid"] != payment["uid"]:
-                    await db.users.update_one(
-                        {"id": member["uid"]},
-                        {"$set": {
-                            "plan": "TEAM",
-                            "planExpiresAt": new_expires.isoformat(), 
-                            "graceUntil": grace_until.isoformat()
-                        }}
-                    )
-        
+        # Members resolve the team plan at read time: one write, no per-member fan-out
+        if renews_team:
+            await db.teams.update_one({"id": target_user["teamId"]}, {"$set": user_update}, session=session)
+    
+    await run_in_transaction(client, review)
+    
+    if target_user and target_user.get("teamId"):
+        team_entitlements.invalidate(target_user["teamId"])
+    
+    if data.decision == "APPROVED":
         # Send approval email (non-blocking)
         if user_email:
             background_tasks.add_task(
@@ -1183,8 +2028,15 @@ async def admin_review_payment(payment_id: str, data: PaymentReview, background_
     return {"message": f"Payment {data.decision.lower()}"}
 
 @api_router.get("/admin/users", response_model=List[UserResponse])
-async def admin_get_users(user: dict = Depends(require_admin)):
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+async def admin_get_users(fields: Optional[str] = None, user: dict = Depends(require_admin)):
+    selected = requested_fields(fields, UserResponse)
+    # teamId is needed to apply team entitlements even when not requested
+    projection = field_projection(selected, "teamId") if selected else {"_id": 0, "password": 0}
+    users = await db.users.find({}, projection).to_list(1000)
+    
+    # Show the effective plan for team members
+    entitlements = await team_entitlements.get_many(db, [u["teamId"] for u in users if u.get("teamId")])
+    users = [apply_team_entitlement(u, entitlements.get(u.get("teamId"))) for u in users]
     
     # Enrich with team member count
     for u in users:
@@ -1194,7 +2046,7 @@ async def admin_get_users(user: dict = Depends(require_admin)):
         else:
             u["teamMemberCount"] = 0
     
-    return users
+    return fast_response(users, UserResponse, "admin_get_users", fields=selected)
 
 @api_router.get("/admin/users/{user_id}")
 async def admin_get_user_detail(user_id: str, admin: dict = Depends(require_admin)):
@@ -1206,6 +2058,7 @@ async def admin_get_user_detail(user_id: str, admin: dict = Depends(require_admi
     if user.get("teamId"):
         team = await db.teams.find_one({"id": user["teamId"]}, {"_id": 0})
         members = await db.team_members.find({"teamId": user["teamId"]}, {"_id": 0}).to_list(10)
+        user = apply_team_entitlement(user, await team_entitlements.get(db, user["teamId"]))
         user["team"] = team
         user["teamMembers"] = members
     
@@ -1215,6 +2068,17 @@ async def admin_get_user_detail(user_id: str, admin: dict = Depends(require_admi
     
     return user
 
+async def sync_owner_plan_to_team(user: dict, fields: dict) -> None:
+    """
+    Mirror an admin change to a team owner's plan onto their team, which is
+    where members read the TEAM subscription from.
+    """
+    team_fields = {field: fields[field] for field in ENTITLEMENT_FIELDS if field in fields}
+    if not user.get("teamId") or not team_fields:
+        return
+    await db.teams.update_one({"id": user["teamId"], "ownerUid": user["id"]}, {"$set": team_fields})
+    team_entitlements.invalidate(user["teamId"])
+
 @api_router.put("/admin/users/{user_id}")
 async def admin_update_user(user_id: str, data: UserAdminUpdate, admin: dict = Depends(require_admin)):
     user = await db.users.find_one({"id": user_id})
@@ -1234,20 +2098,23 @@ async def admin_update_user(user_id: str, data: UserAdminUpdate, admin: dict = D
             update_data["graceUntil"] = None
     
     if data.planExpiresAt is not None:
-        update_data["planExpiresAt"] = data.planExpiresAt
+        expires = parse_datetime(data.planExpiresAt)
+        if not expires:
+            raise HTTPException(status_code=400, detail="Invalid planExpiresAt date")
+        update_data["planExpiresAt"] = expires
         # Auto-calculate grace period
-        try:
-            expires = datetime.fromisoformat(data.planExpiresAt.replace("Z", "+00:00"))
-            update_data["graceUntil"] = (expires + timedelta(days=3)).isoformat()
-        except:
-            pass
+        update_data["graceUntil"] = expires + timedelta(days=3)
     
     if data.graceUntil is not None:
-        update_data["graceUntil"] = data.graceUntil
+        grace_until = parse_datetime(data.graceUntil)
+        if not grace_until:
+            raise HTTPException(status_code=400, detail="Invalid graceUntil date")
+        update_data["graceUntil"] = grace_until
     
-    update_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
+    update_data["updatedAt"] = utcnow()
     
     await db.users.update_one({"id": user_id}, {"$set": update_data})
+    await sync_owner_plan_to_team(user, update_data)
     
     updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     return updated_user
@@ -1256,7 +2123,7 @@ async def admin_update_user(user_id: str, data: UserAdminUpdate, admin: dict = D
 async def admin_promote_to_admin(user_id: str, admin: dict = Depends(require_admin)):
     result = await db.users.update_one(
         {"id": user_id}, 
-        {"$set": {"role": "ADMIN", "isAdmin": True, "updatedAt": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"role": "ADMIN", "isAdmin": True, "updatedAt": utcnow()}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1270,7 +2137,7 @@ async def admin_demote_admin(user_id: str, admin: dict = Depends(require_admin))
     
     result = await db.users.update_one(
         {"id": user_id}, 
-        {"$set": {"role": "USER", "isAdmin": False, "updatedAt": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"role": "USER", "isAdmin": False, "updatedAt": utcnow()}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1278,17 +2145,15 @@ async def admin_demote_admin(user_id: str, admin: dict = Depends(require_admin))
 
 @api_router.post("/admin/users/{user_id}/reset-plan")
 async def admin_reset_user_plan(user_id: str, admin: dict = Depends(require_admin)):
-    result = await db.users.update_one(
+    reset = {"plan": "FREE", "planExpiresAt": None, "graceUntil": None}
+    user = await db.users.find_one_and_update(
         {"id": user_id},
-        {"$set": {
-            "plan": "FREE",
-            "planExpiresAt": None,
-            "graceUntil": None,
-            "updatedAt": datetime.now(timezone.utc).isoformat()
-        }}
+        {"$set": {**reset, "updatedAt": utcnow()}},
+        projection={"_id": 0, "id": 1, "teamId": 1}
     )
-    if result.matched_count == 0:
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    await sync_owner_plan_to_team(user, reset)
     return {"message": "User plan reset to FREE"}
 
 # ============ FIRST-TIME ADMIN SETUP ============
@@ -1333,15 +2198,15 @@ async def setup_first_admin(data: AdminSetupRequest):
         )
     
     # Promote to admin
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     await db.users.update_one(
         {"id": user["id"]},
         {"$set": {
             "role": "ADMIN",
             "isAdmin": True,
             "plan": "TEAM",
-            "planExpiresAt": (datetime.now(timezone.utc) + timedelta(days=365)).isoformat(),
-            "graceUntil": (datetime.now(timezone.utc) + timedelta(days=368)).isoformat(),
+            "planExpiresAt": utcnow() + timedelta(days=365),
+            "graceUntil": utcnow() + timedelta(days=368),
             "updatedAt": now
         }}
     )
@@ -1353,14 +2218,258 @@ async def setup_first_admin(data: AdminSetupRequest):
 
 # Admin song management - get all songs including inactive
 @api_router.get("/admin/songs")
-async def admin_get_all_songs(user: dict = Depends(require_admin)):
-    songs = await db.songs.find({}, {"_id": 0}).sort("number", 1).to_list(1000)
+async def admin_get_all_songs(fields: Optional[str] = None, user: dict = Depends(require_admin)):
+    selected = requested_fields(fields, SongResponse)
+    songs = await db.songs.find({}, field_projection(selected)).sort("number", 1).to_list(1000)
+    
+    if selected is None or "resources" in selected:
+        await attach_resources(songs)
+    
+    if selected is None:
+        return songs
+    return fast_response(songs, SongResponse, "admin_get_all_songs", fields=selected)
+
+@api_router.post("/admin/search/reindex")
+async def admin_reindex_search(user: dict = Depends(require_admin)):
+    """Queue text extraction for PDFs uploaded before search existed or changed since"""
+    indexed = {
+        (entry["songId"], entry["resourceType"]): entry.get("sha256")
+        async for entry in db.song_texts.find({}, {"_id": 0, "songId": 1, "resourceType": 1, "sha256": 1})
+    }
+    queued = 0
+    async for resource in db.resources.find(
+        {"type": {"$in": list(SEARCHABLE_TYPES)}},
+        {"_id": 0, "songId": 1, "type": 1, "sha256": 1}
+    ):
+        key = (resource["songId"], resource["type"])
+        # Resources uploaded before hashing count as indexed once they have an entry
+        if key not in indexed or (resource.get("sha256") and resource["sha256"] != indexed[key]):
+            await job_queue.enqueue(
+                db, "index_text", {"songId": resource["songId"], "resourceType": resource["type"]},
+                priority=PRIORITY_LOW, dedupe_key=f"{resource['songId']}:{resource['type']}", created_by=user["id"]
+            )
+            queued += 1
     
-    for song in songs:
-        resources = await db.resources.find({"songId": song["id"]}, {"_id": 0, "data": 0}).to_list(100)
-        song["resources"] = resources
+    return {"message": "Search reindex queued", "queued": queued}
+
+# Bulk preview regeneration
+@api_router.post("/admin/previews/regenerate", response_model=JobResponse)
+async def admin_regenerate_previews(data: PreviewRegenerateRequest, user: dict = Depends(require_admin)):
+    """Queue a re-render of stale previews; a run already waiting is returned instead"""
+    return await job_queue.enqueue(
+        db, "regenerate_previews", {"force": data.force},
+        max_attempts=1, dedupe_key="all", created_by=user["id"]
+    )
+
+@api_router.post("/admin/trending/recompute", response_model=JobResponse)
+async def admin_recompute_trending(user: dict = Depends(require_admin)):
+    """Queue a rebuild of trending scores, e.g. after changing TRENDING_HALF_LIFE_DAYS"""
+    return await job_queue.enqueue(
+        db, "recompute_trending", {}, priority=PRIORITY_LOW,
+        max_attempts=1, dedupe_key="all", created_by=user["id"]
+    )
+
+@api_router.post("/admin/recommendations/rebuild", response_model=JobResponse)
+async def admin_rebuild_recommendations(user: dict = Depends(require_admin)):
+    """Queue a recommendations rebuild now instead of waiting for the nightly run"""
+    return await job_queue.enqueue(
+        db, "rebuild_recommendations", {}, priority=PRIORITY_LOW,
+        max_attempts=1, dedupe_key="manual", created_by=user["id"]
+    )
+
+@api_router.get("/admin/previews/regenerate", response_model=Optional[JobResponse])
+async def admin_get_preview_regeneration(user: dict = Depends(require_admin)):
+    """Latest regeneration run with its progress and throughput"""
+    return await db.jobs.find_one({"type": "regenerate_previews"}, {"_id": 0}, sort=[("createdAt", -1)])
+
+# Background jobs
+@api_router.get("/admin/jobs", response_model=List[JobResponse])
+async def admin_get_jobs(
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: int = 100,
+    user: dict = Depends(require_admin)
+):
+    query = {}
+    if status:
+        query["status"] = status
+    if type:
+        query["type"] = type
+    
+    jobs = await db.jobs.find(query, {"_id": 0}).sort("createdAt", -1).to_list(min(max(limit, 1), 500))
+    return jobs
+
+@api_router.get("/admin/jobs/summary")
+async def admin_get_jobs_summary(user: dict = Depends(require_admin)):
+    """Job counts per type and status, plus how long the oldest runnable job has waited"""
+    summary = {}
+    async for row in db.jobs.aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+    ]):
+        counts = summary.setdefault(row["_id"]["type"], {status: 0 for status in JOB_STATUSES})
+        counts[row["_id"]["status"]] = row["count"]
+    
+    now = utcnow()
+    oldest = await db.jobs.find_one(
+        {"status": "queued", "runAt": {"$lte": now}},
+        {"_id": 0, "runAt": 1},
+        sort=[("runAt", 1)]
+    )
+    return {
+        "types": summary,
+        "oldestQueuedSeconds": (now - parse_datetime(oldest["runAt"])).total_seconds() if oldest else 0
+    }
+
+@api_router.get("/admin/jobs/{job_id}", response_model=JobResponse)
+async def admin_get_job(job_id: str, user: dict = Depends(require_admin)):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/admin/jobs/{job_id}/cancel", response_model=JobResponse)
+async def admin_cancel_job(job_id: str, user: dict = Depends(require_admin)):
+    job = await job_queue.cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=409, detail="Only queued or running jobs can be cancelled")
+    return job
+
+@api_router.post("/admin/jobs/{job_id}/retry", response_model=JobResponse)
+async def admin_retry_job(job_id: str, user: dict = Depends(require_admin)):
+    job = await job_queue.retry(db, job_id)
+    if not job:
+        raise HTTPException(status_code=409, detail="Only failed or cancelled jobs can be retried, and not while a duplicate is queued")
+    return job
+
+# Bulk catalog import
+@api_router.post("/admin/songs/import")
+async def admin_import_catalog(
+    catalog: UploadFile = File(...),
+    archive: Optional[UploadFile] = File(None),
+    dryRun: bool = Form(False),
+    optimize: Optional[bool] = Form(None),
+    user: dict = Depends(require_admin)
+):
+    """
+    Create or update songs from a CSV and attach PDFs from a ZIP matched by song number.
+    Re-running the same files is a no-op: unchanged songs and PDFs are reported as such.
+    """
+    try:
+        rows = parse_catalog_csv(await catalog.read(), SongCreate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    valid = [row for row in rows if row["song"]]
+    for row in rows:
+        if row["errors"]:
+            row["status"] = "error"
+    now = utcnow()
+    
+    existing = {
+        (song["number"], song.get("language", "fr")): song
+        async for song in db.songs.find({"number": {"$in": [row["number"] for row in valid]}}, {"_id": 0})
+    }
+    ops = []
+    for row in valid:
+        song = row["song"]
+        current = existing.get((song["number"], song["language"]))
+        if current is None:
+            document = new_song_document(song, now)
+            # Upsert on the natural key so concurrent or repeated runs cannot duplicate a song
+            ops.append(UpdateOne(
+                {"number": song["number"], "language": song["language"]},
+                {"$setOnInsert": document},
+                upsert=True
+            ))
+            row.update(status="created", songId=document["id"])
+            continue
+        
+        changes = song_changes(current, song)
+        if not current.get("active", True):
+            changes = {**(changes or {}), "active": True}
+        row.update(status="updated" if changes else "unchanged", songId=current["id"])
+        if changes:
+            ops.append(UpdateOne({"id": current["id"]}, {"$set": {**changes, "updatedAt": now, "changedAt": now}}))
+    
+    if ops and not dryRun:
+        await db.songs.bulk_write(ops, ordered=False)
+        await catalog_version.bump(db)
+        song_search.mark_stale()
+        song_suggest.mark_stale()
+        # A concurrent import or create may have won an upsert: attach PDFs to the stored song
+        created = [row for row in valid if row["status"] == "created"]
+        if created:
+            stored_ids = {
+                (song["number"], song["language"]): song["id"]
+                async for song in db.songs.find(
+                    {"number": {"$in": [row["number"] for row in created]}},
+                    {"_id": 0, "id": 1, "number": 1, "language": 1}
+                )
+            }
+            for row in created:
+                row["songId"] = stored_ids.get((row["number"], row["song"]["language"]), row["songId"])
     
-    return songs
+    unmatched_files = []
+    if archive is not None:
+        try:
+            zip_file = zipfile.ZipFile(archive.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="archive is not a valid ZIP file")
+        matches, unmatched_files = match_pdf_members(zip_file)
+        
+        rows_by_number = {}
+        for row in valid:
+            rows_by_number.setdefault(row["number"], row)
+        unmatched_files += [
+            info.filename for number, members in matches.items() if number not in rows_by_number
+            for info in members.values()
+        ]
+        
+        stored_hashes = {
+            (resource["songId"], resource["type"]): {resource.get("sha256"), resource.get("originalSha256")}
+            async for resource in db.resources.find(
+                {"songId": {"$in": [row["songId"] for row in valid]}, "type": {"$in": ["CHORDS_PDF", "LYRICS_PDF"]}},
+                {"_id": 0, "songId": 1, "type": 1, "sha256": 1, "originalSha256": 1}
+            )
+        }
+        
+        async def import_pdf(row: dict, resource_type: str, info: zipfile.ZipInfo) -> str:
+            # One member in memory per worker; the rest stays in the spooled upload
+            content = zip_file.read(info)
+            if hashlib.sha256(content).hexdigest() in stored_hashes.get((row["songId"], resource_type), ()):
+                return "unchanged"
+            if dryRun:
+                return "new"
+            await store_resource(row["songId"], resource_type, info.filename, "application/pdf", content, optimize, user)
+            return "stored"
+        
+        work = [
+            (row, resource_type, info)
+            for number, row in rows_by_number.items()
+            for resource_type, info in matches.get(number, {}).items()
+        ]
+        for start in range(0, len(work), PDF_WORKERS):
+            batch = work[start:start + PDF_WORKERS]
+            results = await asyncio.gather(*(import_pdf(*item) for item in batch), return_exceptions=True)
+            for (row, resource_type, info), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Import of {info.filename} failed: {result}")
+                    result = f"error: {result}"
+                row.setdefault("pdfs", {})[resource_type] = result
+    
+    summary = {status: 0 for status in ("created", "updated", "unchanged", "error")}
+    pdf_summary = {}
+    for row in rows:
+        summary[row["status"]] += 1
+        for result in row.get("pdfs", {}).values():
+            key = "error" if result.startswith("error") else result
+            pdf_summary[key] = pdf_summary.get(key, 0) + 1
+    
+    return {
+        "dryRun": dryRun,
+        "summary": {**summary, "pdfs": pdf_summary},
+        "rows": [{k: v for k, v in row.items() if k != "song"} for row in rows],
+        "unmatchedFiles": unmatched_files
+    }
 
 # ============ SEED DATA ============
 
@@ -1371,7 +2480,7 @@ async def seed_data():
     if existing > 0:
         return {"message": "Data already seeded"}
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utcnow()
     
     songs = [
         {"id": "02-grand-dieu-nous-te-benissons", "number": 2, "title": "Grand Dieu, nous te bénissons", "language": "fr", "keyOriginal": "G", "tags": ["louange", "adoration"], "accessTier": "STANDARD"},
@@ -1390,11 +2499,15 @@ async def seed_data():
         song["active"] = True
         song["createdAt"] = now
         song["updatedAt"] = now
+        song["changedAt"] = now
         song["downloadsCount"] = 0
         song["favoritesCount"] = 0
         song["tempo"] = None
     
     await db.songs.insert_many(songs)
+    await catalog_version.bump(db)
+    song_search.mark_stale()
+    song_suggest.mark_stale()
     
     # Create initial admin user from environment variables (required for first setup)
     admin_email = os.environ.get('ADMIN_EMAIL')
@@ -1409,8 +2522,8 @@ async def seed_data():
             "password": hash_password(admin_password),
             "displayName": "Admin",
             "plan": "TEAM",
-            "planExpiresAt": (datetime.now(timezone.utc) + timedelta(days=365)).isoformat(),
-            "graceUntil": (datetime.now(timezone.utc) + timedelta(days=368)).isoformat(),
+            "planExpiresAt": utcnow() + timedelta(days=365),
+            "graceUntil": utcnow() + timedelta(days=368),
             "teamId": None,
             "roleInTeam": None,
             "role": "ADMIN",
@@ -1450,6 +2563,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compression (brotli/gzip) for JSON responses
+app.add_middleware(CompressionMiddleware)
+
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1457,6 +2573,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_ttl_indexes(db)
+    await db.song_texts.create_index([("songId", 1), ("resourceType", 1)], unique=True)
+    await db.song_texts.create_index("updatedAt")
+    await db.songs.create_index([("changedAt", 1), ("id", 1)])
+    # Songs from before delta sync join the change feed once
+    await db.songs.update_many({"changedAt": {"$exists": False}}, {"$set": {"changedAt": utcnow()}})
+    await db.songs.create_index("updatedAt")
+    try:
+        await db.songs.create_index(SONG_KEY_INDEX, unique=True)
+    except OperationFailure as e:
+        # Existing duplicates must be merged by hand before the index can exist
+        logger.error(f"Songs have duplicate (number, language) pairs, unique index not created: {e}")
+    await db.songs.create_index(TRENDING_INDEX)
+    try:
+        # Replaced by the log-score index
+        await db.songs.drop_index("active_1_trendingScore_-1")
+    except OperationFailure:
+        pass
+    await db.song_pairs.create_index([("a", 1), ("b", 1)], unique=True)
+    await db.song_recommendations.create_index("songId", unique=True)
+    await db.download_rollups.create_index(ROLLUP_INDEX, unique=True)
+    await db.downloads.create_index("createdAt")
+    await db.song_views.create_index([("songId", 1), ("day", 1)], unique=True)
+    await db.song_views.create_index("day")
+    await db.favorites.create_index(FAVORITES_INDEX, unique=True)
+    await db.favorites.create_index([("uid", 1), ("createdAt", -1)])
+    await song_search.refresh(db)
+    await song_suggest.refresh(db)
+    await job_queue.create_indexes(db)
+    # Songs from before trending scores get theirs from the downloads log
+    if await db.songs.find_one({"trendingLog": {"$exists": False}}, {"_id": 0, "id": 1}):
+        await job_queue.enqueue(db, "recompute_trending", {}, priority=PRIORITY_LOW, max_attempts=1, dedupe_key="all")
+    await schedule_recommendations()
+    rollups = await ensure_rollup_state(db, utcnow())
+    if not rollups.get("backfilled"):
+        await job_queue.enqueue(db, "backfill_download_rollups", {}, priority=PRIORITY_LOW, dedupe_key="all")
+    await schedule_compaction()
+    job_queue.start(db)
+    view_tracker.start(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_queue.stop()
+    await view_tracker.stop()
     client.close()
+    shutdown_pool()
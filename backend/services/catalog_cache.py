@@ -0,0 +1,95 @@
+"""
+Catalog HTTP caching for Kantik Tracks Studio
+A catalog-wide version number turned into strong ETags for the public song endpoints
+"""
+
+import os
+import time
+import hashlib
+import logging
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# How long a process trusts its cached version before re-reading it; writes made
+# by this process bump it immediately, other nodes' writes show up within this window
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', 5))
+# Downloads do not bump the catalog version; orderings by trending score are
+# instead revalidated once per window of this many seconds
+TRENDING_CACHE_SECONDS = int(os.environ.get('TRENDING_CACHE_SECONDS', 300))
+CATALOG_CACHE_CONTROL = os.environ.get(
+    'CATALOG_CACHE_CONTROL',
+    'public, max-age=0, s-maxage=30, stale-while-revalidate=300'
+)
+
+
+class CatalogVersion:
+    """
+    Monotonic version of everything the public catalog endpoints return,
+    stored in the `counters` collection and bumped after every catalog write.
+    Download and favourite counters are not versioned: they may lag in a
+    cached representation until the next catalog change.
+    """
+
+    def __init__(self, ttl_seconds: float = CATALOG_VERSION_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._version: Optional[int] = None
+        self._expires = 0.0
+
+    def cached(self) -> Optional[int]:
+        """The version if it is fresh enough to answer without a database query"""
+        if self._version is not None and time.monotonic() < self._expires:
+            return self._version
+        return None
+
+    def _remember(self, version: int) -> int:
+        self._version = version
+        self._expires = time.monotonic() + self.ttl_seconds
+        return version
+
+    async def current(self, db) -> int:
+        cached = self.cached()
+        if cached is not None:
+            return cached
+        counter = await db.counters.find_one({"_id": "catalog"})
+        return self._remember(counter["version"] if counter else 0)
+
+    async def bump(self, db) -> int:
+        counter = await db.counters.find_one_and_update(
+            {"_id": "catalog"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._remember(counter["version"])
+
+
+def catalog_etag(version: int, *parts) -> str:
+    """Strong ETag for one catalog representation (route + query) at `version`"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return f'"c{version}-{digest}"'
+
+
+def trending_window(now: Optional[float] = None, seconds: int = TRENDING_CACHE_SECONDS) -> int:
+    """ETag part for representations ordered by trending score"""
+    return int((time.time() if now is None else now) // seconds)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def catalog_cache_headers(etag: str) -> dict:
+    # Signed-in callers get a personalised, private variant of the same URL
+    return {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL, "Vary": "Authorization"}
+
+
+catalog_version = CatalogVersion()
@@ -0,0 +1,103 @@
+"""
+Catalog facets for Kantik Tracks Studio
+Language, access tier and tag counts for the catalog filters, from one $facet aggregation
+"""
+
+import os
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FACET_TAG_LIMIT = int(os.environ.get('FACET_TAG_LIMIT', 50))
+FACET_CACHE_SIZE = int(os.environ.get('FACET_CACHE_SIZE', 500))
+
+FACET_FIELDS = ("language", "accessTier", "tags")
+
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    return [t.strip() for t in tags.split(",")] if tags else []
+
+
+def song_filters(language: Optional[str], access_tier: Optional[str], tags: Optional[str]) -> Dict[str, dict]:
+    """Per-facet filter conditions from the catalog query parameters"""
+    filters = {}
+    if language:
+        filters["language"] = language
+    if access_tier:
+        filters["accessTier"] = access_tier
+    if tags:
+        filters["tags"] = {"$in": split_tags(tags)}
+    return filters
+
+
+def facet_pipeline(base: dict, filters: Dict[str, dict], tag_limit: int = FACET_TAG_LIMIT) -> List[dict]:
+    """
+    One aggregation for every facet. Each facet applies the other facets'
+    filters but not its own, so the counts show what picking a different
+    value would return; `total` applies them all.
+    """
+    def others(field):
+        return {name: condition for name, condition in filters.items() if name != field}
+
+    facets = {}
+    for field in ("language", "accessTier"):
+        facets[field] = [
+            {"$match": others(field)},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+    facets["tags"] = [
+        {"$match": others("tags")},
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": tag_limit},
+    ]
+    facets["total"] = [{"$match": filters}, {"$count": "count"}]
+    return [{"$match": base}, {"$facet": facets}]
+
+
+def facet_counts(result: Optional[dict]) -> dict:
+    """Shape the $facet output as {field: [{value, count}], total}"""
+    result = result or {}
+    counts = {
+        field: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result.get(field, []) if bucket["_id"] is not None]
+        for field in FACET_FIELDS
+    }
+    total = result.get("total") or []
+    counts["total"] = total[0]["count"] if total else 0
+    return counts
+
+
+class FacetCache:
+    """
+    Facet counts per filter combination for one catalog version. Any song
+    write bumps the version, which empties the cache on the next lookup.
+    """
+
+    def __init__(self, max_entries: int = FACET_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._version: Optional[int] = None
+        self._entries: "OrderedDict[Tuple, dict]" = OrderedDict()
+
+    def get(self, version: int, key: Tuple) -> Optional[dict]:
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            return None
+        counts = self._entries.get(key)
+        if counts is not None:
+            self._entries.move_to_end(key)
+        return counts
+
+    def put(self, version: int, key: Tuple, counts: dict) -> None:
+        if version != self._version:
+            return
+        self._entries[key] = counts
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+facet_cache = FacetCache()
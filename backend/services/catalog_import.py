@@ -0,0 +1,121 @@
+"""
+Catalog import for Kantik Tracks Studio
+Parses a CSV of song metadata and pairs it with PDFs from a ZIP archive by song number
+"""
+
+import io
+import re
+import csv
+import logging
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# CSV header aliases -> SongCreate field
+COLUMN_ALIASES = {
+    "number": "number",
+    "no": "number",
+    "title": "title",
+    "titre": "title",
+    "language": "language",
+    "lang": "language",
+    "key": "keyOriginal",
+    "keyoriginal": "keyOriginal",
+    "tempo": "tempo",
+    "tags": "tags",
+    "accesstier": "accessTier",
+    "tier": "accessTier",
+}
+
+# Natural key of a song; unique so concurrent imports cannot duplicate one
+SONG_KEY_INDEX = [("number", 1), ("language", 1)]
+
+# Song fields an import may overwrite on an existing song
+IMPORTED_FIELDS = ("title", "language", "keyOriginal", "tempo", "tags", "accessTier")
+
+_LEADING_NUMBER = re.compile(r"^0*(\d+)")
+
+
+def parse_catalog_csv(data: bytes, model) -> List[dict]:
+    """
+    Validate every CSV row against `model` (SongCreate).
+    Returns [{"row", "number", "song", "errors"}]; `song` is None for invalid rows.
+    Tags are separated by ';' or '|' so they do not clash with the CSV delimiter.
+    Raises ValueError when the file is not UTF-8 text.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("catalog is not a UTF-8 encoded CSV file")
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {name: COLUMN_ALIASES.get(name.strip().lower().replace(" ", "").replace("_", "")) for name in reader.fieldnames or []}
+
+    results = []
+    seen = {}
+    for row_number, raw in enumerate(reader, start=2):  # row 1 is the header
+        values = {}
+        for name, value in raw.items():
+            field = columns.get(name)
+            if field and value is not None and value.strip() != "":
+                values[field] = value.strip()
+        if "tags" in values:
+            values["tags"] = [tag.strip() for tag in re.split(r"[;|]", values["tags"]) if tag.strip()]
+        if "accessTier" in values:
+            values["accessTier"] = values["accessTier"].upper()
+        if "language" in values:
+            values["language"] = values["language"].lower()
+
+        result = {"row": row_number, "number": values.get("number"), "song": None, "errors": []}
+        try:
+            song = model(**values).model_dump()
+            result["number"] = song["number"]
+            key = (song["number"], song["language"])
+            if key in seen:
+                result["errors"].append(f"Duplicate of row {seen[key]}")
+            else:
+                seen[key] = row_number
+                result["song"] = song
+        except ValidationError as e:
+            result["errors"] = [f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()]
+        results.append(result)
+    return results
+
+
+def pdf_member_type(name: str) -> str:
+    """LYRICS_PDF when the file name says so, otherwise CHORDS_PDF"""
+    basename = name.rsplit("/", 1)[-1].lower()
+    return "LYRICS_PDF" if ("lyric" in basename or "parole" in basename) else "CHORDS_PDF"
+
+
+def match_pdf_members(archive: zipfile.ZipFile) -> Tuple[Dict[int, Dict[str, zipfile.ZipInfo]], List[str]]:
+    """
+    Map song number -> {resource type: member} from names like '012.pdf',
+    'chords/12-chords.pdf' or '12_lyrics.pdf'. Returns (matches, unmatched names).
+    Only the central directory is read here; member data stays in the archive.
+    """
+    matches: Dict[int, Dict[str, zipfile.ZipInfo]] = {}
+    unmatched = []
+    for info in archive.infolist():
+        basename = info.filename.rsplit("/", 1)[-1]
+        if info.is_dir() or basename.startswith(".") or info.filename.startswith("__MACOSX/"):
+            continue
+        number = _LEADING_NUMBER.match(basename)
+        if not basename.lower().endswith(".pdf") or not number:
+            unmatched.append(info.filename)
+            continue
+        by_type = matches.setdefault(int(number.group(1)), {})
+        resource_type = pdf_member_type(info.filename)
+        if resource_type in by_type:
+            unmatched.append(info.filename)
+            continue
+        by_type[resource_type] = info
+    return matches, unmatched
+
+
+def song_changes(existing: dict, song: dict) -> Optional[dict]:
+    """Fields of `song` that differ from the stored song, or None"""
+    changes = {field: song.get(field) for field in IMPORTED_FIELDS if existing.get(field) != song.get(field)}
+    return changes or None
@@ -0,0 +1,193 @@
+"""
+Response compression for Kantik Tracks Studio
+Negotiated brotli/gzip for API responses, with compressed catalog bodies cached by ETag
+"""
+
+import os
+import gzip
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+# Compressed bodies kept per (ETag, encoding) for cacheable responses
+COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+
+# Only text-like media is worth compressing; JPEG previews, PDFs and ZIPs are
+# already compressed and would only cost CPU
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' or 'gzip' from an Accept-Encoding header, preferring brotli on equal q"""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.strip().lower()] = quality
+    wildcard = offered.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = offered.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def weak_etag(etag: str) -> str:
+    """
+    A compressed body is a different byte sequence, so its validator is
+    downgraded to weak (as nginx does); If-None-Match uses weak comparison.
+    """
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (ETag, encoding, uncompressed size)"""
+
+    def __init__(self, max_entries: int = COMPRESSION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str, int], body: bytes) -> None:
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _cacheable(headers: dict) -> bool:
+    etag = headers.get("etag", "")
+    cache_control = headers.get("cache-control", "").lower()
+    return bool(etag) and not etag.startswith("W/") and "private" not in cache_control and "no-store" not in cache_control
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-message responses (everything the JSON
+    API returns). Streamed responses - ZIP bundles, file downloads - pass
+    through untouched, as do small bodies and already-compressed media.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, cache: Optional[CompressedBodyCache] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else CompressedBodyCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding) if accept_encoding else None
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streaming response: send as is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in start_message["headers"]}
+            raw_headers = [(name, value) for name, value in start_message["headers"] if name.lower() != b"vary"]
+            vary = [v for v in headers.get("vary", "").split(",") if v.strip()]
+            if is_compressible(headers.get("content-type", "")) and not any(v.strip().lower() == "accept-encoding" for v in vary):
+                vary.append("Accept-Encoding")
+            if vary:
+                raw_headers.append((b"vary", ", ".join(v.strip() for v in vary).encode("latin-1")))
+
+            if start_message["status"] == 304 and encoding is not None and "etag" in headers:
+                # Match the validator the client got with its compressed copy
+                raw_headers = [(name, value) for name, value in raw_headers if name.lower() != b"etag"]
+                raw_headers.append((b"etag", weak_etag(headers["etag"]).encode("latin-1")))
+
+            if (
+                encoding is None
+                or start_message["status"] < 200 or start_message["status"] in (204, 304)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type", ""))
+            ):
+                await send({**start_message, "headers": raw_headers})
+                await send(message)
+                return
+
+            key = (headers["etag"], encoding, len(body)) if _cacheable(headers) else None
+            compressed = self.cache.get(key) if key else None
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if key:
+                    self.cache.put(key, compressed)
+
+            raw_headers = [
+                (name, value) for name, value in raw_headers
+                if name.lower() not in (b"content-length", b"etag")
+            ]
+            raw_headers.append((b"content-encoding", encoding.encode("latin-1")))
+            raw_headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            if "etag" in headers:
+                raw_headers.append((b"etag", weak_etag(headers["etag"]).encode("latin-1")))
+            await send({**start_message, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
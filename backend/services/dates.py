@@ -0,0 +1,130 @@
+"""
+Date codec for Kantik Tracks Studio
+Stores timestamps as native BSON dates while keeping ISO strings in API output
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional, Annotated
+from pydantic import BeforeValidator
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Timestamp fields per collection, used by the migration
+DATE_FIELDS = {
+    "users": ["createdAt", "updatedAt", "planExpiresAt", "graceUntil"],
+    "songs": ["createdAt", "updatedAt"],
+    "resources": ["updatedAt"],
+    "downloads": ["createdAt"],
+    "playlists": ["createdAt", "updatedAt"],
+    "teams": ["createdAt"],
+    "team_members": ["joinedAt"],
+    "team_invitations": ["createdAt", "expiresAt"],
+    "payments": ["createdAt", "reviewedAt"],
+}
+
+# Ephemeral collections expired by MongoDB's TTL monitor:
+# (collection, date field, expireAfterSeconds)
+TTL_INDEXES = [
+    ("team_invitations", "expiresAt", 0),
+    ("jobs", "expiresAt", 0),
+]
+
+
+def utcnow() -> datetime:
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """
+    Coerce a stored timestamp to an aware datetime.
+    Accepts native datetimes (naive ones are assumed UTC) and legacy ISO strings.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def to_iso(value: Any) -> Any:
+    """Render datetimes as ISO strings, pass anything else through"""
+    if isinstance(value, datetime):
+        return parse_datetime(value).isoformat()
+    return value
+
+
+# Response model field type: accepts a BSON date or a legacy string, emits an ISO string
+IsoDatetime = Annotated[str, BeforeValidator(to_iso)]
+
+
+async def ensure_ttl_indexes(db) -> None:
+    """Create the TTL indexes declared in TTL_INDEXES (idempotent)"""
+    for collection, field, expire_after in TTL_INDEXES:
+        await db[collection].create_index(field, expireAfterSeconds=expire_after)
+
+
+async def migrate_iso_dates(db, batch_size: int = 500) -> dict:
+    """
+    Convert ISO string timestamps to native BSON dates.
+    Only string-typed fields are touched, so the migration can be re-run safely.
+    Returns the number of documents updated per collection.
+    """
+    results = {}
+    for collection, fields in DATE_FIELDS.items():
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        projection = {field: 1 for field in fields}
+        updated = 0
+        ops = []
+
+        async for doc in db[collection].find(query, projection):
+            converted = {}
+            for field in fields:
+                if isinstance(doc.get(field), str):
+                    converted[field] = parse_datetime(doc[field])
+            if converted:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": converted}))
+            if len(ops) >= batch_size:
+                result = await db[collection].bulk_write(ops, ordered=False)
+                updated += result.modified_count
+                ops = []
+
+        if ops:
+            result = await db[collection].bulk_write(ops, ordered=False)
+            updated += result.modified_count
+
+        results[collection] = updated
+        logger.info(f"Date migration: {updated} documents updated in {collection}")
+
+    return results
+
+
+async def _main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent.parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        print(await migrate_iso_dates(db))
+        await ensure_ttl_indexes(db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m services.dates
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,55 @@
+"""
+Delta sync for Kantik Tracks Studio
+Change tokens and manifests for clients that keep a local copy of the catalog
+"""
+
+import os
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+# Changes younger than this are held back so a write that started earlier but
+# committed later cannot slip behind a token already handed out
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+
+# Resource fields a client needs to decide whether to re-download
+MANIFEST_FIELDS = ("id", "type", "filename", "contentType", "size", "sha256", "updatedAt")
+
+
+class InvalidChangeToken(ValueError):
+    pass
+
+
+def encode_change_token(changed_at: datetime, song_id: str) -> str:
+    """Opaque token for the position just after (changed_at, song_id)"""
+    millis = int(changed_at.timestamp() * 1000)
+    return base64.urlsafe_b64encode(f"{millis}:{song_id}".encode()).decode().rstrip("=")
+
+
+def decode_change_token(token: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        millis, song_id = raw.split(":", 1)
+        return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), song_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidChangeToken(str(e))
+
+
+def changes_filter(token: Optional[str], now: datetime) -> dict:
+    """
+    Songs changed after the token position, in (changedAt, id) order.
+    Without a token this is the whole catalog, inactive songs included.
+    """
+    settled = {"changedAt": {"$lt": now - timedelta(seconds=SYNC_SETTLE_SECONDS)}}
+    if not token:
+        return {"$or": [settled, {"changedAt": None}]}
+    changed_at, song_id = decode_change_token(token)
+    return {"$and": [settled, {"$or": [
+        {"changedAt": {"$gt": changed_at}},
+        {"changedAt": changed_at, "id": {"$gt": song_id}}
+    ]}]}
+
+
+def resource_manifest(resource: dict) -> dict:
+    return {field: resource.get(field) for field in MANIFEST_FIELDS}
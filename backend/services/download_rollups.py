@@ -0,0 +1,260 @@
+"""
+Download analytics for Kantik Tracks Studio
+Daily and monthly download counts per song, resource type and plan, plus raw-event retention
+"""
+
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from services.transactions import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+# Raw download events older than this are compacted; rollups are kept forever
+DOWNLOADS_RETENTION_DAYS = int(os.environ.get('DOWNLOADS_RETENTION_DAYS', 365))
+# UTC hour of the nightly compaction
+DOWNLOADS_COMPACT_HOUR = int(os.environ.get('DOWNLOADS_COMPACT_HOUR', 4))
+
+PERIODS = ("day", "month")
+GROUP_FIELDS = {"song": "songId", "resourceType": "resourceType", "plan": "plan"}
+ROLLUP_INDEX = [("period", 1), ("bucket", 1), ("songId", 1), ("resourceType", 1), ("plan", 1)]
+# Events from before plans were recorded
+UNKNOWN_PLAN = "UNKNOWN"
+
+RollupKey = Tuple[str, str, str, str, str]
+
+
+def bucket(at: datetime, period: str) -> str:
+    """'2026-03-01' for a day, '2026-03' for a month (UTC)"""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return at.strftime("%Y-%m-%d" if period == "day" else "%Y-%m")
+
+
+def rollup_counts(downloads: Iterable[dict], periods: Tuple[str, ...] = PERIODS) -> Dict[RollupKey, int]:
+    """Count download events per (period, bucket, songId, resourceType, plan)"""
+    counts: Dict[RollupKey, int] = defaultdict(int)
+    for download in downloads:
+        for period in periods:
+            key = (
+                period,
+                bucket(download["createdAt"], period),
+                download["songId"],
+                download.get("resourceType") or "",
+                download.get("plan") or UNKNOWN_PLAN,
+            )
+            counts[key] += 1
+    return counts
+
+
+def rollup_ops(counts: Dict[RollupKey, int], operator: str = "$inc") -> List[UpdateOne]:
+    """Upserts adding `counts` to the rollups, or with "$set" replacing them"""
+    return [
+        UpdateOne(
+            {"period": period, "bucket": day_or_month, "songId": song_id, "resourceType": resource_type, "plan": plan},
+            {operator: {"count": count}},
+            upsert=True
+        )
+        for (period, day_or_month, song_id, resource_type, plan), count in counts.items()
+    ]
+
+
+async def record_downloads(db, downloads: List[dict]) -> None:
+    """
+    Insert download events and add them to the rollups. The two writes are
+    not a transaction: every download of a song on one day bumps the same
+    rollup documents, and conflicting transactions would queue downloads
+    behind each other. Rollups that miss an event are corrected by
+    reconcile_rollups.
+    """
+    if not downloads:
+        return
+    await db.downloads.insert_many(downloads)
+    try:
+        await db.download_rollups.bulk_write(rollup_ops(rollup_counts(downloads)), ordered=False)
+    except Exception as e:
+        logger.warning(f"Download rollups not updated, the next reconcile will catch up: {e}")
+
+
+async def ensure_rollup_state(db, now: datetime) -> dict:
+    """
+    Rollups cover every download recorded from the first deploy that had
+    them (`since`); older events are added once by backfill_rollups.
+    """
+    await db.counters.update_one(
+        {"_id": "download_rollups"},
+        {"$setOnInsert": {"since": now, "backfilled": False}},
+        upsert=True
+    )
+    return await db.counters.find_one({"_id": "download_rollups"})
+
+
+async def backfill_rollups(db, client, ctx=None) -> dict:
+    """Roll up the downloads recorded before rollups existed"""
+    state = await db.counters.find_one({"_id": "download_rollups"})
+    if not state or state.get("backfilled"):
+        return {"skipped": "Already backfilled"}
+
+    counts: Dict[RollupKey, int] = defaultdict(int)
+    events = 0
+    batch = []
+    async for download in db.downloads.find(
+        {"createdAt": {"$lt": state["since"]}},
+        {"_id": 0, "songId": 1, "resourceType": 1, "plan": 1, "createdAt": 1}
+    ):
+        if not download.get("songId") or not isinstance(download.get("createdAt"), datetime):
+            continue
+        batch.append(download)
+        events += 1
+        if len(batch) >= 1000:
+            for key, count in rollup_counts(batch).items():
+                counts[key] += count
+            batch = []
+            if ctx is not None:
+                await ctx.progress(events)
+    for key, count in rollup_counts(batch).items():
+        counts[key] += count
+
+    ops = rollup_ops(counts)
+
+    async def save(session):
+        if ops:
+            await db.download_rollups.bulk_write(ops, ordered=False, session=session)
+        await db.counters.update_one({"_id": "download_rollups"}, {"$set": {"backfilled": True}}, session=session)
+
+    # Counts and the flag together, or a retried backfill would count twice
+    await run_in_transaction(client, save)
+    logger.info(f"Backfilled download rollups from {events} events")
+    return {"events": events, "rollups": len(ops)}
+
+
+async def reconcile_rollups(db, now: datetime, ctx=None) -> dict:
+    """
+    Recount the rollups from the raw events of every day since the last run,
+    overwriting counts that missed an event. Months are re-summed from their
+    days. Today is recounted again next time since it is still filling up.
+    """
+    state = await db.counters.find_one({"_id": "download_rollups"})
+    if not state or not state.get("backfilled"):
+        return {"skipped": "Rollups not backfilled yet"}
+
+    start = state.get("reconciledAt") or state["since"]
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    start = start.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    counts: Dict[RollupKey, int] = defaultdict(int)
+    events = 0
+    batch = []
+    async for download in db.downloads.find(
+        {"createdAt": {"$gte": start, "$lte": now}},
+        {"_id": 0, "songId": 1, "resourceType": 1, "plan": 1, "createdAt": 1}
+    ):
+        if not download.get("songId") or not isinstance(download.get("createdAt"), datetime):
+            continue
+        batch.append(download)
+        events += 1
+        if len(batch) >= 1000:
+            for key, count in rollup_counts(batch, ("day",)).items():
+                counts[key] += count
+            batch = []
+            if ctx is not None:
+                await ctx.progress(events)
+    for key, count in rollup_counts(batch, ("day",)).items():
+        counts[key] += count
+
+    ops = rollup_ops(counts, "$set")
+    if ops:
+        await db.download_rollups.bulk_write(ops, ordered=False)
+
+    # Whole months from their day rollups, which reach back to the first download
+    month_counts: Dict[RollupKey, int] = defaultdict(int)
+    async for row in db.download_rollups.find(
+        {"period": "day", "bucket": {"$gte": bucket(start, "month"), "$lte": bucket(now, "day")}},
+        {"_id": 0, "bucket": 1, "songId": 1, "resourceType": 1, "plan": 1, "count": 1}
+    ):
+        month_counts[("month", row["bucket"][:7], row["songId"], row["resourceType"], row["plan"])] += row["count"]
+    month_ops = rollup_ops(month_counts, "$set")
+    if month_ops:
+        await db.download_rollups.bulk_write(month_ops, ordered=False)
+
+    today = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    await db.counters.update_one({"_id": "download_rollups"}, {"$set": {"reconciledAt": today}})
+    logger.info(f"Reconciled download rollups from {start.date()}: {events} events, {len(ops)} day buckets")
+    return {"from": start.isoformat(), "events": events, "days": len(ops), "months": len(month_ops)}
+
+
+async def compact_downloads(db, now: datetime, retention_days: int = DOWNLOADS_RETENTION_DAYS, ctx=None) -> dict:
+    """
+    Delete raw download events older than the retention window, keeping the
+    newest one per user, song and resource type so libraries stay complete.
+    Rollups already hold the counts.
+    """
+    state = await db.counters.find_one({"_id": "download_rollups"})
+    if not state or not state.get("backfilled"):
+        return {"skipped": "Rollups not backfilled yet"}
+
+    cutoff = now - timedelta(days=retention_days)
+    kept = set()
+    doomed = []
+    deleted = 0
+    async for download in db.downloads.find(
+        {"createdAt": {"$lt": cutoff}},
+        {"_id": 1, "uid": 1, "songId": 1, "resourceType": 1}
+    ).sort("createdAt", -1):
+        key = (download.get("uid"), download.get("songId"), download.get("resourceType"))
+        if key not in kept:
+            kept.add(key)
+            continue
+        doomed.append(download["_id"])
+        if len(doomed) >= 1000:
+            deleted += (await db.downloads.delete_many({"_id": {"$in": doomed}})).deleted_count
+            doomed = []
+            if ctx is not None:
+                await ctx.progress(deleted)
+    if doomed:
+        deleted += (await db.downloads.delete_many({"_id": {"$in": doomed}})).deleted_count
+    logger.info(f"Compacted downloads before {cutoff.date()}: {deleted} deleted, {len(kept)} kept")
+    return {"cutoff": cutoff.isoformat(), "deleted": deleted, "kept": len(kept)}
+
+
+def analytics_pipeline(
+    period: str,
+    start: str,
+    end: str,
+    group_by: Optional[str] = None,
+    filters: Optional[Dict[str, str]] = None,
+    limit: int = 50
+) -> List[dict]:
+    """
+    One aggregation over the rollups for buckets in [start, end]: the time
+    series and, with `group_by`, the top `limit` values of that dimension.
+    """
+    match = {"period": period, "bucket": {"$gte": start, "$lte": end}, **(filters or {})}
+    facets = {
+        "series": [
+            {"$group": {"_id": "$bucket", "count": {"$sum": "$count"}}},
+            {"$sort": {"_id": 1}},
+        ],
+    }
+    if group_by:
+        facets["breakdown"] = [
+            {"$group": {"_id": f"${GROUP_FIELDS[group_by]}", "count": {"$sum": "$count"}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": limit},
+        ]
+    return [{"$match": match}, {"$facet": facets}]
+
+
+async def all_time_downloads(db) -> int:
+    """All-time download count from the monthly rollups"""
+    result = await db.download_rollups.aggregate([
+        {"$match": {"period": "month"}},
+        {"$group": {"_id": None, "count": {"$sum": "$count"}}},
+    ]).to_list(1)
+    return result[0]["count"] if result else 0
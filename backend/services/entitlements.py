@@ -0,0 +1,107 @@
+"""
+Team entitlements for Kantik Tracks Studio
+A TEAM subscription lives on the team document and is resolved for each member at read time
+"""
+
+import time
+import logging
+from typing import Optional
+
+from services.dates import parse_datetime, utcnow
+
+logger = logging.getLogger(__name__)
+
+ENTITLEMENT_FIELDS = ("plan", "planExpiresAt", "graceUntil")
+
+
+def is_entitlement_active(entitlement: dict) -> bool:
+    """True while the plan is paid up or within its grace period"""
+    now = utcnow()
+    expires_at = parse_datetime(entitlement.get("planExpiresAt"))
+    grace_until = parse_datetime(entitlement.get("graceUntil"))
+    return bool((expires_at and expires_at >= now) or (grace_until and grace_until >= now))
+
+
+def apply_team_entitlement(user: dict, entitlement: Optional[dict]) -> dict:
+    """
+    Overlay a team's entitlement on a member's user document.
+    The team plan wins while it is active; otherwise the member keeps their own plan.
+    """
+    if not entitlement or not is_entitlement_active(entitlement):
+        return user
+    return {**user, **{field: entitlement.get(field) for field in ENTITLEMENT_FIELDS}}
+
+
+class TeamEntitlementCache:
+    """Small in-process cache of {teamId: entitlement record}"""
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+
+    async def get(self, db, team_id: str) -> Optional[dict]:
+        """Return the team's entitlement record, loading it on a miss"""
+        cached = self._entries.get(team_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        entitlement = await self._load(db, team_id)
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[team_id] = (entitlement, time.monotonic() + self.ttl_seconds)
+        return entitlement
+
+    async def get_many(self, db, team_ids) -> dict:
+        """Entitlements for several teams, with one query for all misses"""
+        now = time.monotonic()
+        result = {}
+        missing = []
+        for team_id in set(team_ids):
+            cached = self._entries.get(team_id)
+            if cached and cached[1] > now:
+                result[team_id] = cached[0]
+            else:
+                missing.append(team_id)
+
+        if missing:
+            teams = await db.teams.find(
+                {"id": {"$in": missing}},
+                {"_id": 0, "id": 1, "ownerUid": 1, **{field: 1 for field in ENTITLEMENT_FIELDS}}
+            ).to_list(len(missing))
+            for team in teams:
+                entitlement = await self._from_team(db, team)
+                self._entries[team["id"]] = (entitlement, now + self.ttl_seconds)
+                result[team["id"]] = entitlement
+
+        return result
+
+    def invalidate(self, team_id: str) -> None:
+        self._entries.pop(team_id, None)
+
+    async def _load(self, db, team_id: str) -> Optional[dict]:
+        team = await db.teams.find_one(
+            {"id": team_id},
+            {"_id": 0, "ownerUid": 1, **{field: 1 for field in ENTITLEMENT_FIELDS}}
+        )
+        if not team:
+            return None
+        return await self._from_team(db, team)
+
+    async def _from_team(self, db, team: dict) -> dict:
+        # Teams created before entitlements moved to the team document
+        # fall back to the owner's plan fields
+        if "planExpiresAt" not in team:
+            owner = await db.users.find_one(
+                {"id": team.get("ownerUid")},
+                {"_id": 0, "planExpiresAt": 1, "graceUntil": 1}
+            ) or {}
+            team = {**team, **owner}
+        return {
+            "plan": "TEAM",
+            "planExpiresAt": team.get("planExpiresAt"),
+            "graceUntil": team.get("graceUntil")
+        }
+
+
+team_entitlements = TeamEntitlementCache()
@@ -0,0 +1,130 @@
+"""
+Fast JSON responses for Kantik Tracks Studio
+Serialises Mongo documents straight to orjson, with response-model validation optional per route
+"""
+
+import os
+import typing
+import logging
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Type
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel, create_model
+
+from services.dates import to_iso
+
+logger = logging.getLogger(__name__)
+
+# Routes that skip response-model validation: comma-separated route names or '*'.
+# Empty by default so development and tests always validate.
+SKIP_RESPONSE_VALIDATION = {
+    name.strip() for name in os.environ.get('SKIP_RESPONSE_VALIDATION', '').split(',') if name.strip()
+}
+
+
+def validation_enabled(route: str) -> bool:
+    return not ("*" in SKIP_RESPONSE_VALIDATION or route in SKIP_RESPONSE_VALIDATION)
+
+
+def _converter(field) -> Optional[Callable[[Any], Any]]:
+    """The coercion pydantic would apply to a stored value of this field, if any"""
+    annotations = [field.annotation, *typing.get_args(field.annotation)]
+    metadata = list(field.metadata)
+    for annotation in annotations:
+        metadata += getattr(annotation, "__metadata__", ())
+    if any(getattr(item, "func", None) is to_iso for item in metadata):
+        return to_iso
+    if float in annotations:
+        return lambda value: float(value) if isinstance(value, int) and not isinstance(value, bool) else value
+    return None
+
+
+class FastSerializer:
+    """
+    Shapes raw documents like `model` would - declared fields only, defaults
+    filled in, dates rendered as ISO strings - without running validation.
+    Only for flat models whose documents come from our own writes.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.fields = []
+        for name, field in model.model_fields.items():
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            self.fields.append((name, default, _converter(field)))
+
+    def row(self, document: dict) -> dict:
+        row = {}
+        for name, default, convert in self.fields:
+            value = document.get(name, default)
+            if convert is not None and value is not None:
+                value = convert(value)
+            row[name] = value
+        return row
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Field names from a `fields=` query parameter, in model order and always
+    including 'id'. None when the parameter is absent (all fields).
+    Raises ValueError naming any field `model` does not declare.
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested - set(model.model_fields))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(name for name in model.model_fields if name in requested or name == "id")
+
+
+def field_projection(fields: Optional[Tuple[str, ...]], *extra: str) -> dict:
+    """Mongo projection for `fields` plus any fields the route needs internally"""
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, **{name: 1 for name in (*fields, *extra)}}
+
+
+@lru_cache(maxsize=128)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """`model` trimmed to `fields`, keeping each field's type, default and validators"""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=model.model_config,
+        **{name: (field.annotation, field) for name, field in model.model_fields.items() if name in fields}
+    )
+
+
+_serializers: Dict[Type[BaseModel], FastSerializer] = {}
+
+
+def fast_response(
+    documents: Iterable[dict],
+    model: Type[BaseModel],
+    route: str,
+    headers: Optional[dict] = None,
+    fields: Optional[Tuple[str, ...]] = None
+) -> Response:
+    """
+    JSON list response for `documents` shaped by `model`, or by the subset of
+    it named in `fields`. The route keeps its response_model for the API
+    schema; returning a Response bypasses FastAPI's own validation, which this
+    does itself unless `route` is listed in SKIP_RESPONSE_VALIDATION.
+    """
+    if fields is not None:
+        model = partial_model(model, fields)
+    if validation_enabled(route):
+        payload = [model.model_validate(document).model_dump(mode="json") for document in documents]
+    else:
+        serializer = _serializers.get(model)
+        if serializer is None:
+            serializer = _serializers[model] = FastSerializer(model)
+        payload = [serializer.row(document) for document in documents]
+    return Response(
+        # UTC as 'Z' inside untyped dicts (resources), as pydantic renders them
+        content=orjson.dumps(payload, option=orjson.OPT_UTC_Z),
+        media_type="application/json",
+        headers=headers
+    )
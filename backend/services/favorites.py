@@ -0,0 +1,111 @@
+"""
+Favourites for Kantik Tracks Studio
+Per-user favourite songs with batched membership lookups and aggregated counter updates
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+FAVORITES_INDEX = [("uid", 1), ("songId", 1)]
+# Largest batch accepted by one favourites request
+FAVORITES_MAX_BATCH = 500
+
+DUPLICATE_KEY = 11000
+
+
+async def favorite_song_ids(db, uid: str, song_ids: Iterable[str]) -> Set[str]:
+    """Which of `song_ids` the user has favourited: one query for a whole page"""
+    song_ids = list(set(song_ids))
+    if not song_ids:
+        return set()
+    return {
+        favorite["songId"]
+        async for favorite in db.favorites.find({"uid": uid, "songId": {"$in": song_ids}}, {"_id": 0, "songId": 1})
+    }
+
+
+def mark_favorites(songs: List[dict], favorites: Set[str]) -> List[dict]:
+    for song in songs:
+        song["isFavorite"] = song["id"] in favorites
+    return songs
+
+
+async def apply_favorite_changes(db, uid: str, add: List[str], remove: List[str], now: datetime) -> dict:
+    """
+    Add and remove favourites in bulk, then move each song's favoritesCount
+    by what actually changed, in one bulk write. Re-adding a favourite or
+    removing a missing one is a no-op, so retries cannot skew the counts.
+    """
+    add = list(dict.fromkeys(add))
+    remove = [song_id for song_id in dict.fromkeys(remove) if song_id not in add]
+    deltas: Counter = Counter()
+    recounted = set()
+    removed = 0
+
+    failure = None
+    if add:
+        try:
+            result = await db.favorites.bulk_write([
+                UpdateOne(
+                    {"uid": uid, "songId": song_id},
+                    {"$setOnInsert": {"uid": uid, "songId": song_id, "createdAt": now}},
+                    upsert=True
+                )
+                for song_id in add
+            ], ordered=False)
+            upserted = list(result.upserted_ids)
+        except BulkWriteError as e:
+            # A concurrent request inserted some of the same favourites first
+            # (duplicate key): those are not ours to count, the rest still are
+            upserted = [item["index"] for item in e.details.get("upserted", [])]
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                failure = e
+        # Only upserts are new favourites
+        for index in upserted:
+            deltas[add[index]] += 1
+
+    if remove and failure is None:
+        existing = await favorite_song_ids(db, uid, remove)
+        if existing:
+            result = await db.favorites.delete_many({"uid": uid, "songId": {"$in": list(existing)}})
+            removed = result.deleted_count
+            if result.deleted_count == len(existing):
+                for song_id in existing:
+                    deltas[song_id] -= 1
+            else:
+                # A concurrent request removed some of them first: recount instead
+                await recount_favorites(db, existing)
+                recounted = existing
+
+    ops = [UpdateOne({"id": song_id}, {"$inc": {"favoritesCount": delta}}) for song_id, delta in deltas.items() if delta]
+    if ops:
+        await db.songs.bulk_write(ops, ordered=False)
+    if ops or recounted:
+        # Listings include isFavorite, so the user's cached pages are now stale
+        await db.users.update_one({"id": uid}, {"$inc": {"favoritesVersion": 1}})
+    if failure is not None:
+        raise failure
+    return {"added": sum(1 for delta in deltas.values() if delta > 0), "removed": removed}
+
+
+async def recount_favorites(db, song_ids: Iterable[str]) -> None:
+    """Set favoritesCount from the favourites collection for these songs"""
+    song_ids = list(song_ids)
+    counts = {
+        row["_id"]: row["count"]
+        async for row in db.favorites.aggregate([
+            {"$match": {"songId": {"$in": song_ids}}},
+            {"$group": {"_id": "$songId", "count": {"$sum": 1}}},
+        ])
+    }
+    await db.songs.bulk_write(
+        [UpdateOne({"id": song_id}, {"$set": {"favoritesCount": counts.get(song_id, 0)}}) for song_id in song_ids],
+        ordered=False
+    )
@@ -0,0 +1,339 @@
+"""
+Background jobs for Kantik Tracks Studio
+Mongo-backed queue with atomic claims, leases, heartbeats, retries and priorities
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.dates import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Concurrent jobs per server process (0 disables the worker on this node)
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', os.cpu_count() or 2))
+# A running job whose lease is not renewed within this long is picked up again
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 2))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 10))
+# Finished jobs are removed by a TTL index after this many days
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler whose job was cancelled or whose lease was lost"""
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting and cancellation checks"""
+
+    def __init__(self, queue: "JobQueue", job: dict):
+        self.queue = queue
+        self.job = job
+        self.cancelled = False
+
+    async def progress(self, done: int, total: Optional[int] = None, **extra) -> None:
+        """Record progress; doubles as a heartbeat"""
+        fields = {"progress.done": done, **{f"progress.{key}": value for key, value in extra.items()}}
+        if total is not None:
+            fields["progress.total"] = total
+        await self.queue.heartbeat(self, fields)
+        if self.cancelled:
+            raise JobCancelled(self.job["id"])
+
+
+JobHandler = Callable[[dict, JobContext], Awaitable[Optional[dict]]]
+
+
+class JobQueue:
+    """
+    Durable job queue on the `jobs` collection.
+    Any number of processes on any number of nodes can run workers against
+    the same collection; a job is only ever leased to one of them at a time.
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.db = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def handler(self, job_type: str):
+        """Decorator registering the coroutine that runs jobs of `job_type`"""
+        def register(fn: JobHandler) -> JobHandler:
+            self._handlers[job_type] = fn
+            return fn
+        return register
+
+    async def create_indexes(self, db) -> None:
+        await db.jobs.create_index("id", unique=True)
+        await db.jobs.create_index([("status", 1), ("priority", -1), ("runAt", 1)])
+        await db.jobs.create_index("leaseExpiresAt", sparse=True)
+        await db.jobs.create_index("activeKey", unique=True, sparse=True)
+
+    # ---- producers ----
+
+    async def enqueue(
+        self,
+        db,
+        job_type: str,
+        payload: dict = None,
+        priority: int = PRIORITY_NORMAL,
+        max_attempts: int = 3,
+        dedupe_key: Optional[str] = None,
+        created_by: Optional[str] = None,
+        run_at: Optional[datetime] = None
+    ) -> dict:
+        """
+        Queue a job, to run now or from `run_at`. With `dedupe_key`, an
+        identical job still waiting in the queue is returned instead of
+        queueing a second one. A job that already started does not count: it
+        may have read inputs that changed since.
+        """
+        now = utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload or {},
+            "status": "queued",
+            "priority": priority,
+            "attempts": 0,
+            "maxAttempts": max_attempts,
+            "runAt": run_at or now,
+            "progress": {},
+            "createdBy": created_by,
+            "createdAt": now,
+            "updatedAt": now
+        }
+        if dedupe_key:
+            # activeKey is unique while set and cleared once the job is claimed
+            job["dedupeKey"] = job["activeKey"] = f"{job_type}:{dedupe_key}"
+        try:
+            await db.jobs.insert_one(job)
+        except DuplicateKeyError:
+            existing = await db.jobs.find_one({"activeKey": job["activeKey"]}, {"_id": 0})
+            if existing:
+                return existing
+            await db.jobs.insert_one(job)
+        job.pop("_id", None)
+        self._wakeup.set()
+        return job
+
+    async def cancel(self, db, job_id: str) -> Optional[dict]:
+        """Cancel a queued job outright; ask a running one to stop at its next heartbeat"""
+        now = utcnow()
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": self._finished("cancelled", now), "$unset": {"activeKey": ""}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            return job
+        return await db.jobs.find_one_and_update(
+            {"id": job_id, "status": "running"},
+            {"$set": {"cancelRequested": True, "updatedAt": now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def retry(self, db, job_id: str) -> Optional[dict]:
+        """Queue a failed or cancelled job again with a fresh attempt budget"""
+        job = await db.jobs.find_one({"id": job_id, "status": {"$in": ["failed", "cancelled"]}}, {"_id": 0})
+        if not job:
+            return None
+        now = utcnow()
+        update = {
+            "$set": {"status": "queued", "attempts": 0, "runAt": now, "updatedAt": now, "progress": {}},
+            "$unset": {"error": "", "finishedAt": "", "expiresAt": "", "cancelRequested": ""}
+        }
+        if job.get("dedupeKey"):
+            update["$set"]["activeKey"] = job["dedupeKey"]
+        try:
+            return await db.jobs.find_one_and_update(
+                {"id": job_id, "status": job["status"]},
+                update,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # An identical job was queued in the meantime
+            return None
+        finally:
+            self._wakeup.set()
+
+    # ---- workers ----
+
+    def _finished(self, status: str, now) -> dict:
+        return {
+            "status": status,
+            "finishedAt": now,
+            "updatedAt": now,
+            "expiresAt": now + timedelta(days=JOB_RETENTION_DAYS)
+        }
+
+    async def claim(self, db) -> Optional[dict]:
+        """Atomically lease the most urgent runnable job, including ones whose worker died"""
+        now = utcnow()
+        return await db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "runAt": {"$lte": now}},
+                {"status": "running", "leaseExpiresAt": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "leaseOwner": self.worker_id,
+                    "leaseExpiresAt": now + timedelta(seconds=self.lease_seconds),
+                    "heartbeatAt": now,
+                    "startedAt": now,
+                    "updatedAt": now
+                },
+                "$unset": {"activeKey": ""},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("priority", -1), ("runAt", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def heartbeat(self, ctx: JobContext, fields: dict = None) -> None:
+        """Extend the lease; flags the context cancelled if the job was cancelled or taken over"""
+        now = utcnow()
+        job = await self.db.jobs.find_one_and_update(
+            {"id": ctx.job["id"], "leaseOwner": self.worker_id, "status": "running"},
+            {"$set": {
+                "leaseExpiresAt": now + timedelta(seconds=self.lease_seconds),
+                "heartbeatAt": now,
+                "updatedAt": now,
+                **(fields or {})
+            }},
+            projection={"_id": 0, "id": 1, "cancelRequested": 1}
+        )
+        if job is None or job.get("cancelRequested"):
+            ctx.cancelled = True
+
+    async def _keep_alive(self, ctx: JobContext, task: asyncio.Task) -> None:
+        while not task.done():
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.heartbeat(ctx)
+            except Exception as e:
+                # Keep trying: the lease outlives a couple of missed beats
+                logger.warning(f"Heartbeat for job {ctx.job['id']} failed: {e}")
+                continue
+            if ctx.cancelled:
+                task.cancel()
+                return
+
+    async def _finish(self, job: dict, status: str, fields: dict) -> None:
+        now = utcnow()
+        await self.db.jobs.update_one(
+            {"id": job["id"], "leaseOwner": self.worker_id},
+            {
+                "$set": {**self._finished(status, now), **fields},
+                "$unset": {"leaseOwner": "", "leaseExpiresAt": ""}
+            }
+        )
+
+    async def run_job(self, job: dict) -> None:
+        """Run one claimed job to completion, retry or failure"""
+        handler = self._handlers.get(job["type"])
+        if handler is None:
+            await self._finish(job, "failed", {"error": f"No handler for job type {job['type']}"})
+            return
+        if job.get("cancelRequested"):
+            await self._finish(job, "cancelled", {})
+            return
+
+        ctx = JobContext(self, job)
+        task = asyncio.ensure_future(handler(job, ctx))
+        keep_alive = asyncio.ensure_future(self._keep_alive(ctx, task))
+        try:
+            result = await task
+        except (JobCancelled, asyncio.CancelledError):
+            if self._stopping and not ctx.cancelled:
+                # Shutting down: leave the lease to expire so another worker resumes it
+                raise
+            if ctx.cancelled:
+                await self._finish(job, "cancelled", {})
+            return
+        except Exception as e:
+            logger.exception(f"Job {job['id']} ({job['type']}) failed on attempt {job['attempts']}")
+            if job["attempts"] < job["maxAttempts"]:
+                now = utcnow()
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+                await self.db.jobs.update_one(
+                    {"id": job["id"], "leaseOwner": self.worker_id},
+                    {
+                        "$set": {"status": "queued", "runAt": now + timedelta(seconds=delay), "error": str(e), "updatedAt": now},
+                        "$unset": {"leaseOwner": "", "leaseExpiresAt": ""}
+                    }
+                )
+            else:
+                await self._finish(job, "failed", {"error": str(e)})
+            return
+        finally:
+            keep_alive.cancel()
+
+        await self._finish(job, "succeeded", {"result": result or {}})
+
+    async def _worker_loop(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self.claim(self.db)
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                if job["attempts"] > job["maxAttempts"]:
+                    # Its worker kept dying mid-job
+                    await self._finish(job, "failed", {"error": "Lease expired on every attempt"})
+                else:
+                    await self.run_job(job)
+            except Exception:
+                # The lease expires and another worker picks the job up; this slot carries on
+                logger.exception(f"Job {job['id']} ({job['type']}) could not be recorded")
+
+    def start(self, db) -> None:
+        """Start this process's worker slots"""
+        self.db = db
+        self._stopping = False
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.ensure_future(self._worker_loop()))
+        if self.concurrency:
+            logger.info(f"Job worker {self.worker_id} started with {self.concurrency} slots")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_queue = JobQueue()
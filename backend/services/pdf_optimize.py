@@ -0,0 +1,92 @@
+"""
+PDF optimisation for Kantik Tracks Studio
+Shrinks uploaded PDFs: image downsampling, object garbage collection and stream compression
+"""
+
+import io
+import os
+import logging
+from typing import Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Default for PDF uploads; the admin can override it per upload
+PDF_OPTIMIZE_ON_UPLOAD = os.environ.get('PDF_OPTIMIZE_ON_UPLOAD', 'false').lower() in ('1', 'true', 'yes')
+# Images rendered above this resolution are resampled down to it
+PDF_MAX_IMAGE_DPI = int(os.environ.get('PDF_MAX_IMAGE_DPI', 200))
+
+JPEG_EXTENSIONS = ("jpeg", "jpg", "jpx")
+
+
+def _downsample_images(document, max_dpi: int) -> int:
+    """Resample images drawn above max_dpi. Returns the number of images replaced."""
+    replaced = 0
+    seen = set()
+    for page in document:
+        for image in page.get_images(full=True):
+            xref, smask = image[0], image[1]
+            # Soft masks (transparency) would need resampling in lockstep: leave them alone
+            if xref in seen or smask:
+                continue
+            seen.add(xref)
+
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+            drawn_width_in = max(rect.width for rect in rects) / 72
+            info = document.extract_image(xref)
+            # Bilevel scans are already tiny with CCITT/JBIG2, resampling bloats them
+            if not info or not drawn_width_in or info.get("bpc", 8) == 1:
+                continue
+
+            dpi = info["width"] / drawn_width_in
+            if dpi <= max_dpi * 1.1:
+                continue
+
+            scale = max_dpi / dpi
+            size = (max(1, round(info["width"] * scale)), max(1, round(info["height"] * scale)))
+            try:
+                img = Image.open(io.BytesIO(info["image"]))
+                if img.mode not in ("L", "RGB"):
+                    img = img.convert("RGB")
+                img = img.resize(size, Image.LANCZOS)
+                output = io.BytesIO()
+                if info["ext"] in JPEG_EXTENSIONS:
+                    img.save(output, format="JPEG", quality=85, optimize=True)
+                else:
+                    img.save(output, format="PNG", optimize=True)
+                page.replace_image(xref, stream=output.getvalue())
+                replaced += 1
+            except Exception as e:
+                logger.warning(f"Could not downsample image {xref}: {e}")
+    return replaced
+
+
+def optimize_pdf(pdf_data: bytes, max_dpi: int = PDF_MAX_IMAGE_DPI) -> Tuple[bytes, dict]:
+    """
+    Rewrite a PDF smaller: downsample oversized images, drop unused and
+    duplicate objects, deflate every stream. Runs in a worker process.
+    Returns (bytes, stats); the original bytes come back if nothing was gained.
+    """
+    document = fitz.open(stream=pdf_data, filetype="pdf")
+    images_downsampled = _downsample_images(document, max_dpi)
+    optimized = document.tobytes(
+        garbage=4,
+        deflate=True,
+        deflate_images=True,
+        deflate_fonts=True,
+        clean=True
+    )
+    document.close()
+
+    stats = {
+        "originalSize": len(pdf_data),
+        "optimizedSize": min(len(optimized), len(pdf_data)),
+        "imagesDownsampled": images_downsampled
+    }
+    if len(optimized) >= len(pdf_data):
+        return pdf_data, stats
+    return optimized, stats
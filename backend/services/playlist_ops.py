@@ -0,0 +1,45 @@
+"""
+Playlist patch operations for Kantik Tracks Studio
+Applies ordered move / insert / remove ops to a playlist's songIds
+"""
+
+from typing import List
+
+
+class PlaylistOpError(ValueError):
+    """An op does not apply to the current song list"""
+
+
+def apply_playlist_ops(song_ids: List[str], ops: List[dict]) -> List[str]:
+    """
+    Apply ops in order and return the new song list (the input is not modified).
+
+    - {"op": "move", "songId": ..., "index": n}: take the song out and put it at n
+    - {"op": "insert", "songId": ..., "index": n}: insert at n, or append when index is None
+    - {"op": "remove", "songId": ...}: drop the song
+    Indexes are clamped to the list bounds, like list.insert.
+    """
+    result = list(song_ids)
+    for op in ops:
+        kind, song_id, index = op["op"], op["songId"], op.get("index")
+
+        if kind == "insert":
+            if song_id in result:
+                raise PlaylistOpError(f"Song {song_id} is already in the playlist")
+            result.insert(len(result) if index is None else index, song_id)
+            continue
+
+        if song_id not in result:
+            raise PlaylistOpError(f"Song {song_id} is not in the playlist")
+
+        if kind == "remove":
+            result.remove(song_id)
+        elif kind == "move":
+            if index is None:
+                raise PlaylistOpError("Move requires an index")
+            result.remove(song_id)
+            result.insert(index, song_id)
+        else:
+            raise PlaylistOpError(f"Unknown op {kind}")
+
+    return result
@@ -0,0 +1,195 @@
+"""
+Preview rendering for Kantik Tracks Studio
+Renders the first page of a chord chart to a watermarked JPEG; runs in worker processes
+"""
+
+import io
+import os
+import time
+import uuid
+import base64
+import asyncio
+import hashlib
+import logging
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw, ImageFont
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from services.dates import utcnow
+from services.catalog_cache import catalog_version
+from services.workers import run_in_process, PDF_WORKERS
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_WIDTH = int(os.environ.get('PREVIEW_WIDTH', 1000))
+# Stored on each preview; bump the prefix when the watermark or rendering changes
+PREVIEW_STYLE = f"v1-{PREVIEW_WIDTH}"
+# Chord charts rendered and written back per round trip
+PREVIEW_BATCH_SIZE = int(os.environ.get('PREVIEW_BATCH_SIZE', PDF_WORKERS * 2))
+
+
+def generate_pdf_preview(pdf_data: bytes, add_watermark: bool = True) -> bytes:
+    """
+    Generate a preview image from the first page of a PDF.
+    Returns JPEG image bytes.
+    """
+    try:
+        # Open PDF from bytes
+        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
+        
+        # Get first page
+        page = pdf_document[0]
+        
+        # Render page to image at 150 DPI for good quality
+        # Calculate zoom to get approximately PREVIEW_WIDTH px width
+        zoom = PREVIEW_WIDTH / page.rect.width
+        matrix = fitz.Matrix(zoom, zoom)
+        
+        # Render to pixmap
+        pixmap = page.get_pixmap(matrix=matrix, alpha=False)
+        
+        # Convert to PIL Image
+        img = Image.frombytes("RGB", [pixmap.width, pixmap.height], pixmap.samples)
+        
+        # Add watermark if requested
+        if add_watermark:
+            draw = ImageDraw.Draw(img)
+            watermark_text = "PREVIEW"
+            
+            # Calculate font size based on image width
+            font_size = int(img.width / 8)
+            try:
+                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
+            except:
+                font = ImageFont.load_default()
+            
+            # Get text bounding box
+            bbox = draw.textbbox((0, 0), watermark_text, font=font)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            
+            # Position text in center
+            x = (img.width - text_width) / 2
+            y = (img.height - text_height) / 2
+            
+            # Draw semi-transparent watermark (gray with low opacity effect)
+            draw.text((x, y), watermark_text, font=font, fill=(200, 200, 200, 80))
+        
+        # Convert to JPEG bytes
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=80)
+        output.seek(0)
+        
+        pdf_document.close()
+        return output.getvalue()
+        
+    except Exception as e:
+        logging.error(f"Failed to generate PDF preview: {e}")
+        return None
+
+
+def preview_resource(song_id: str, preview_data: bytes, source_sha256: str = None) -> dict:
+    """Resource document for an auto-generated preview"""
+    return {
+        "id": str(uuid.uuid4()),
+        "songId": song_id,
+        "type": "PREVIEW_IMAGE",
+        "filename": "preview.jpg",
+        "contentType": "image/jpeg",
+        "data": base64.b64encode(preview_data).decode(),
+        "autoGenerated": True,
+        "sourceSha256": source_sha256,
+        "previewStyle": PREVIEW_STYLE,
+        "updatedAt": utcnow()
+    }
+
+
+def _is_current(preview: dict, source_sha256: str) -> bool:
+    return bool(
+        preview
+        and source_sha256
+        and preview.get("sourceSha256") == source_sha256
+        and preview.get("previewStyle") == PREVIEW_STYLE
+    )
+
+
+async def regenerate_previews(db, ctx, force: bool = False, batch_size: int = PREVIEW_BATCH_SIZE) -> dict:
+    """
+    Re-render the preview of every chord chart whose source or preview style changed.
+    Chord charts are loaded one batch at a time, rendered across the worker pool
+    and written back with one bulk write per batch. Progress goes to `ctx`.
+    """
+    started = time.monotonic()
+    previews = {
+        preview["songId"]: preview
+        async for preview in db.resources.find(
+            {"type": "PREVIEW_IMAGE", "autoGenerated": True},
+            {"_id": 0, "songId": 1, "sourceSha256": 1, "previewStyle": 1}
+        )
+    }
+    sources = await db.resources.find(
+        {"type": "CHORDS_PDF"},
+        {"_id": 0, "id": 1, "songId": 1, "sha256": 1}
+    ).to_list(None)
+
+    # Hashed sources can be skipped without loading their bytes
+    pending = [source for source in sources if force or not _is_current(previews.get(source["songId"]), source.get("sha256"))]
+    counts = {"rendered": 0, "skipped": len(sources) - len(pending), "failed": 0}
+    await ctx.progress(0, total=len(pending), **counts)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        loaded = await db.resources.find(
+            {"id": {"$in": [source["id"] for source in batch]}},
+            {"_id": 0, "id": 1, "songId": 1, "sha256": 1, "data": 1}
+        ).to_list(len(batch))
+
+        to_render = []
+        rendered_ids = []
+        ops = []
+        for source in loaded:
+            pdf_data = base64.b64decode(source["data"])
+            sha256 = source.get("sha256")
+            if not sha256:
+                # Uploaded before hashing: backfill the hash while we have the bytes
+                sha256 = hashlib.sha256(pdf_data).hexdigest()
+                ops.append(UpdateOne({"id": source["id"]}, {"$set": {"sha256": sha256, "size": len(pdf_data)}}))
+                if not force and _is_current(previews.get(source["songId"]), sha256):
+                    counts["skipped"] += 1
+                    continue
+            to_render.append((source["songId"], sha256, pdf_data))
+
+        rendered = await asyncio.gather(
+            *(run_in_process(generate_pdf_preview, pdf_data, True) for _, _, pdf_data in to_render),
+            return_exceptions=True
+        )
+        for (song_id, sha256, _), preview_data in zip(to_render, rendered):
+            if not preview_data or isinstance(preview_data, BaseException):
+                counts["failed"] += 1
+                continue
+            ops.append(DeleteMany({"songId": song_id, "type": "PREVIEW_IMAGE", "autoGenerated": True}))
+            ops.append(InsertOne(preview_resource(song_id, preview_data, sha256)))
+            rendered_ids.append(song_id)
+            counts["rendered"] += 1
+
+        if ops:
+            await db.resources.bulk_write(ops, ordered=True)
+        if rendered_ids:
+            # Synced clients pick up the new previews
+            await db.songs.update_many({"id": {"$in": rendered_ids}}, {"$set": {"changedAt": utcnow()}})
+            await catalog_version.bump(db)
+
+        done = min(start + batch_size, len(pending))
+        elapsed = time.monotonic() - started
+        per_second = round(done / elapsed, 2) if elapsed else 0
+        await ctx.progress(
+            done,
+            total=len(pending),
+            perSecond=per_second,
+            etaSeconds=round((len(pending) - done) / per_second) if per_second else None,
+            **counts
+        )
+
+    logger.info(f"Preview regeneration: {counts} in {time.monotonic() - started:.1f}s")
+    return {**counts, "seconds": round(time.monotonic() - started, 2)}
@@ -0,0 +1,167 @@
+"""
+Song recommendations for Kantik Tracks Studio
+"Often used together" neighbours from download sessions and playlists, rebuilt by a nightly job
+"""
+
+import os
+import math
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, UpdateOne
+
+from services.dates import utcnow
+from services.transactions import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', 10))
+# Pairs seen together fewer times than this are noise
+RECOMMENDATIONS_MIN_SUPPORT = float(os.environ.get('RECOMMENDATIONS_MIN_SUPPORT', 2))
+# UTC hour of the nightly rebuild
+RECOMMENDATIONS_HOUR = int(os.environ.get('RECOMMENDATIONS_HOUR', 3))
+# A song placed in a setlist says more than one downloaded in the same session
+PLAYLIST_WEIGHT = float(os.environ.get('RECOMMENDATIONS_PLAYLIST_WEIGHT', 2))
+
+Pair = Tuple[str, str]
+
+
+def next_run(now: datetime, hour: int = RECOMMENDATIONS_HOUR) -> datetime:
+    """The next `hour`:00 UTC strictly after `now`"""
+    run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    return run if run > now else run + timedelta(days=1)
+
+
+def add_basket(counts: Dict[Pair, float], songs: Iterable[str], weight: float = 1.0) -> None:
+    """
+    Count one basket (a download session or a playlist): every pair of songs
+    in it, plus (a, a) on the diagonal for each song's own basket count.
+    """
+    songs = sorted(set(songs))
+    for i, a in enumerate(songs):
+        counts[(a, a)] += weight
+        for b in songs[i + 1:]:
+            counts[(a, b)] += weight
+
+
+def top_neighbours(
+    counts: Dict[Pair, float],
+    top_k: int = RECOMMENDATIONS_TOP_K,
+    min_support: float = RECOMMENDATIONS_MIN_SUPPORT
+) -> Dict[str, List[dict]]:
+    """
+    Cosine-normalised co-occurrence, c(a,b) / sqrt(c(a,a) * c(b,b)), so songs
+    that are simply downloaded a lot do not top every list.
+    """
+    candidates: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+    for (a, b), together in counts.items():
+        if a == b or together < min_support:
+            continue
+        score = together / math.sqrt(counts[(a, a)] * counts[(b, b)])
+        candidates[a].append((score, b))
+        candidates[b].append((score, a))
+    return {
+        song_id: [{"songId": other, "score": round(score, 4)} for score, other in sorted(pairs, key=lambda p: (-p[0], p[1]))[:top_k]]
+        for song_id, pairs in candidates.items()
+    }
+
+
+async def download_session_counts(db, start: Optional[datetime], end: datetime) -> Tuple[Dict[Pair, float], int]:
+    """Pair counts from downloads in [start, end); a session is one user's downloads on one UTC day"""
+    query = {"createdAt": {"$lt": end}}
+    if start:
+        query["createdAt"]["$gte"] = start
+    sessions: Dict[Tuple[str, str], set] = defaultdict(set)
+    async for download in db.downloads.find(query, {"_id": 0, "uid": 1, "songId": 1, "createdAt": 1}):
+        if download.get("uid") and download.get("songId"):
+            sessions[(download["uid"], download["createdAt"].date().isoformat())].add(download["songId"])
+    counts: Dict[Pair, float] = defaultdict(float)
+    for songs in sessions.values():
+        add_basket(counts, songs)
+    return counts, len(sessions)
+
+
+async def playlist_counts(db) -> Tuple[Dict[Pair, float], int]:
+    counts: Dict[Pair, float] = defaultdict(float)
+    playlists = 0
+    async for playlist in db.playlists.find({}, {"_id": 0, "songIds": 1}):
+        if len(playlist.get("songIds") or []) > 1:
+            add_basket(counts, playlist["songIds"], PLAYLIST_WEIGHT)
+            playlists += 1
+    return counts, playlists
+
+
+async def rebuild_recommendations(db, client, ctx=None, now: Optional[datetime] = None) -> dict:
+    """
+    Fold the download sessions of every complete day since the last run into
+    the stored pair counts, recount playlists (they are edited in place),
+    then rewrite each song's top neighbours.
+
+    song_pairs keeps the download and playlist counts separately; the
+    download counts only ever grow, so a run reads just the new days.
+    """
+    now = now or utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    state = await db.counters.find_one({"_id": "recommendations"}) or {}
+    since = state.get("downloadsThrough")
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    new_downloads, sessions = (
+        await download_session_counts(db, since, today) if since is None or since < today else ({}, 0)
+    )
+    playlists, playlist_total = await playlist_counts(db)
+    if ctx is not None:
+        await ctx.progress(1, total=3, sessions=sessions, playlists=playlist_total)
+
+    stored: Dict[Pair, dict] = {}
+    async for pair in db.song_pairs.find({}, {"_id": 0}):
+        stored[(pair["a"], pair["b"])] = pair
+
+    ops = []
+    combined: Dict[Pair, float] = {}
+    for key in set(stored) | set(new_downloads) | set(playlists):
+        previous = stored.get(key, {})
+        downloads = previous.get("downloads", 0.0) + new_downloads.get(key, 0.0)
+        listed = playlists.get(key, 0.0)
+        if downloads != previous.get("downloads", 0.0) or listed != previous.get("playlists", 0.0):
+            if downloads or listed:
+                ops.append(UpdateOne(
+                    {"a": key[0], "b": key[1]},
+                    {"$set": {"downloads": downloads, "playlists": listed}},
+                    upsert=True
+                ))
+            else:
+                ops.append(DeleteOne({"a": key[0], "b": key[1]}))
+        if downloads or listed:
+            combined[key] = downloads + listed
+
+    async def save_counts(session):
+        if ops:
+            await db.song_pairs.bulk_write(ops, ordered=False, session=session)
+        await db.counters.update_one(
+            {"_id": "recommendations"},
+            {"$set": {"downloadsThrough": today, "updatedAt": now}},
+            upsert=True,
+            session=session
+        )
+
+    # The watermark must move with the counts or a rerun would count days twice
+    await run_in_transaction(client, save_counts)
+    if ctx is not None:
+        await ctx.progress(2, total=3, pairs=len(combined))
+
+    neighbours = top_neighbours(combined)
+    writes = [
+        ReplaceOne({"songId": song_id}, {"songId": song_id, "neighbours": songs, "updatedAt": now}, upsert=True)
+        for song_id, songs in neighbours.items()
+    ]
+    writes.append(DeleteMany({"songId": {"$nin": list(neighbours)}}))
+    await db.song_recommendations.bulk_write(writes, ordered=False)
+    if ctx is not None:
+        await ctx.progress(3, total=3, songs=len(neighbours))
+
+    logger.info(f"Recommendations rebuilt: {sessions} new sessions, {playlist_total} playlists, {len(neighbours)} songs")
+    return {"sessions": sessions, "playlists": playlist_total, "pairs": len(combined), "songs": len(neighbours)}
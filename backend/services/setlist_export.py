@@ -0,0 +1,156 @@
+"""
+Setlist PDF export for Kantik Tracks Studio
+Merges a playlist's chord charts behind a cover and index page, with an on-disk cache
+"""
+
+import os
+import io
+import math
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'kantik-exports'))
+EXPORT_CACHE_MAX_FILES = int(os.environ.get('EXPORT_CACHE_MAX_FILES', 200))
+
+INDEX_ROWS_PER_PAGE = 32
+GOLD = HexColor("#D4AF37")
+PURPLE = HexColor("#2E0249")
+
+
+def export_cache_key(
+    playlist: dict,
+    songs: List[dict],
+    resources: List[dict],
+    date: str,
+    subscriber: Optional[str] = None
+) -> str:
+    """
+    Cache key for a setlist export: changes whenever the playlist, a song's
+    metadata or one of the chord charts changes, and daily for the cover date.
+    Exports with stamped charts are keyed by `subscriber` so they are never
+    served to another user.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{playlist['id']}|{playlist.get('updatedAt')}|{playlist.get('name')}|{date}|{subscriber or ''}".encode())
+    for song, resource in zip(songs, resources):
+        # Each upload creates a new resource id, so it stands in for a missing hash
+        content_hash = resource.get("sha256") or resource["id"]
+        digest.update(f"|{song['id']}:{song.get('updatedAt')}:{content_hash}".encode())
+    return digest.hexdigest()
+
+
+def _build_front_matter(title: str, subtitle: str, entries: List[Tuple[int, str, int]], index_pages: int) -> bytes:
+    """Cover page plus index pages listing (number, title, start page)"""
+    output = io.BytesIO()
+    pdf = canvas.Canvas(output, pagesize=letter)
+    width, height = letter
+
+    # Cover
+    pdf.setFillColor(PURPLE)
+    pdf.rect(0, 0, width, height, fill=1, stroke=0)
+    pdf.setFillColor(GOLD)
+    pdf.setFont("Helvetica-Bold", 32)
+    pdf.drawCentredString(width / 2, height * 0.6, title[:40])
+    pdf.setFont("Helvetica", 14)
+    pdf.drawCentredString(width / 2, height * 0.6 - 32, subtitle)
+    pdf.setFont("Helvetica", 11)
+    pdf.drawCentredString(width / 2, 60, "Kantik Tracks Studio")
+    pdf.showPage()
+
+    # Index
+    for page in range(index_pages):
+        rows = entries[page * INDEX_ROWS_PER_PAGE:(page + 1) * INDEX_ROWS_PER_PAGE]
+        pdf.setFillColor(PURPLE)
+        pdf.setFont("Helvetica-Bold", 20)
+        pdf.drawString(60, height - 72, "Index")
+        pdf.setFont("Helvetica", 12)
+        y = height - 110
+        for number, song_title, start_page in rows:
+            pdf.drawString(60, y, f"{number}.")
+            pdf.drawString(100, y, song_title[:60])
+            pdf.drawRightString(width - 60, y, str(start_page))
+            y -= 20
+        pdf.showPage()
+
+    pdf.save()
+    return output.getvalue()
+
+
+def merge_setlist_pdf(title: str, subtitle: str, charts: List[Tuple[int, str, bytes]]) -> bytes:
+    """
+    Merge chord charts, in order, behind a cover and index page.
+    `charts` is a list of (song number, song title, PDF bytes). Runs in a worker process.
+    """
+    documents = []
+    for number, song_title, pdf_data in charts:
+        try:
+            documents.append((number, song_title, fitz.open(stream=pdf_data, filetype="pdf")))
+        except Exception as e:
+            logger.error(f"Skipping unreadable chord chart for song {number}: {e}")
+
+    index_pages = max(1, math.ceil(len(documents) / INDEX_ROWS_PER_PAGE))
+    entries = []
+    next_page = 1 + index_pages + 1
+    for number, song_title, document in documents:
+        entries.append((number, song_title, next_page))
+        next_page += document.page_count
+
+    output = fitz.open(stream=_build_front_matter(title, subtitle, entries, index_pages), filetype="pdf")
+    for _, _, document in documents:
+        output.insert_pdf(document)
+        document.close()
+
+    # PDF bookmarks, so viewers can jump between songs
+    output.set_toc([[1, f"{number}. {song_title}", page] for number, song_title, page in entries])
+
+    data = output.tobytes(garbage=3, deflate=True)
+    output.close()
+    return data
+
+
+class ExportCache:
+    """Finished exports on disk, keyed by export_cache_key"""
+
+    def __init__(self, directory: str = EXPORT_CACHE_DIR, max_files: int = EXPORT_CACHE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[Path]:
+        path = self.path_for(key)
+        if not path.exists():
+            return None
+        # Refresh mtime so pruning evicts the least recently used exports
+        os.utime(path)
+        return path
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Write atomically, so concurrent readers never see a partial file"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.pdf"), key=lambda p: p.stat().st_mtime)
+        for stale in files[:max(0, len(files) - self.max_files)]:
+            stale.unlink(missing_ok=True)
+
+
+export_cache = ExportCache()
@@ -0,0 +1,274 @@
+"""
+Full-text song search for Kantik Tracks Studio
+In-process inverted index over song titles and the text of their chord and lyric PDFs
+"""
+
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from services.dates import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Resource types whose text is indexed
+SEARCHABLE_TYPES = ("CHORDS_PDF", "LYRICS_PDF")
+# Other processes' writes become visible after at most this long
+SEARCH_REFRESH_SECONDS = float(os.environ.get('SEARCH_REFRESH_SECONDS', 30))
+
+TITLE_WEIGHT = 3
+PHRASE_BOOST = 1.5
+SNIPPET_CHARS = 120
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: 'Père Éternel' -> 'pere eternel'"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+def extract_pdf_text(pdf_data: bytes) -> str:
+    """Plain text of every page, whitespace collapsed. Runs in a worker process."""
+    document = fitz.open(stream=pdf_data, filetype="pdf")
+    text = " ".join(page.get_text() for page in document)
+    document.close()
+    return " ".join(text.split())
+
+
+def make_snippet(text: str, query: str, terms: List[str], width: int = SNIPPET_CHARS) -> Optional[str]:
+    """
+    Window of `text` around the query phrase, or else its first matching term.
+    Matching is accent-folded; the snippet keeps the original spelling.
+    """
+    folded_chars = []
+    origin = []  # index in `text` of each folded character
+    for i, c in enumerate(text):
+        for f in fold(c):
+            folded_chars.append(f)
+            origin.append(i)
+    folded = "".join(folded_chars)
+
+    position = folded.find(" ".join(tokenize(query)))
+    if position < 0:
+        for term in terms:
+            match = re.search(r"\b" + re.escape(term), folded)
+            if match:
+                position = match.start()
+                break
+    if position < 0:
+        return None
+
+    center = origin[position]
+    start = max(0, center - width // 3)
+    end = min(len(text), start + width)
+    # Do not cut words in half
+    if start > 0:
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < center else start
+    if end < len(text):
+        space = text.rfind(" ", center, end)
+        end = space if space > center else end
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+
+class SongSearchIndex:
+    """
+    BM25 over title + PDF text, one entry per song.
+    Loaded from Mongo at startup, then kept current from `updatedAt` watermarks.
+    """
+
+    def __init__(self, refresh_seconds: float = SEARCH_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._docs: Dict[str, dict] = {}        # songId -> {"title", "number", "texts"}
+        self._terms: Dict[str, Counter] = {}    # songId -> weighted term frequencies
+        self._lengths: Dict[str, int] = {}
+        self._phrases: Dict[str, str] = {}      # songId -> folded tokens joined, for phrase matches
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> {songId: tf}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._total_length = 0
+        self._songs_synced: Optional[datetime] = None
+        self._texts_synced: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---- maintenance ----
+
+    def _reindex(self, song_id: str) -> None:
+        self._drop_postings(song_id)
+        doc = self._docs.get(song_id)
+        if not doc:
+            return
+        title_tokens = tokenize(doc["title"])
+        text_tokens = tokenize(" ".join(doc["texts"].values()))
+        terms = Counter(text_tokens)
+        for term in title_tokens:
+            terms[term] += TITLE_WEIGHT
+        self._phrases[song_id] = " ".join(title_tokens) + " | " + " ".join(text_tokens)
+        self._terms[song_id] = terms
+        self._lengths[song_id] = sum(terms.values())
+        self._total_length += self._lengths[song_id]
+        for term, tf in terms.items():
+            if term not in self._postings:
+                self._postings[term] = {}
+                self._vocabulary_dirty = True
+            self._postings[term][song_id] = tf
+
+    def _drop_postings(self, song_id: str) -> None:
+        for term in self._terms.pop(song_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(song_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary_dirty = True
+        self._total_length -= self._lengths.pop(song_id, 0)
+        self._phrases.pop(song_id, None)
+
+    def set_song(self, song_id: str, title: str, number: int) -> None:
+        doc = self._docs.setdefault(song_id, {"texts": {}})
+        doc.update(title=title, number=number)
+        self._reindex(song_id)
+
+    def set_text(self, song_id: str, resource_type: str, text: Optional[str]) -> None:
+        doc = self._docs.setdefault(song_id, {"title": "", "number": None, "texts": {}})
+        if text:
+            doc["texts"][resource_type] = text
+        else:
+            doc["texts"].pop(resource_type, None)
+        self._reindex(song_id)
+
+    def remove_song(self, song_id: str) -> None:
+        self._drop_postings(song_id)
+        self._docs.pop(song_id, None)
+
+    def mark_stale(self) -> None:
+        """Pick up local writes on the next search instead of waiting for the refresh interval"""
+        self._next_refresh = 0.0
+
+    async def refresh(self, db) -> None:
+        """Apply songs and texts changed since the last refresh"""
+        if time.monotonic() < self._next_refresh:
+            return
+        async with self._lock:
+            if time.monotonic() < self._next_refresh:
+                return
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+
+            song_query = {"updatedAt": {"$gte": self._songs_synced}} if self._songs_synced else {}
+            added = []
+            async for song in db.songs.find(song_query, {"_id": 0, "id": 1, "title": 1, "number": 1, "active": 1, "updatedAt": 1}):
+                if song.get("active", True):
+                    if song["id"] not in self._docs:
+                        added.append(song["id"])
+                    self.set_song(song["id"], song.get("title", ""), song.get("number"))
+                else:
+                    self.remove_song(song["id"])
+                # Unmigrated songs may still hold ISO strings; the watermark must be a date
+                # for the $gte above to match later edits, which are always stored as dates
+                updated_at = parse_datetime(song.get("updatedAt"))
+                if updated_at and (not self._songs_synced or updated_at > self._songs_synced):
+                    self._songs_synced = updated_at
+
+            text_query = {"updatedAt": {"$gte": self._texts_synced}} if self._texts_synced else {}
+            if text_query and added:
+                # New or reactivated songs need their older texts too
+                text_query = {"$or": [text_query, {"songId": {"$in": added}}]}
+            async for entry in db.song_texts.find(text_query, {"_id": 0}):
+                if entry["songId"] in self._docs:
+                    self.set_text(entry["songId"], entry["resourceType"], entry.get("text"))
+                updated_at = parse_datetime(entry.get("updatedAt"))
+                if updated_at and (not self._texts_synced or updated_at > self._texts_synced):
+                    self._texts_synced = updated_at
+
+    # ---- queries ----
+
+    def _expand(self, term: str) -> List[str]:
+        """Indexed terms starting with `term` (for the word still being typed)"""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        i = bisect_left(self._vocabulary, term)
+        expanded = []
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term) and len(expanded) < 50:
+            expanded.append(self._vocabulary[i])
+            i += 1
+        return expanded
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float, Optional[str]]]:
+        """Ranked (songId, score, snippet) for songs containing every query word"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        count = len(self._docs) or 1
+        average_length = (self._total_length / count) or 1
+        # A bare number is a hymn number first
+        number_matches = []
+        if query.strip().isdigit():
+            number = int(query)
+            number_matches = [song_id for song_id, doc in self._docs.items() if doc["number"] == number]
+
+        scores: Optional[Dict[str, float]] = None
+        matched_terms = []
+        for i, term in enumerate(terms):
+            # The last word may be incomplete: match it as a prefix
+            variants = self._expand(term) if i == len(terms) - 1 else [term]
+            term_scores: Dict[str, float] = {}
+            for variant in variants:
+                postings = self._postings.get(variant, {})
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for song_id, tf in postings.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[song_id] / average_length)
+                    score = idf * tf * (BM25_K1 + 1) / norm
+                    term_scores[song_id] = max(term_scores.get(song_id, 0.0), score)
+            matched_terms.extend(variants)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {song_id: s + term_scores[song_id] for song_id, s in scores.items() if song_id in term_scores}
+            if not scores:
+                break
+
+        phrase = " ".join(terms)
+        for song_id in scores:
+            if len(terms) > 1 and phrase in self._phrases[song_id]:
+                scores[song_id] *= PHRASE_BOOST
+        for song_id in number_matches:
+            scores[song_id] = scores.get(song_id, 0.0) + 100.0
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._docs[item[0]]["number"] or 0))[:limit]
+        results = []
+        for song_id, score in ranked:
+            doc = self._docs[song_id]
+            snippet = None
+            for text in doc["texts"].values():
+                snippet = make_snippet(text, query, matched_terms)
+                if snippet:
+                    break
+            results.append((song_id, round(score, 4), snippet))
+        return results
+
+
+song_search = SongSearchIndex()
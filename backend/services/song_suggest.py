@@ -0,0 +1,125 @@
+"""
+Song autocomplete for Kantik Tracks Studio
+In-process sorted-prefix index over hymn numbers and accent-folded titles
+"""
+
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from services.dates import parse_datetime
+from services.song_search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Other processes' writes become visible after at most this long
+SUGGEST_REFRESH_SECONDS = float(os.environ.get('SUGGEST_REFRESH_SECONDS', 30))
+SUGGEST_MAX_SCAN = 2000
+
+# Match kinds, best first
+EXACT_NUMBER, NUMBER_PREFIX, TITLE_PREFIX, WORD_PREFIX = range(4)
+
+
+class SongSuggestIndex:
+    """
+    Sorted (key, kind, number, songId) entries: the hymn number, the folded
+    title, and the title from each later word on, so 'rocher' finds
+    'Du rocher de Jacob'. A prefix lookup is a bisect plus a short scan.
+    """
+
+    def __init__(self, refresh_seconds: float = SUGGEST_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._entries: List[Tuple[str, int, int, str]] = []
+        self._songs: Dict[str, dict] = {}       # songId -> {"id", "number", "title", "language"}
+        self._keys: Dict[str, List[Tuple[str, int, int, str]]] = {}
+        self._synced: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._songs)
+
+    def __contains__(self, song_id: str) -> bool:
+        """Whether `song_id` is an active song, as of the last refresh"""
+        return song_id in self._songs
+
+    @staticmethod
+    def _song_entries(song_id: str, number: Optional[int], title: str) -> List[Tuple[str, int, int, str]]:
+        order = number if number is not None else 0
+        entries = []
+        if number is not None:
+            entries.append((str(number), NUMBER_PREFIX, order, song_id))
+        words = tokenize(title)
+        for i in range(len(words)):
+            entries.append((" ".join(words[i:]), TITLE_PREFIX if i == 0 else WORD_PREFIX, order, song_id))
+        return entries
+
+    def set_song(self, song_id: str, number: Optional[int], title: str, language: Optional[str] = None) -> None:
+        self.remove_song(song_id)
+        self._songs[song_id] = {"id": song_id, "number": number, "title": title, "language": language}
+        entries = self._song_entries(song_id, number, title)
+        self._keys[song_id] = entries
+        for entry in entries:
+            insort(self._entries, entry)
+
+    def remove_song(self, song_id: str) -> None:
+        for entry in self._keys.pop(song_id, ()):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        self._songs.pop(song_id, None)
+
+    def mark_stale(self) -> None:
+        """Pick up local writes on the next lookup instead of waiting for the refresh interval"""
+        self._next_refresh = 0.0
+
+    async def refresh(self, db) -> None:
+        """Apply songs changed since the last refresh"""
+        if time.monotonic() < self._next_refresh:
+            return
+        async with self._lock:
+            if time.monotonic() < self._next_refresh:
+                return
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+
+            query = {"updatedAt": {"$gte": self._synced}} if self._synced else {}
+            projection = {"_id": 0, "id": 1, "number": 1, "title": 1, "language": 1, "active": 1, "updatedAt": 1}
+            async for song in db.songs.find(query, projection):
+                if song.get("active", True):
+                    self.set_song(song["id"], song.get("number"), song.get("title", ""), song.get("language"))
+                else:
+                    self.remove_song(song["id"])
+                # Unmigrated songs may still hold ISO strings; keep the watermark a date
+                updated_at = parse_datetime(song.get("updatedAt"))
+                if updated_at and (not self._synced or updated_at > self._synced):
+                    self._synced = updated_at
+
+    def suggest(self, query: str, limit: int = 8) -> List[dict]:
+        """
+        Songs whose number or title starts with `query`, or with a title word
+        starting it: exact number first, then number prefixes, then titles,
+        each in hymn-number order.
+        """
+        prefix = " ".join(tokenize(query))
+        if not prefix:
+            return []
+        best: Dict[str, Tuple[int, int]] = {}
+        i = bisect_left(self._entries, (prefix,))
+        end = min(len(self._entries), i + SUGGEST_MAX_SCAN)
+        while i < end and self._entries[i][0].startswith(prefix):
+            key, kind, order, song_id = self._entries[i]
+            if kind == NUMBER_PREFIX and key == prefix:
+                kind = EXACT_NUMBER
+            rank = (kind, order)
+            if song_id not in best or rank < best[song_id]:
+                best[song_id] = rank
+            i += 1
+        ranked = sorted(best, key=lambda song_id: best[song_id])[:limit]
+        return [self._songs[song_id] for song_id in ranked]
+
+
+song_suggest = SongSuggestIndex()
@@ -0,0 +1,49 @@
+"""
+Transaction helper for Kantik Tracks Studio
+Runs multi-document writes atomically, with retry on transient errors
+"""
+
+import logging
+from typing import Awaitable, Callable, TypeVar
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# MongoDB "IllegalOperation" - returned by standalone servers for transactions
+ILLEGAL_OPERATION = 20
+
+# None until the first transaction tells us whether the deployment supports them
+_transactions_supported = None
+
+
+async def run_in_transaction(client, callback: Callable[..., Awaitable[T]]) -> T:
+    """
+    Run `callback(session)` inside a MongoDB transaction.
+
+    Motor's with_transaction retries the whole callback on TransientTransactionError
+    and the commit on UnknownTransactionCommitResult, so callbacks must only
+    perform database writes (no emails, no external side effects).
+    Exceptions raised by the callback abort the transaction and propagate.
+
+    Standalone servers (local development) have no transactions: the callback
+    then runs once with session=None.
+    """
+    global _transactions_supported
+
+    if _transactions_supported is False:
+        return await callback(None)
+
+    async with await client.start_session() as session:
+        try:
+            result = await session.with_transaction(callback)
+        except OperationFailure as e:
+            if e.code == ILLEGAL_OPERATION and _transactions_supported is None:
+                logger.warning("MongoDB transactions unavailable (standalone server), running writes without a transaction")
+                _transactions_supported = False
+                return await callback(None)
+            raise
+
+    _transactions_supported = True
+    return result
@@ -0,0 +1,103 @@
+"""
+Trending songs for Kantik Tracks Studio
+Exponentially time-decayed download scores, stored as logarithms and updated with one write per download
+"""
+
+import os
+import math
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from services.dates import utcnow
+
+logger = logging.getLogger(__name__)
+
+# A download counts half as much after this many days
+TRENDING_HALF_LIFE_DAYS = float(os.environ.get('TRENDING_HALF_LIFE_DAYS', 7))
+# Scores are stored relative to this instant
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+TRENDING_INDEX = [("active", 1), ("trendingLog", -1)]
+
+
+def download_log_weight(at: datetime, half_life_days: float = TRENDING_HALF_LIFE_DAYS) -> float:
+    """
+    log2 of the stored contribution of one download at `at`: its age since
+    the epoch in half-lives. Decaying every song's score by the same factor
+    does not change their order, so instead of decaying old downloads each
+    new one simply weighs more. The weights themselves (2^this) overflow a
+    float after about 1000 half-lives, so only their logarithm is stored.
+    """
+    return (at - TRENDING_EPOCH).total_seconds() / (half_life_days * 86400)
+
+
+def log_add(a: Optional[float], b: float) -> float:
+    """log2(2^a + 2^b) without leaving log space; `a` None is an empty score"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + math.pow(2.0, low - high))
+
+
+def current_score(
+    stored: Optional[float],
+    now: Optional[datetime] = None,
+    half_life_days: float = TRENDING_HALF_LIFE_DAYS
+) -> float:
+    """A stored log score expressed in downloads-equivalent as of `now`"""
+    if stored is None:
+        return 0.0
+    return math.pow(2.0, stored - download_log_weight(now or utcnow(), half_life_days))
+
+
+def trending_update(count: int = 1, at: Optional[datetime] = None) -> List[dict]:
+    """
+    Update pipeline for `count` downloads of one song: bumps downloadsCount
+    and folds the downloads into trendingLog with log_add, in one write.
+    """
+    weight = math.log2(count) + download_log_weight(at or utcnow())
+    high = {"$max": ["$trendingLog", weight]}
+    low = {"$min": ["$trendingLog", weight]}
+    return [{"$set": {
+        "downloadsCount": {"$add": [{"$ifNull": ["$downloadsCount", 0]}, count]},
+        "trendingLog": {"$cond": [
+            {"$eq": [{"$ifNull": ["$trendingLog", None]}, None]},
+            weight,
+            {"$add": [high, {"$log": [{"$add": [1, {"$pow": [2, {"$subtract": [low, high]}]}]}, 2]}]}
+        ]}
+    }}]
+
+
+async def recompute_trending(db, ctx=None) -> dict:
+    """
+    Rebuild every song's trendingLog from the downloads log, for songs that
+    predate trending scores or after changing the half-life.
+    """
+    scores: Dict[str, float] = {}
+    counted = 0
+    async for download in db.downloads.find({}, {"_id": 0, "songId": 1, "createdAt": 1}):
+        created_at = download.get("createdAt")
+        if not download.get("songId") or not isinstance(created_at, datetime):
+            continue
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        scores[download["songId"]] = log_add(scores.get(download["songId"]), download_log_weight(created_at))
+        counted += 1
+
+    song_ids = [song["id"] async for song in db.songs.find({}, {"_id": 0, "id": 1})]
+    if song_ids:
+        await db.songs.bulk_write(
+            # trendingScore held the linear scores of the first version
+            [
+                UpdateOne({"id": song_id}, {"$set": {"trendingLog": scores.get(song_id)}, "$unset": {"trendingScore": ""}})
+                for song_id in song_ids
+            ],
+            ordered=False
+        )
+    if ctx is not None:
+        await ctx.progress(len(song_ids), total=len(song_ids), downloads=counted)
+    logger.info(f"Recomputed trending scores for {len(song_ids)} songs from {counted} downloads")
+    return {"songs": len(song_ids), "downloads": counted}
@@ -0,0 +1,42 @@
+"""
+Worker processes for Kantik Tracks Studio
+CPU-heavy PDF work (merging, rendering, stamping) runs here instead of on the event loop
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 2))
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily start the shared process pool"""
+    global _pool
+    if _pool is None:
+        # spawn: workers never inherit the event loop or open Mongo sockets
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started PDF worker pool with {PDF_WORKERS} processes")
+    return _pool
+
+
+async def run_in_process(fn, *args):
+    """Run a picklable top-level function in the worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), fn, *args)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,86 @@
+"""
+Streaming ZIP archives for Kantik Tracks Studio
+Builds an archive member by member and hands out bytes as soon as each member is final
+"""
+
+import io
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+# Already-compressed formats are stored as-is; deflating them only burns CPU
+STORED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".zip", ".mp3", ".m4a")
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Write target for ZipFile that releases finished bytes through drain().
+    ZipFile seeks back to patch the local header of the member it just wrote;
+    that member is still buffered, so the archive is never held in full.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0  # absolute position of _buffer[0]
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos = self._offset + len(self._buffer)
+        if pos < self._offset:
+            raise io.UnsupportedOperation("Cannot seek into data that was already streamed")
+        self._pos = pos
+        return pos
+
+    def write(self, data) -> int:
+        start = self._pos - self._offset
+        self._buffer[start:start + len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Return and forget everything before the current position"""
+        cut = self._pos - self._offset
+        data = bytes(self._buffer[:cut])
+        del self._buffer[:cut]
+        self._offset = self._pos
+        return data
+
+
+def _zip_info(name: str, modified: Optional[datetime]) -> zipfile.ZipInfo:
+    date_time = (modified or datetime(1980, 1, 1)).timetuple()[:6]
+    info = zipfile.ZipInfo(name, date_time=date_time)
+    stored = name.lower().endswith(STORED_EXTENSIONS)
+    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    return info
+
+
+async def stream_zip(members: AsyncIterator[Tuple[str, bytes, Optional[datetime]]]) -> AsyncIterator[bytes]:
+    """
+    Yield a ZIP archive of (name, data, modified) members.
+    Only one member is in memory at a time and nothing is written to disk.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        async for name, data, modified in members:
+            archive.writestr(_zip_info(name, modified), data)
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+def safe_member_name(*parts: str) -> str:
+    """Join path parts into a ZIP member name without separators sneaking in"""
+    cleaned = [str(part).replace("/", "-").replace("\\", "-").strip() or "_" for part in parts]
+    return "/".join(cleaned)
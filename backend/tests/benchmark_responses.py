@@ -0,0 +1,101 @@
+"""
+Benchmark for list response serialisation
+
+Times the work FastAPI does for a response_model (validate, dump to JSON
+types, jsonable_encoder, json.dumps) against services.fast_json with and
+without validation, for the songs, users and payments list endpoints.
+Not collected by pytest:
+
+    python tests/benchmark_responses.py --rows 1000 --repeat 20
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "kantik_benchmark")
+
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services import fast_json
+from services.fast_json import fast_response
+from services.dates import utcnow
+from server import SongResponse, UserResponse, PaymentResponse
+
+
+def sample_documents(rows: int):
+    now = utcnow()
+    songs = [{
+        "id": f"song-{i}", "number": i, "title": f"Cantique {i}", "language": "fr",
+        "keyOriginal": "G", "tempo": 90, "tags": ["louange", "adoration"], "accessTier": "STANDARD",
+        "active": True, "createdAt": now - timedelta(days=i), "updatedAt": now, "changedAt": now,
+        "downloadsCount": i * 3, "favoritesCount": i,
+        "resources": [{
+            "id": f"res-{i}-{kind}", "songId": f"song-{i}", "type": kind, "filename": f"{i}.pdf",
+            "contentType": "application/pdf", "size": 120000, "sha256": "0" * 64, "updatedAt": now
+        } for kind in ("CHORDS_PDF", "LYRICS_PDF")]
+    } for i in range(rows)]
+    users = [{
+        "id": f"user-{i}", "email": f"user{i}@example.com", "displayName": f"User {i}",
+        "passwordHash": "x" * 60, "plan": "STANDARD", "planExpiresAt": now, "role": "USER",
+        "isAdmin": False, "createdAt": now, "teamMemberCount": 0
+    } for i in range(rows)]
+    payments = [{
+        "id": f"pay-{i}", "uid": f"user-{i}", "userEmail": f"user{i}@example.com",
+        "planRequested": "STANDARD", "provider": "BANK", "bankName": "Unibank", "amount": 1500,
+        "currency": "HTG", "billingMonth": "2026-03", "reference": f"REF{i}", "status": "PENDING",
+        "createdAt": now
+    } for i in range(rows)]
+    return [("get_songs", SongResponse, songs), ("admin_get_users", UserResponse, users),
+            ("admin_get_payments", PaymentResponse, payments)]
+
+
+def time_call(function, repeat: int) -> float:
+    """Best wall time of `repeat` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'route':<20} {'response_model':>15} {'validated':>12} {'fast':>12} {'saved/row':>12}")
+    for route, model, documents in sample_documents(args.rows):
+        adapter = TypeAdapter(List[model])
+
+        def response_model_path():
+            content = adapter.dump_python(adapter.validate_python(documents), mode="json")
+            return JSONResponse(jsonable_encoder(content)).body
+
+        def validated_path():
+            return fast_response(documents, model, route).body
+
+        def fast_path():
+            fast_json.SKIP_RESPONSE_VALIDATION.add(route)
+            try:
+                return fast_response(documents, model, route).body
+            finally:
+                fast_json.SKIP_RESPONSE_VALIDATION.discard(route)
+
+        baseline = time_call(response_model_path, args.repeat)
+        validated = time_call(validated_path, args.repeat)
+        fast = time_call(fast_path, args.repeat)
+        per_row = (baseline - fast) / args.rows * 1e6
+        print(f"{route:<20} {baseline * 1000:>12.1f} ms {validated * 1000:>9.1f} ms {fast * 1000:>9.1f} ms {per_row:>9.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Tests for catalog versions and ETags
+"""
+import pytest
+from unittest.mock import Mock, AsyncMock
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.catalog_cache import CatalogVersion, catalog_etag, etag_matches, trending_window, catalog_cache_headers
+
+
+class TestEtags:
+    """Test ETag construction and If-None-Match matching"""
+
+    def test_etag_depends_on_version_and_parts(self):
+        etag = catalog_etag(3, "songs", None, "fr")
+        assert etag.startswith('"c3-') and etag.endswith('"')
+        assert etag == catalog_etag(3, "songs", None, "fr")
+        assert etag != catalog_etag(4, "songs", None, "fr")
+        assert etag != catalog_etag(3, "songs", None, "ht")
+
+    def test_headers_vary_on_authorization(self):
+        headers = catalog_cache_headers('"c1-abc"')
+        assert headers["ETag"] == '"c1-abc"' and headers["Vary"] == "Authorization"
+
+    def test_trending_window(self):
+        assert trending_window(1000.0, seconds=300) == trending_window(1199.0, seconds=300)
+        assert trending_window(1200.0, seconds=300) == trending_window(1000.0, seconds=300) + 1
+
+    def test_if_none_match(self):
+        etag = catalog_etag(1, "featured")
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"c0-stale"', etag)
+
+
+@pytest.mark.asyncio
+class TestCatalogVersion:
+    """Test the cached version and bumps"""
+
+    async def test_fresh_version_needs_no_query(self):
+        db = Mock()
+        db.counters.find_one = AsyncMock(return_value={"_id": "catalog", "version": 7})
+        version = CatalogVersion(ttl_seconds=60)
+
+        assert await version.current(db) == 7
+        assert await version.current(db) == 7
+        db.counters.find_one.assert_awaited_once()
+
+    async def test_bump_updates_local_copy(self):
+        db = Mock()
+        db.counters.find_one_and_update = AsyncMock(return_value={"_id": "catalog", "version": 8})
+        db.counters.find_one = AsyncMock()
+        version = CatalogVersion(ttl_seconds=60)
+
+        assert await version.bump(db) == 8
+        assert await version.current(db) == 8
+        db.counters.find_one.assert_not_awaited()
+
+    async def test_expired_version_is_reread(self):
+        db = Mock()
+        db.counters.find_one = AsyncMock(side_effect=[None, {"version": 2}])
+        version = CatalogVersion(ttl_seconds=0)
+
+        assert await version.current(db) == 0
+        assert await version.current(db) == 2
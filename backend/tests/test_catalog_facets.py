@@ -0,0 +1,90 @@
+"""
+Tests for catalog facet counts
+"""
+import pytest
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.catalog_facets import song_filters, facet_pipeline, facet_counts, FacetCache
+
+
+SONGS = [
+    {"id": "1", "active": True, "language": "fr", "accessTier": "STANDARD", "tags": ["louange", "adoration"]},
+    {"id": "2", "active": True, "language": "fr", "accessTier": "PREMIUM", "tags": ["louange"]},
+    {"id": "3", "active": True, "language": "ht", "accessTier": "STANDARD", "tags": ["noel"]},
+    {"id": "4", "active": False, "language": "ht", "accessTier": "STANDARD", "tags": ["louange"]},
+]
+
+
+async def run_facets(filters):
+    db = AsyncMongoMockClient()["test"]
+    await db.songs.insert_many([dict(song) for song in SONGS])
+    results = await db.songs.aggregate(facet_pipeline({"active": True}, filters)).to_list(1)
+    return facet_counts(results[0] if results else None)
+
+
+class TestFilters:
+    """Test filter construction"""
+
+    def test_song_filters(self):
+        assert song_filters(None, None, None) == {}
+        assert song_filters("fr", "PREMIUM", "louange, noel") == {
+            "language": "fr", "accessTier": "PREMIUM", "tags": {"$in": ["louange", "noel"]}
+        }
+
+
+@pytest.mark.asyncio
+class TestFacetPipeline:
+    """Test counts from the aggregation"""
+
+    async def test_unfiltered(self):
+        counts = await run_facets({})
+        assert counts["total"] == 3
+        assert counts["language"] == [{"value": "fr", "count": 2}, {"value": "ht", "count": 1}]
+        assert counts["tags"][0] == {"value": "louange", "count": 2}
+
+    async def test_facet_ignores_its_own_filter(self):
+        counts = await run_facets(song_filters("fr", None, None))
+        assert counts["total"] == 2
+        # Language counts still offer the other language
+        assert {bucket["value"] for bucket in counts["language"]} == {"fr", "ht"}
+        assert counts["accessTier"] == [{"value": "PREMIUM", "count": 1}, {"value": "STANDARD", "count": 1}]
+        assert {bucket["value"] for bucket in counts["tags"]} == {"louange", "adoration"}
+
+    async def test_empty_result(self):
+        assert facet_counts(None) == {"language": [], "accessTier": [], "tags": [], "total": 0}
+
+
+class TestFacetCache:
+    """Test per-version caching"""
+
+    def test_hit_within_version(self):
+        cache = FacetCache()
+        assert cache.get(1, ("a",)) is None
+        cache.put(1, ("a",), {"total": 3})
+        assert cache.get(1, ("a",)) == {"total": 3}
+
+    def test_new_version_invalidates(self):
+        cache = FacetCache()
+        cache.get(1, ("a",))
+        cache.put(1, ("a",), {"total": 3})
+        assert cache.get(2, ("a",)) is None
+        # A result computed for an older version is not stored
+        cache.put(1, ("a",), {"total": 3})
+        assert cache.get(2, ("a",)) is None
+
+    def test_bounded(self):
+        cache = FacetCache(max_entries=2)
+        cache.get(1, ("a",))
+        for key in ("a", "b", "c"):
+            cache.put(1, (key,), {"total": 0})
+        assert cache.get(1, ("a",)) is None
+        assert cache.get(1, ("c",)) == {"total": 0}
@@ -0,0 +1,81 @@
+"""
+Tests for catalog CSV parsing and PDF matching
+"""
+import pytest
+import io
+import zipfile
+import sys
+import os
+from typing import List, Literal, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from services.catalog_import import parse_catalog_csv, match_pdf_members, pdf_member_type, song_changes
+
+
+class SongCreate(BaseModel):
+    """Mirror of the API model"""
+    number: int
+    title: str
+    language: Literal["fr", "ht"] = "fr"
+    keyOriginal: Optional[str] = None
+    tempo: Optional[int] = None
+    tags: List[str] = []
+    accessTier: Literal["STANDARD", "PREMIUM"] = "STANDARD"
+
+
+def make_zip(names) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, b"%PDF-1.4")
+    return zipfile.ZipFile(buffer)
+
+
+class TestParseCatalogCsv:
+    """Test row validation and header aliases"""
+
+    def test_valid_rows_with_aliases_and_tags(self):
+        csv_data = "﻿No,Titre,Lang,Key,Tags,Tier\n12,Ton nom soit à jamais béni,FR,E,adoration; bénédiction,premium\n".encode()
+        [row] = parse_catalog_csv(csv_data, SongCreate)
+        assert row["row"] == 2 and row["errors"] == []
+        assert row["song"]["number"] == 12
+        assert row["song"]["tags"] == ["adoration", "bénédiction"]
+        assert row["song"]["accessTier"] == "PREMIUM"
+
+    def test_invalid_and_duplicate_rows(self):
+        csv_data = b"number,title\nabc,Bad number\n3,Adorons\n3,Adorons again\n4,\n"
+        rows = parse_catalog_csv(csv_data, SongCreate)
+        assert [bool(row["song"]) for row in rows] == [False, True, False, False]
+        assert rows[0]["errors"][0].startswith("number:")
+        assert rows[2]["errors"] == ["Duplicate of row 3"]
+        assert rows[3]["errors"][0].startswith("title:")
+
+    def test_rejects_non_utf8(self):
+        with pytest.raises(ValueError):
+            parse_catalog_csv("number,title\n1,Chant à Dieu\n".encode("latin-1"), SongCreate)
+
+
+class TestMatchPdfMembers:
+    """Test matching archive members to song numbers"""
+
+    def test_matches_by_leading_number(self):
+        matches, unmatched = match_pdf_members(make_zip([
+            "chords/012.pdf", "12_lyrics.pdf", "7-chords.pdf", "notes.txt", "readme.pdf", "__MACOSX/._012.pdf", "012 copy.pdf"
+        ]))
+        assert matches[12]["CHORDS_PDF"].filename == "chords/012.pdf"
+        assert matches[12]["LYRICS_PDF"].filename == "12_lyrics.pdf"
+        assert matches[7]["CHORDS_PDF"].filename == "7-chords.pdf"
+        assert sorted(unmatched) == ["012 copy.pdf", "notes.txt", "readme.pdf"]
+
+    def test_member_type(self):
+        assert pdf_member_type("paroles/08-paroles.pdf") == "LYRICS_PDF"
+        assert pdf_member_type("08.pdf") == "CHORDS_PDF"
+
+
+def test_song_changes():
+    stored = {"title": "A", "language": "fr", "keyOriginal": "G", "tempo": None, "tags": ["x"], "accessTier": "STANDARD"}
+    assert song_changes(stored, dict(stored)) is None
+    assert song_changes(stored, {**stored, "keyOriginal": "A"}) == {"keyOriginal": "A"}
@@ -0,0 +1,123 @@
+"""
+Tests for response compression
+"""
+import pytest
+import gzip
+import sys
+import os
+
+import brotli
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.compression import CompressionMiddleware, CompressedBodyCache, negotiate_encoding
+
+
+BODY = b'[' + b','.join(b'{"id":"song-%d","title":"Cantique"}' % i for i in range(200)) + b']'
+
+
+def make_client(cache=None):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, cache=cache)
+
+    @app.get("/songs")
+    async def songs():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"c1-abc"', "Cache-Control": "public, max-age=0"})
+
+    @app.get("/small")
+    async def small():
+        return Response(b'{"ok":true}', media_type="application/json")
+
+    @app.get("/pdf")
+    async def pdf():
+        return Response(b"%PDF" + b"0" * 4096, media_type="application/pdf")
+
+    @app.get("/zip")
+    async def zip_stream():
+        async def chunks():
+            yield b"a" * 4096
+            yield b"b" * 4096
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    @app.get("/cached")
+    async def not_modified():
+        return Response(status_code=304, headers={"ETag": '"c1-abc"'})
+
+    return TestClient(app)
+
+
+class TestNegotiation:
+    """Test Accept-Encoding parsing"""
+
+    def test_prefers_brotli(self):
+        assert negotiate_encoding("gzip, deflate, br") == "br"
+
+    def test_quality_values(self):
+        assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+        assert negotiate_encoding("br;q=0, gzip;q=0") is None
+        assert negotiate_encoding("*") == "br"
+        assert negotiate_encoding("identity") is None
+
+
+class TestMiddleware:
+    """Test what gets compressed and how"""
+
+    @pytest.mark.parametrize("encoding,decompress", [("br", brotli.decompress), ("gzip", gzip.decompress)])
+    def test_compresses_json(self, encoding, decompress):
+        response = make_client().get("/songs", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == 'W/"c1-abc"'
+        assert int(response.headers["content-length"]) < len(BODY) / 4
+        # TestClient already decoded the body
+        assert response.content == BODY
+
+    def test_identity_when_not_accepted(self):
+        response = make_client().get("/songs", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] == '"c1-abc"'
+        assert response.content == BODY
+
+    def test_skips_small_and_binary(self):
+        client = make_client()
+        assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "br"}).headers
+        pdf = client.get("/pdf", headers={"Accept-Encoding": "br"})
+        assert "content-encoding" not in pdf.headers
+        assert "vary" not in pdf.headers
+
+    def test_streams_pass_through(self):
+        response = make_client().get("/zip", headers={"Accept-Encoding": "br"})
+        assert "content-encoding" not in response.headers
+        assert len(response.content) == 8192
+
+    def test_not_modified_gets_weak_etag(self):
+        response = make_client().get("/cached", headers={"Accept-Encoding": "br"})
+        assert response.status_code == 304
+        assert response.headers["etag"] == 'W/"c1-abc"'
+
+    def test_cacheable_bodies_compressed_once(self):
+        cache = CompressedBodyCache(max_entries=8)
+        client = make_client(cache)
+        client.get("/songs", headers={"Accept-Encoding": "br"})
+        key = ('"c1-abc"', "br", len(BODY))
+        cached = cache.get(key)
+        assert brotli.decompress(cached) == BODY
+        cache.put(key, brotli.compress(b"[]"))
+        assert client.get("/songs", headers={"Accept-Encoding": "br"}).content == b"[]"
+
+
+class TestCompressedBodyCache:
+    """Test LRU eviction"""
+
+    def test_evicts_least_recently_used(self):
+        cache = CompressedBodyCache(max_entries=2)
+        cache.put(("a", "br", 1), b"a")
+        cache.put(("b", "br", 1), b"b")
+        cache.get(("a", "br", 1))
+        cache.put(("c", "br", 1), b"c")
+        assert cache.get(("b", "br", 1)) is None
+        assert cache.get(("a", "br", 1)) == b"a"
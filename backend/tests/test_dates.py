@@ -0,0 +1,82 @@
+"""
+Tests for the date codec - BSON dates stored, ISO strings served
+"""
+import pytest
+from datetime import datetime, timezone, timedelta
+from unittest.mock import Mock, AsyncMock
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from typing import Optional
+from services.dates import (
+    IsoDatetime,
+    parse_datetime,
+    to_iso,
+    ensure_ttl_indexes,
+    TTL_INDEXES
+)
+
+
+class TestParseDatetime:
+    """Test coercion of stored timestamps"""
+
+    def test_parses_legacy_iso_string(self):
+        parsed = parse_datetime("2026-03-17T10:00:00+00:00")
+        assert parsed == datetime(2026, 3, 17, 10, 0, tzinfo=timezone.utc)
+
+    def test_parses_zulu_suffix(self):
+        parsed = parse_datetime("2026-03-17T10:00:00Z")
+        assert parsed.tzinfo is not None
+        assert parsed.hour == 10
+
+    def test_naive_datetime_assumed_utc(self):
+        parsed = parse_datetime(datetime(2026, 3, 17, 10, 0))
+        assert parsed.tzinfo == timezone.utc
+
+    def test_invalid_and_empty_values(self):
+        assert parse_datetime(None) is None
+        assert parse_datetime("") is None
+        assert parse_datetime("not-a-date") is None
+
+
+class TestIsoDatetime:
+    """Test that API output stays an ISO string"""
+
+    class Model(BaseModel):
+        createdAt: IsoDatetime
+        expiresAt: Optional[IsoDatetime] = None
+
+    def test_datetime_rendered_as_iso_string(self):
+        now = datetime(2026, 3, 17, 10, 0, tzinfo=timezone.utc)
+        model = self.Model(createdAt=now, expiresAt=now + timedelta(days=1))
+        assert model.createdAt == "2026-03-17T10:00:00+00:00"
+        assert model.expiresAt == "2026-03-18T10:00:00+00:00"
+
+    def test_legacy_string_passes_through(self):
+        model = self.Model(createdAt="2026-03-17T10:00:00+00:00")
+        assert model.createdAt == "2026-03-17T10:00:00+00:00"
+        assert model.expiresAt is None
+
+    def test_to_iso_ignores_non_datetimes(self):
+        assert to_iso(None) is None
+        assert to_iso("x") == "x"
+
+
+@pytest.mark.asyncio
+async def test_ensure_ttl_indexes_creates_declared_indexes():
+    """Test every TTL index declaration is applied"""
+    collection = Mock()
+    collection.create_index = AsyncMock()
+    db = {name: collection for name, _, _ in TTL_INDEXES}
+
+    await ensure_ttl_indexes(db)
+
+    assert collection.create_index.await_count == len(TTL_INDEXES)
+    collection.create_index.assert_any_await("expiresAt", expireAfterSeconds=0)
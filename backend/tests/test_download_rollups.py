@@ -0,0 +1,130 @@
+"""
+Tests for download rollups and retention
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services import transactions
+from services.download_rollups import (
+    bucket, rollup_counts, record_downloads, ensure_rollup_state, backfill_rollups,
+    reconcile_rollups, compact_downloads, analytics_pipeline, all_time_downloads
+)
+
+
+NOW = datetime(2026, 3, 15, 10, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def no_transactions():
+    # mongomock has no sessions; run_in_transaction falls back to plain writes
+    transactions._transactions_supported = False
+    yield
+    transactions._transactions_supported = None
+
+
+def event(song_id, at, resource_type="CHORDS_PDF", plan="STANDARD", uid="u1"):
+    return {"uid": uid, "songId": song_id, "resourceType": resource_type, "plan": plan, "createdAt": at}
+
+
+class TestCounting:
+    """Test bucket keys"""
+
+    def test_bucket(self):
+        at = datetime(2026, 3, 1, 1, 30, tzinfo=timezone(timedelta(hours=5)))
+        assert bucket(at, "day") == "2026-02-28"
+        assert bucket(at, "month") == "2026-02"
+
+    def test_rollup_counts(self):
+        counts = rollup_counts([event("a", NOW), event("a", NOW), {"songId": "a", "createdAt": NOW}])
+        assert counts[("day", "2026-03-15", "a", "CHORDS_PDF", "STANDARD")] == 2
+        assert counts[("month", "2026-03", "a", "CHORDS_PDF", "STANDARD")] == 2
+        assert counts[("day", "2026-03-15", "a", "", "UNKNOWN")] == 1
+
+
+@pytest.mark.asyncio
+class TestRollups:
+    """Test recording, backfill and analytics"""
+
+    async def test_record_and_query(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await record_downloads(db, [event("a", NOW), event("b", NOW, "LYRICS_PDF", "TEAM")])
+        await record_downloads(db, [event("a", NOW + timedelta(days=1))])
+        assert await db.downloads.count_documents({}) == 3
+        assert await all_time_downloads(db) == 3
+
+        pipeline = analytics_pipeline("day", "2026-03-01", "2026-03-31", "song")
+        facets = (await db.download_rollups.aggregate(pipeline).to_list(1))[0]
+        assert [(row["_id"], row["count"]) for row in facets["series"]] == [("2026-03-15", 2), ("2026-03-16", 1)]
+        assert [(row["_id"], row["count"]) for row in facets["breakdown"]] == [("a", 2), ("b", 1)]
+
+        pipeline = analytics_pipeline("month", "2026-03", "2026-03", "plan", {"resourceType": "LYRICS_PDF"})
+        facets = (await db.download_rollups.aggregate(pipeline).to_list(1))[0]
+        assert [(row["_id"], row["count"]) for row in facets["breakdown"]] == [("TEAM", 1)]
+
+    async def test_backfill_once(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.downloads.insert_many([
+            {"uid": "u1", "songId": "a", "resourceType": "CHORDS_PDF", "createdAt": NOW - timedelta(days=40)},
+            {"uid": "u1", "songId": "a", "resourceType": "CHORDS_PDF", "createdAt": NOW - timedelta(days=1)},
+        ])
+        state = await ensure_rollup_state(db, NOW)
+        assert state["backfilled"] is False
+        # Recorded after the deploy: already in the rollups
+        await record_downloads(db, [event("a", NOW + timedelta(hours=1))])
+
+        assert await backfill_rollups(db, None) == {"events": 2, "rollups": 4}
+        assert await all_time_downloads(db) == 3
+        assert "skipped" in await backfill_rollups(db, None)
+        assert (await ensure_rollup_state(db, NOW + timedelta(days=1)))["since"] == NOW
+
+    async def test_reconcile_repairs_missed_rollups(self, monkeypatch):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await ensure_rollup_state(db, NOW - timedelta(days=20))
+        await db.counters.update_one({"_id": "download_rollups"}, {"$set": {"backfilled": True}})
+        await record_downloads(db, [event("a", NOW - timedelta(days=20)), event("a", NOW - timedelta(days=1))])
+
+        # The rollup write fails after the events are in: the download still succeeds
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("rollups unavailable")
+        with monkeypatch.context() as patch:
+            patch.setattr(type(db.download_rollups), "bulk_write", unavailable)
+            await record_downloads(db, [event("a", NOW), event("b", NOW)])
+        assert await db.downloads.count_documents({}) == 4
+        assert await all_time_downloads(db) == 2
+
+        result = await reconcile_rollups(db, NOW + timedelta(hours=1))
+        assert result["events"] == 4
+        assert await all_time_downloads(db) == 4
+        months = {(row["bucket"], row["songId"]): row["count"] for row in await db.download_rollups.find({"period": "month"}).to_list(10)}
+        assert months == {("2026-02", "a"): 1, ("2026-03", "a"): 2, ("2026-03", "b"): 1}
+
+        # The next run starts from the last day it saw, not from the beginning
+        result = await reconcile_rollups(db, NOW + timedelta(hours=2))
+        assert result["events"] == 2 and result["from"].startswith("2026-03-15")
+        assert await all_time_downloads(db) == 4
+
+    async def test_compaction_keeps_latest_per_song(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await ensure_rollup_state(db, NOW)
+        old = NOW - timedelta(days=400)
+        await db.downloads.insert_many([
+            event("a", old), event("a", old + timedelta(days=1)), event("a", old + timedelta(days=2)),
+            event("b", old), event("a", NOW - timedelta(days=1)),
+        ])
+        assert "skipped" in await compact_downloads(db, NOW, retention_days=365)
+
+        await db.counters.update_one({"_id": "download_rollups"}, {"$set": {"backfilled": True}})
+        result = await compact_downloads(db, NOW, retention_days=365)
+        assert result["deleted"] == 2 and result["kept"] == 2
+        remaining = sorted((d["songId"], d["createdAt"]) for d in await db.downloads.find({}, {"_id": 0}).to_list(10))
+        assert remaining == [("a", old + timedelta(days=2)), ("a", NOW - timedelta(days=1)), ("b", old)]
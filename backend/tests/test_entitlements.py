@@ -0,0 +1,97 @@
+"""
+Tests for read-time team entitlement resolution
+"""
+import pytest
+from datetime import timedelta
+from unittest.mock import Mock, AsyncMock
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dates import utcnow
+from services.entitlements import (
+    TeamEntitlementCache,
+    apply_team_entitlement,
+    is_entitlement_active
+)
+
+
+def active_entitlement():
+    return {
+        "plan": "TEAM",
+        "planExpiresAt": utcnow() + timedelta(days=10),
+        "graceUntil": utcnow() + timedelta(days=13)
+    }
+
+
+class TestApplyTeamEntitlement:
+    """Test the overlay of team plans on members"""
+
+    def test_active_team_plan_overrides_member_plan(self):
+        member = {"id": "u1", "plan": "FREE", "teamId": "t1"}
+        effective = apply_team_entitlement(member, active_entitlement())
+        assert effective["plan"] == "TEAM"
+        assert is_entitlement_active(effective)
+        # The stored document is left untouched
+        assert member["plan"] == "FREE"
+
+    def test_lapsed_team_plan_keeps_member_plan(self):
+        member = {"id": "u1", "plan": "STANDARD", "teamId": "t1"}
+        lapsed = {
+            "plan": "TEAM",
+            "planExpiresAt": utcnow() - timedelta(days=10),
+            "graceUntil": utcnow() - timedelta(days=7)
+        }
+        assert apply_team_entitlement(member, lapsed)["plan"] == "STANDARD"
+
+    def test_missing_team(self):
+        member = {"id": "u1", "plan": "FREE"}
+        assert apply_team_entitlement(member, None) is member
+
+
+@pytest.mark.asyncio
+class TestTeamEntitlementCache:
+    """Test caching of per-team entitlement records"""
+
+    def make_db(self, team, owner=None):
+        db = Mock()
+        db.teams.find_one = AsyncMock(return_value=team)
+        db.users.find_one = AsyncMock(return_value=owner)
+        return db
+
+    async def test_second_read_is_served_from_cache(self):
+        team = {"ownerUid": "owner", **active_entitlement()}
+        db = self.make_db(team)
+        cache = TeamEntitlementCache()
+
+        first = await cache.get(db, "t1")
+        second = await cache.get(db, "t1")
+
+        assert first == second
+        assert first["plan"] == "TEAM"
+        assert db.teams.find_one.await_count == 1
+
+    async def test_invalidate_forces_reload(self):
+        db = self.make_db({"ownerUid": "owner", **active_entitlement()})
+        cache = TeamEntitlementCache()
+
+        await cache.get(db, "t1")
+        cache.invalidate("t1")
+        await cache.get(db, "t1")
+
+        assert db.teams.find_one.await_count == 2
+
+    async def test_legacy_team_falls_back_to_owner_plan(self):
+        owner = active_entitlement()
+        db = self.make_db({"ownerUid": "owner"}, owner=owner)
+        cache = TeamEntitlementCache()
+
+        entitlement = await cache.get(db, "t1")
+
+        assert entitlement["planExpiresAt"] == owner["planExpiresAt"]
+        db.users.find_one.assert_awaited_once()
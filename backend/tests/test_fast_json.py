@@ -0,0 +1,150 @@
+"""
+Tests for the fast JSON response path
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Literal
+from pydantic import BaseModel, ConfigDict
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dates import IsoDatetime
+from services import fast_json
+from services.fast_json import (
+    FastSerializer, fast_response, validation_enabled, parse_fields, field_projection, partial_model
+)
+
+
+# Same shapes as the response models in server.py
+class SongModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    number: int
+    title: str
+    keyOriginal: Optional[str] = None
+    tags: List[str] = []
+    accessTier: str
+    createdAt: IsoDatetime
+    downloadsCount: int = 0
+    resources: List[dict] = []
+
+
+class UserModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    plan: Literal["FREE", "STANDARD", "TEAM"] = "FREE"
+    planExpiresAt: Optional[IsoDatetime] = None
+    createdAt: IsoDatetime
+
+
+class PaymentModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    amount: float
+    reviewedAt: Optional[IsoDatetime] = None
+    createdAt: IsoDatetime
+
+
+NOW = datetime(2026, 3, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+SONG = {
+    "id": "s1", "number": 12, "title": "Grâce", "accessTier": "STANDARD",
+    "createdAt": NOW, "changedAt": NOW, "secret": "not in the model",
+    "resources": [{"id": "r1", "type": "CHORDS_PDF", "updatedAt": NOW, "size": 1024}]
+}
+USER = {"id": "u1", "passwordHash": "x", "planExpiresAt": NOW, "createdAt": "2025-01-02T03:04:05+00:00"}
+PAYMENT = {"id": "p1", "amount": 1500, "createdAt": NOW}
+
+
+@pytest.fixture
+def skip_validation():
+    fast_json.SKIP_RESPONSE_VALIDATION.add("*")
+    yield
+    fast_json.SKIP_RESPONSE_VALIDATION.discard("*")
+
+
+class TestValidationSwitch:
+    """Test per-route validation settings"""
+
+    def test_enabled_by_default(self):
+        assert validation_enabled("get_songs")
+
+    def test_named_route_and_wildcard(self):
+        fast_json.SKIP_RESPONSE_VALIDATION.add("get_songs")
+        try:
+            assert not validation_enabled("get_songs")
+            assert validation_enabled("admin_get_users")
+        finally:
+            fast_json.SKIP_RESPONSE_VALIDATION.discard("get_songs")
+
+    def test_validation_rejects_bad_documents(self):
+        with pytest.raises(Exception):
+            fast_response([{"id": "u1"}], UserModel, "admin_get_users")
+
+
+class TestParity:
+    """The fast path must produce the same bytes as validation"""
+
+    @pytest.mark.parametrize("model,document", [
+        (SongModel, SONG),
+        (UserModel, USER),
+        (PaymentModel, PAYMENT),
+    ])
+    def test_same_json(self, model, document):
+        validated = fast_response([document], model, "route").body
+        fast_json.SKIP_RESPONSE_VALIDATION.add("route")
+        try:
+            fast = fast_response([document], model, "route").body
+        finally:
+            fast_json.SKIP_RESPONSE_VALIDATION.discard("route")
+        assert fast == validated
+
+    def test_row_shape(self):
+        row = FastSerializer(SongModel).row(SONG)
+        assert "secret" not in row and "changedAt" not in row
+        assert row["createdAt"] == "2026-03-01T12:30:15.123000+00:00"
+        assert row["tags"] == [] and row["downloadsCount"] == 0 and row["keyOriginal"] is None
+
+    def test_amount_is_float(self, skip_validation):
+        assert b'"amount":1500.0' in fast_response([PAYMENT], PaymentModel, "route").body
+
+    def test_nested_datetimes_use_z(self, skip_validation):
+        body = fast_response([SONG], SongModel, "route").body
+        assert b'"updatedAt":"2026-03-01T12:30:15.123000Z"' in body
+
+    def test_headers_passed_through(self, skip_validation):
+        response = fast_response([], SongModel, "route", headers={"ETag": '"c1-x"'})
+        assert response.body == b"[]"
+        assert response.headers["etag"] == '"c1-x"'
+        assert response.media_type == "application/json"
+
+
+class TestFieldSelection:
+    """Test fields= parsing, projections and trimmed responses"""
+
+    def test_parse_fields(self):
+        assert parse_fields(None, SongModel) is None
+        assert parse_fields("title, number", SongModel) == ("id", "number", "title")
+        with pytest.raises(ValueError, match="passwordHash"):
+            parse_fields("email,passwordHash", UserModel)
+
+    def test_projection(self):
+        assert field_projection(None) == {"_id": 0}
+        assert field_projection(("id", "plan"), "teamId") == {"_id": 0, "id": 1, "plan": 1, "teamId": 1}
+
+    def test_trimmed_response_validates_and_converts(self):
+        fields = parse_fields("createdAt", SongModel)
+        validated = fast_response([SONG], SongModel, "route", fields=fields).body
+        fast_json.SKIP_RESPONSE_VALIDATION.add("route")
+        try:
+            fast = fast_response([SONG], SongModel, "route", fields=fields).body
+        finally:
+            fast_json.SKIP_RESPONSE_VALIDATION.discard("route")
+        assert validated == fast == b'[{"id":"s1","createdAt":"2026-03-01T12:30:15.123000+00:00"}]'
+
+    def test_partial_model_is_cached(self):
+        assert partial_model(UserModel, ("id", "plan")) is partial_model(UserModel, ("id", "plan"))
+        assert set(partial_model(UserModel, ("id", "plan")).model_fields) == {"id", "plan"}
@@ -0,0 +1,94 @@
+"""
+Tests for favourites and their counters
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+from services.favorites import favorite_song_ids, mark_favorites, apply_favorite_changes, recount_favorites, FAVORITES_INDEX
+
+
+NOW = datetime(2026, 3, 15, 10, 0, tzinfo=timezone.utc)
+
+
+async def make_db():
+    db = AsyncMongoMockClient(tz_aware=True)["test"]
+    await db.favorites.create_index(FAVORITES_INDEX, unique=True)
+    await db.songs.insert_many([{"id": song_id, "favoritesCount": 0} for song_id in ("a", "b", "c")])
+    await db.users.insert_many([{"id": "u1"}, {"id": "u2"}])
+    return db
+
+
+async def counts(db):
+    return {song["id"]: song["favoritesCount"] async for song in db.songs.find({}, {"_id": 0})}
+
+
+@pytest.mark.asyncio
+class TestFavorites:
+    """Test adding, removing and looking up favourites"""
+
+    async def test_add_and_remove_move_counters(self):
+        db = await make_db()
+        assert await apply_favorite_changes(db, "u1", ["a", "b", "a"], [], NOW) == {"added": 2, "removed": 0}
+        await apply_favorite_changes(db, "u2", ["a"], [], NOW)
+        assert await counts(db) == {"a": 2, "b": 1, "c": 0}
+
+        assert await apply_favorite_changes(db, "u1", ["c"], ["b", "missing"], NOW) == {"added": 1, "removed": 1}
+        assert await counts(db) == {"a": 2, "b": 0, "c": 1}
+        assert (await db.users.find_one({"id": "u1"}))["favoritesVersion"] == 2
+
+    async def test_repeats_are_no_ops(self):
+        db = await make_db()
+        await apply_favorite_changes(db, "u1", ["a"], [], NOW)
+        assert await apply_favorite_changes(db, "u1", ["a"], [], NOW) == {"added": 0, "removed": 0}
+        await apply_favorite_changes(db, "u1", [], ["a"], NOW)
+        assert await apply_favorite_changes(db, "u1", [], ["a"], NOW) == {"added": 0, "removed": 0}
+        assert await counts(db) == {"a": 0, "b": 0, "c": 0}
+        # Only real changes invalidate the user's cached listings
+        assert (await db.users.find_one({"id": "u1"}))["favoritesVersion"] == 2
+
+    async def test_concurrent_duplicate_still_counts_the_rest(self, monkeypatch):
+        db = await make_db()
+        collection_type = type(db.favorites)
+        original = collection_type.bulk_write
+
+        async def racing_bulk_write(self, ops, **kwargs):
+            if self.name != "favorites":
+                return await original(self, ops, **kwargs)
+            # Another request inserted "a" just before our upsert of it
+            await original(self, ops, **kwargs)
+            raise BulkWriteError({
+                "writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}],
+                "upserted": [{"index": 1, "_id": "x"}, {"index": 2, "_id": "y"}],
+            })
+
+        monkeypatch.setattr(collection_type, "bulk_write", racing_bulk_write)
+        assert await apply_favorite_changes(db, "u1", ["a", "b", "c"], [], NOW) == {"added": 2, "removed": 0}
+        assert await counts(db) == {"a": 0, "b": 1, "c": 1}
+
+    async def test_membership_lookup(self):
+        db = await make_db()
+        await apply_favorite_changes(db, "u1", ["a", "c"], [], NOW)
+        await apply_favorite_changes(db, "u2", ["b"], [], NOW)
+        assert await favorite_song_ids(db, "u1", ["a", "b", "c", "a"]) == {"a", "c"}
+        assert await favorite_song_ids(db, "u1", []) == set()
+
+        songs = mark_favorites([{"id": "a"}, {"id": "b"}], {"a"})
+        assert [song["isFavorite"] for song in songs] == [True, False]
+
+    async def test_recount(self):
+        db = await make_db()
+        await db.favorites.insert_many([{"uid": "u1", "songId": "a"}, {"uid": "u2", "songId": "a"}])
+        await db.songs.update_one({"id": "b"}, {"$set": {"favoritesCount": 5}})
+        await recount_favorites(db, ["a", "b"])
+        assert await counts(db) == {"a": 2, "b": 0, "c": 0}
@@ -0,0 +1,180 @@
+"""
+Tests for the background job queue
+"""
+import pytest
+from unittest.mock import Mock, AsyncMock
+import sys
+import os
+import asyncio
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+from services.jobs import JobQueue
+
+
+def make_queue(**jobs_methods):
+    queue = JobQueue(concurrency=1, lease_seconds=30)
+    queue.db = Mock()
+    queue.db.jobs = Mock(**{
+        "update_one": AsyncMock(),
+        "insert_one": AsyncMock(),
+        "find_one": AsyncMock(return_value=None),
+        "find_one_and_update": AsyncMock(return_value={"cancelRequested": False}),
+        **jobs_methods
+    })
+    return queue
+
+
+def make_job(attempts=1, max_attempts=3, job_type="render"):
+    return {"id": "job-1", "type": job_type, "payload": {"songId": "s1"}, "attempts": attempts, "maxAttempts": max_attempts}
+
+
+def last_update(queue):
+    filter_, update = queue.db.jobs.update_one.call_args.args
+    return filter_, update
+
+
+@pytest.mark.asyncio
+class TestRunJob:
+    """Test completion, retries and cancellation"""
+
+    async def test_success_records_result(self):
+        queue = make_queue()
+        queue.handler("render")(AsyncMock(return_value={"size": 10}))
+
+        await queue.run_job(make_job())
+
+        filter_, update = last_update(queue)
+        assert filter_ == {"id": "job-1", "leaseOwner": queue.worker_id}
+        assert update["$set"]["status"] == "succeeded"
+        assert update["$set"]["result"] == {"size": 10}
+        assert "expiresAt" in update["$set"]
+
+    async def test_failure_is_retried_with_backoff(self):
+        queue = make_queue()
+        queue.handler("render")(AsyncMock(side_effect=ValueError("bad pdf")))
+
+        await queue.run_job(make_job(attempts=2))
+
+        _, update = last_update(queue)
+        assert update["$set"]["status"] == "queued"
+        assert update["$set"]["error"] == "bad pdf"
+        assert (update["$set"]["runAt"] - update["$set"]["updatedAt"]).total_seconds() == 20
+
+    async def test_last_attempt_fails_the_job(self):
+        queue = make_queue()
+        queue.handler("render")(AsyncMock(side_effect=ValueError("bad pdf")))
+
+        await queue.run_job(make_job(attempts=3))
+
+        _, update = last_update(queue)
+        assert update["$set"]["status"] == "failed"
+
+    async def test_unknown_type_fails(self):
+        queue = make_queue()
+        await queue.run_job(make_job(job_type="nope"))
+        _, update = last_update(queue)
+        assert update["$set"]["status"] == "failed"
+
+    async def test_cancel_request_seen_at_progress(self):
+        queue = make_queue(find_one_and_update=AsyncMock(return_value={"cancelRequested": True}))
+
+        async def handler(job, ctx):
+            await ctx.progress(1, total=10)
+            raise AssertionError("should have been cancelled")
+
+        queue.handler("render")(handler)
+        await queue.run_job(make_job())
+
+        _, update = last_update(queue)
+        assert update["$set"]["status"] == "cancelled"
+
+    async def test_lost_lease_stops_the_handler(self):
+        # Another worker took the job over: the heartbeat no longer matches
+        queue = make_queue(find_one_and_update=AsyncMock(return_value=None))
+        steps = []
+
+        async def handler(job, ctx):
+            await ctx.progress(1)
+            steps.append("kept going")
+
+        queue.handler("render")(handler)
+        await queue.run_job(make_job())
+
+        assert steps == []
+        filter_, _ = last_update(queue)
+        # Only written if this worker still owns the lease
+        assert filter_["leaseOwner"] == queue.worker_id
+
+    async def test_failed_heartbeat_is_retried(self):
+        calls = []
+
+        async def heartbeat(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise AutoReconnect("blip")
+            return {"cancelRequested": False}
+
+        queue = make_queue(find_one_and_update=AsyncMock(side_effect=heartbeat))
+        queue.lease_seconds = 0.03
+
+        async def handler(job, ctx):
+            await asyncio.sleep(0.1)
+            return {"done": True}
+
+        queue.handler("render")(handler)
+        await queue.run_job(make_job())
+
+        assert len(calls) >= 2
+        _, update = last_update(queue)
+        assert update["$set"]["status"] == "succeeded"
+
+
+@pytest.mark.asyncio
+class TestWorkerLoop:
+    """Test that a worker slot outlives database errors"""
+
+    async def test_failed_finish_keeps_the_slot(self):
+        queue = make_queue(update_one=AsyncMock(side_effect=[AutoReconnect("blip"), None]))
+        queue.handler("render")(AsyncMock(return_value={}))
+        claims = [make_job(), make_job()]
+        queue.claim = AsyncMock(side_effect=lambda db: claims.pop(0) if claims else None)
+
+        queue.start(queue.db)
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if queue.db.jobs.update_one.await_count == 2:
+                break
+        try:
+            assert queue.db.jobs.update_one.await_count == 2
+            assert not queue._tasks[0].done()
+        finally:
+            await queue.stop()
+
+
+@pytest.mark.asyncio
+class TestEnqueue:
+    """Test deduplication of queued jobs"""
+
+    async def test_duplicate_returns_queued_job(self):
+        existing = {"id": "older", "status": "queued"}
+        queue = make_queue(
+            insert_one=AsyncMock(side_effect=DuplicateKeyError("activeKey")),
+            find_one=AsyncMock(return_value=existing)
+        )
+
+        job = await queue.enqueue(queue.db, "render", {"songId": "s1"}, dedupe_key="s1")
+
+        assert job == existing
+        queue.db.jobs.find_one.assert_awaited_once_with({"activeKey": "render:s1"}, {"_id": 0})
+
+    async def test_enqueue_wakes_workers(self):
+        queue = make_queue()
+        job = await queue.enqueue(queue.db, "render", priority=10)
+        assert job["status"] == "queued" and job["priority"] == 10
+        assert queue._wakeup.is_set()
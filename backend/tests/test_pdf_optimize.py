@@ -0,0 +1,55 @@
+"""
+Tests for upload-time PDF optimisation
+"""
+import io
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image
+from services.pdf_optimize import optimize_pdf
+
+
+def make_scanned_pdf(pixels: int) -> bytes:
+    """A one-page PDF with a `pixels`-wide noisy image drawn 4 inches wide"""
+    image = Image.effect_noise((pixels, pixels), 64).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_image(fitz.Rect(72, 72, 360, 360), stream=buffer.getvalue())
+    page.insert_text((72, 420), "Amazing Grace - G D Em C")
+    return document.tobytes()
+
+
+class TestOptimizePdf:
+    """Test image downsampling and the no-gain fallback"""
+
+    def test_oversized_images_are_downsampled(self):
+        original = make_scanned_pdf(1600)  # 400 dpi at 4 inches
+        optimized, stats = optimize_pdf(original, max_dpi=150)
+
+        assert stats["imagesDownsampled"] == 1
+        assert stats["originalSize"] == len(original)
+        assert stats["optimizedSize"] == len(optimized) < len(original)
+
+        document = fitz.open(stream=optimized, filetype="pdf")
+        xref = document[0].get_images()[0][0]
+        assert document.extract_image(xref)["width"] == 600
+        assert "Amazing Grace" in document[0].get_text()
+
+    def test_images_within_budget_are_kept(self):
+        original = make_scanned_pdf(400)  # 100 dpi
+        _, stats = optimize_pdf(original, max_dpi=150)
+        assert stats["imagesDownsampled"] == 0
+
+    def test_original_returned_when_nothing_gained(self):
+        document = fitz.open()
+        document.new_page()
+        original = document.tobytes(garbage=4, deflate=True)
+        optimized, stats = optimize_pdf(original)
+        assert optimized == original
+        assert stats["optimizedSize"] == len(original)
@@ -0,0 +1,46 @@
+"""
+Tests for playlist patch operations
+"""
+import pytest
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.playlist_ops import apply_playlist_ops, PlaylistOpError
+
+
+class TestApplyPlaylistOps:
+    """Test move / insert / remove semantics"""
+
+    def test_move_matches_drag_and_drop(self):
+        # Dragging "a" onto "c" puts it at c's index, like arrayMove
+        ops = [{"op": "move", "songId": "a", "index": 2}]
+        assert apply_playlist_ops(["a", "b", "c", "d"], ops) == ["b", "c", "a", "d"]
+
+    def test_ops_apply_in_order(self):
+        ops = [
+            {"op": "insert", "songId": "x", "index": 0},
+            {"op": "remove", "songId": "b"},
+            {"op": "move", "songId": "c", "index": 1},
+        ]
+        assert apply_playlist_ops(["a", "b", "c"], ops) == ["x", "c", "a"]
+
+    def test_insert_without_index_appends(self):
+        assert apply_playlist_ops(["a"], [{"op": "insert", "songId": "b"}]) == ["a", "b"]
+
+    def test_input_is_not_modified(self):
+        song_ids = ["a", "b"]
+        apply_playlist_ops(song_ids, [{"op": "remove", "songId": "a"}])
+        assert song_ids == ["a", "b"]
+
+    def test_duplicate_insert_rejected(self):
+        with pytest.raises(PlaylistOpError):
+            apply_playlist_ops(["a"], [{"op": "insert", "songId": "a"}])
+
+    def test_unknown_song_rejected(self):
+        with pytest.raises(PlaylistOpError):
+            apply_playlist_ops(["a"], [{"op": "move", "songId": "z", "index": 0}])
+        with pytest.raises(PlaylistOpError):
+            apply_playlist_ops(["a"], [{"op": "remove", "songId": "z"}])
@@ -0,0 +1,100 @@
+"""
+Tests for preview rendering and bulk regeneration
+"""
+import base64
+import hashlib
+import pytest
+from unittest.mock import Mock, AsyncMock
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from mongomock_motor import AsyncMongoMockClient
+from services import previews
+from services.previews import generate_pdf_preview, preview_resource, regenerate_previews
+
+
+def make_pdf(text: str) -> bytes:
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), text)
+    return document.tobytes()
+
+
+async def run_inline(fn, *args):
+    return fn(*args)
+
+
+def chords(song_id: str, pdf: bytes, hashed: bool = True) -> dict:
+    resource = {"id": f"{song_id}-chords", "songId": song_id, "type": "CHORDS_PDF", "data": base64.b64encode(pdf).decode()}
+    if hashed:
+        resource["sha256"] = hashlib.sha256(pdf).hexdigest()
+    return resource
+
+
+def test_preview_is_a_jpeg_of_preview_width():
+    from PIL import Image
+    import io
+    image = Image.open(io.BytesIO(generate_pdf_preview(make_pdf("Gloria"))))
+    assert image.format == "JPEG"
+    assert image.width == previews.PREVIEW_WIDTH
+
+
+@pytest.mark.asyncio
+class TestRegeneratePreviews:
+    """Test skipping, hash backfill and batched writes"""
+
+    @pytest.fixture(autouse=True)
+    def inline_workers(self, monkeypatch):
+        monkeypatch.setattr(previews, "run_in_process", run_inline)
+
+    async def make_db(self):
+        db = AsyncMongoMockClient()["test"]
+        fresh_pdf = make_pdf("fresh")
+        await db.resources.insert_many([
+            chords("01-fresh", fresh_pdf),
+            preview_resource("01-fresh", b"jpeg", hashlib.sha256(fresh_pdf).hexdigest()),
+            chords("02-changed", make_pdf("new chords")),
+            preview_resource("02-changed", b"jpeg", "old-hash"),
+            chords("03-legacy", make_pdf("legacy"), hashed=False),
+            chords("04-missing", make_pdf("no preview yet")),
+        ])
+        return db
+
+    async def test_only_stale_previews_are_rendered(self):
+        db = await self.make_db()
+        ctx = Mock(progress=AsyncMock())
+
+        result = await regenerate_previews(db, ctx, batch_size=2)
+
+        assert result["rendered"] == 3 and result["skipped"] == 1 and result["failed"] == 0
+        previews_by_song = {
+            p["songId"]: p async for p in db.resources.find({"type": "PREVIEW_IMAGE"})
+        }
+        assert len(previews_by_song) == 4
+        assert base64.b64decode(previews_by_song["01-fresh"]["data"]) == b"jpeg"
+        assert previews_by_song["02-changed"]["sourceSha256"] != "old-hash"
+
+        # Legacy upload got its hash backfilled
+        legacy = await db.resources.find_one({"id": "03-legacy-chords"})
+        assert legacy["sha256"] == previews_by_song["03-legacy"]["sourceSha256"]
+
+        # One progress report up front and one per batch
+        assert ctx.progress.await_count == 3
+        assert ctx.progress.await_args.kwargs["total"] == 3
+
+    async def test_second_run_skips_everything(self):
+        db = await self.make_db()
+        await regenerate_previews(db, Mock(progress=AsyncMock()))
+        result = await regenerate_previews(db, Mock(progress=AsyncMock()))
+        assert result["rendered"] == 0 and result["skipped"] == 4
+
+    async def test_force_renders_everything(self):
+        db = await self.make_db()
+        result = await regenerate_previews(db, Mock(progress=AsyncMock()), force=True)
+        assert result["rendered"] == 4
@@ -0,0 +1,106 @@
+"""
+Tests for co-occurrence recommendations
+"""
+import pytest
+import sys
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services import transactions
+from services.recommendations import add_basket, top_neighbours, next_run, rebuild_recommendations
+
+
+NOW = datetime(2026, 6, 10, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def no_transactions():
+    # mongomock has no sessions; run_in_transaction falls back to plain writes
+    transactions._transactions_supported = False
+    yield
+    transactions._transactions_supported = None
+
+
+class TestCounting:
+    """Test basket counting and normalisation"""
+
+    def test_add_basket(self):
+        counts = defaultdict(float)
+        add_basket(counts, ["b", "a", "c", "a"])
+        assert counts[("a", "a")] == 1
+        assert counts[("a", "b")] == counts[("a", "c")] == counts[("b", "c")] == 1
+        assert ("b", "a") not in counts
+
+    def test_top_neighbours_normalises_popularity(self):
+        counts = defaultdict(float)
+        for _ in range(3):
+            add_basket(counts, ["a", "b"])
+        for _ in range(10):
+            add_basket(counts, ["a", "popular"])
+            add_basket(counts, ["popular", "x"])
+            add_basket(counts, ["popular", "y"])
+        neighbours = top_neighbours(counts, top_k=5, min_support=2)
+        assert neighbours["b"][0]["songId"] == "a"
+        assert neighbours["b"][0]["score"] == pytest.approx(3 / (13 * 3) ** 0.5, abs=1e-4)
+        # Scores are symmetric and bounded by 1
+        assert {n["songId"] for n in neighbours["a"]} == {"b", "popular"}
+        assert all(0 < n["score"] <= 1 for songs in neighbours.values() for n in songs)
+
+    def test_min_support_and_top_k(self):
+        counts = defaultdict(float)
+        add_basket(counts, ["a", "b", "c", "d"])
+        assert top_neighbours(counts, min_support=2) == {}
+        assert len(top_neighbours(counts, top_k=2, min_support=1)["a"]) == 2
+
+    def test_next_run(self):
+        assert next_run(NOW, hour=3) == datetime(2026, 6, 11, 3, 0, tzinfo=timezone.utc)
+        assert next_run(NOW, hour=13) == datetime(2026, 6, 10, 13, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+class TestRebuild:
+    """Test the incremental rebuild"""
+
+    async def test_incremental_rebuild(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        yesterday = NOW - timedelta(days=1)
+        await db.downloads.insert_many([
+            {"uid": "u1", "songId": "a", "createdAt": yesterday},
+            {"uid": "u1", "songId": "b", "createdAt": yesterday},
+            {"uid": "u2", "songId": "a", "createdAt": yesterday},
+            {"uid": "u2", "songId": "b", "createdAt": yesterday},
+            # Today's sessions are not complete yet
+            {"uid": "u3", "songId": "a", "createdAt": NOW},
+            {"uid": "u3", "songId": "c", "createdAt": NOW},
+        ])
+        await db.playlists.insert_one({"songIds": ["a", "c", "d"]})
+
+        result = await rebuild_recommendations(db, None, now=NOW)
+        assert result["sessions"] == 2 and result["playlists"] == 1
+        pair = await db.song_pairs.find_one({"a": "a", "b": "b"})
+        assert pair["downloads"] == 2 and pair["playlists"] == 0
+        entry = await db.song_recommendations.find_one({"songId": "a"})
+        assert {n["songId"] for n in entry["neighbours"]} == {"b", "c", "d"}
+
+        # The next night reads only the new day; playlist edits replace their counts
+        await db.playlists.update_one({}, {"$set": {"songIds": ["b", "d"]}})
+        result = await rebuild_recommendations(db, None, now=NOW + timedelta(days=1))
+        assert result["sessions"] == 1
+        assert (await db.song_pairs.find_one({"a": "a", "b": "b"}))["downloads"] == 2
+        assert (await db.song_pairs.find_one({"a": "a", "b": "c"}))["downloads"] == 1
+        assert await db.song_pairs.find_one({"a": "a", "b": "d"}) is None
+        assert {n["songId"] for n in (await db.song_recommendations.find_one({"songId": "d"}))["neighbours"]} == {"b"}
+
+        # Running twice on the same day counts nothing again
+        result = await rebuild_recommendations(db, None, now=NOW + timedelta(days=1, hours=2))
+        assert result["sessions"] == 0
+        assert (await db.song_pairs.find_one({"a": "a", "b": "b"}))["downloads"] == 2
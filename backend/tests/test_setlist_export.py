@@ -0,0 +1,77 @@
+"""
+Tests for setlist PDF export
+"""
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from services.setlist_export import ExportCache, export_cache_key, merge_setlist_pdf
+
+
+def make_pdf(text: str, pages: int = 1) -> bytes:
+    document = fitz.open()
+    for _ in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 72), text)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+class TestMergeSetlistPdf:
+    """Test merged output layout"""
+
+    def test_cover_index_and_charts_in_order(self):
+        charts = [
+            (2, "Grand Dieu, nous te bénissons", make_pdf("chart two", pages=2)),
+            (3, "Adorons le Père", make_pdf("chart three")),
+        ]
+        merged = fitz.open(stream=merge_setlist_pdf("Dimanche", "2026-03-15", charts), filetype="pdf")
+
+        # Cover + one index page + 2 + 1 chart pages
+        assert merged.page_count == 5
+        assert "Dimanche" in merged[0].get_text()
+        assert "Adorons le Père" in merged[1].get_text()
+        assert "chart two" in merged[2].get_text()
+        assert "chart three" in merged[4].get_text()
+        # Bookmarks point at each song's first page
+        assert [entry[2] for entry in merged.get_toc()] == [3, 5]
+
+    def test_unreadable_chart_is_skipped(self):
+        charts = [(1, "Broken", b"not a pdf"), (2, "Good", make_pdf("good"))]
+        merged = fitz.open(stream=merge_setlist_pdf("Set", "", charts), filetype="pdf")
+        assert merged.page_count == 3
+
+
+class TestExportCache:
+    """Test cache keys and on-disk storage"""
+
+    def test_key_changes_with_chart_content(self):
+        playlist = {"id": "p1", "updatedAt": "2026-03-15T10:00:00+00:00", "name": "Set"}
+        songs = [{"id": "s1", "updatedAt": "2026-03-01T00:00:00+00:00"}]
+        key = export_cache_key(playlist, songs, [{"id": "r1", "sha256": "aaa"}], "2026-03-15")
+        assert key == export_cache_key(playlist, songs, [{"id": "r1", "sha256": "aaa"}], "2026-03-15")
+        assert key != export_cache_key(playlist, songs, [{"id": "r1", "sha256": "bbb"}], "2026-03-15")
+        assert key != export_cache_key(playlist, songs, [{"id": "r1", "sha256": "aaa"}], "2026-03-16")
+
+    def test_stamped_exports_are_per_subscriber(self):
+        playlist = {"id": "p1", "updatedAt": "2026-03-15T10:00:00+00:00", "name": "Set"}
+        songs = [{"id": "s1", "updatedAt": "2026-03-01T00:00:00+00:00"}]
+        resources = [{"id": "r1", "sha256": "aaa"}]
+        shared = export_cache_key(playlist, songs, resources, "2026-03-15")
+        mine = export_cache_key(playlist, songs, resources, "2026-03-15", subscriber="u1")
+        assert len({shared, mine, export_cache_key(playlist, songs, resources, "2026-03-15", subscriber="u2")}) == 3
+
+    def test_put_get_and_prune(self, tmp_path):
+        cache = ExportCache(directory=str(tmp_path), max_files=2)
+        assert cache.get("k1") is None
+
+        cache.put("k1", b"one")
+        assert cache.get("k1").read_bytes() == b"one"
+
+        cache.put("k2", b"two")
+        cache.put("k3", b"three")
+        assert len(list(tmp_path.glob("*.pdf"))) == 2
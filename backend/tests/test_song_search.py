@@ -0,0 +1,122 @@
+"""
+Tests for the full-text song search index
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timezone, timedelta
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from mongomock_motor import AsyncMongoMockClient
+from services.song_search import SongSearchIndex, extract_pdf_text, fold, make_snippet
+
+LYRICS = {
+    "01-grace": "Grâce infinie, ô doux Sauveur, tu m'as sauvé du péché",
+    "02-cieux": "Dans les cieux et sur la terre, il n'est aucun nom plus doux",
+    "03-berger": "L'Éternel est mon berger, je ne manquerai de rien",
+}
+
+
+def make_index() -> SongSearchIndex:
+    index = SongSearchIndex()
+    for number, (song_id, text) in enumerate(LYRICS.items(), start=1):
+        index.set_song(song_id, song_id.split("-")[1].title(), number)
+        index.set_text(song_id, "LYRICS_PDF", text)
+    return index
+
+
+class TestFolding:
+    """Test accent folding and text extraction"""
+
+    def test_fold(self):
+        assert fold("Père Éternel, ÇA") == "pere eternel, ca"
+
+    def test_extract_pdf_text(self):
+        document = fitz.open()
+        document.new_page().insert_text((72, 72), "Amazing   grace\nhow sweet")
+        assert extract_pdf_text(document.tobytes()) == "Amazing grace how sweet"
+
+
+class TestSearch:
+    """Test ranking, prefixes and snippets"""
+
+    def test_accent_insensitive_match_with_original_snippet(self):
+        results = make_index().search("eternel berger")
+        assert [song_id for song_id, _, _ in results] == ["03-berger"]
+        assert "L'Éternel est mon berger" in results[0][2]
+
+    def test_every_word_must_match(self):
+        assert make_index().search("doux sauveur")[0][0] == "01-grace"
+        assert make_index().search("doux berger") == []
+
+    def test_last_word_is_a_prefix(self):
+        assert make_index().search("pech")[0][0] == "01-grace"
+
+    def test_number_query(self):
+        assert make_index().search("2")[0][0] == "02-cieux"
+
+    def test_title_outranks_body(self):
+        index = make_index()
+        index.set_song("04-doux", "Doux", 4)
+        assert index.search("doux")[0][0] == "04-doux"
+
+    def test_text_replacement_drops_old_terms(self):
+        index = make_index()
+        index.set_text("01-grace", "LYRICS_PDF", "Amazing grace")
+        assert index.search("sauveur") == []
+        assert index.search("amazing")[0][0] == "01-grace"
+
+    def test_snippet_window_keeps_whole_words(self):
+        text = " ".join(["alleluia"] * 40 + ["gloire", "à", "Dieu"] + ["amen"] * 40)
+        snippet = make_snippet(text, "gloire a dieu", ["gloire"], width=60)
+        assert "gloire à Dieu" in snippet
+        assert snippet.startswith("…") and snippet.endswith("…")
+        assert all(word in ("…alleluia", "alleluia", "gloire", "à", "Dieu", "amen", "amen…") for word in snippet.split())
+
+
+@pytest.mark.asyncio
+class TestRefresh:
+    """Test loading from Mongo and incremental refresh"""
+
+    async def test_incremental_refresh(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        await db.songs.insert_many([
+            {"id": "01-a", "title": "Alpha", "number": 1, "active": True, "updatedAt": t0},
+            {"id": "02-b", "title": "Beta", "number": 2, "active": False, "updatedAt": t0},
+        ])
+        await db.song_texts.insert_one({"songId": "01-a", "resourceType": "CHORDS_PDF", "text": "gloire", "updatedAt": t0})
+
+        index = SongSearchIndex(refresh_seconds=0)
+        await index.refresh(db)
+        assert len(index) == 1
+        assert index.search("gloire")[0][0] == "01-a"
+
+        # Reactivated song brings its older text along
+        await db.song_texts.insert_one({"songId": "02-b", "resourceType": "CHORDS_PDF", "text": "hosanna", "updatedAt": t0})
+        await db.songs.update_one({"id": "02-b"}, {"$set": {"active": True, "updatedAt": t0 + timedelta(minutes=1)}})
+        await index.refresh(db)
+        assert index.search("hosanna")[0][0] == "02-b"
+
+    async def test_refresh_with_legacy_string_dates(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        await db.songs.insert_many([
+            {"id": "01-a", "title": "Alpha", "number": 1, "active": True, "updatedAt": "2025-12-01T00:00:00Z"},
+            {"id": "02-b", "title": "Beta", "number": 2, "active": True, "updatedAt": t0},
+        ])
+
+        index = SongSearchIndex(refresh_seconds=0)
+        await index.refresh(db)
+        assert len(index) == 2
+        assert index._songs_synced == t0
+
+        await db.songs.update_one({"id": "02-b"}, {"$set": {"title": "Gamma", "updatedAt": t0 + timedelta(minutes=1)}})
+        await index.refresh(db)
+        assert index.search("gamma")[0][0] == "02-b"
@@ -0,0 +1,109 @@
+"""
+Tests for song autocomplete
+"""
+import pytest
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.song_suggest import SongSuggestIndex
+
+
+def build_index():
+    index = SongSuggestIndex()
+    index.set_song("s1", 1, "À toi la gloire", "fr")
+    index.set_song("s12", 12, "Du rocher de Jacob", "fr")
+    index.set_song("s120", 120, "Rocher des siècles", "fr")
+    index.set_song("s21", 21, "Grâce étonnante", "fr")
+    return index
+
+
+class TestSuggest:
+    """Test prefix lookups and ranking"""
+
+    def test_number_exact_then_prefix(self):
+        ids = [song["id"] for song in build_index().suggest("12")]
+        assert ids == ["s12", "s120"]
+
+    def test_title_prefix_accent_folded(self):
+        assert [song["id"] for song in build_index().suggest("a to")] == ["s1"]
+        assert [song["id"] for song in build_index().suggest("grace et")] == ["s21"]
+
+    def test_title_prefix_before_later_word(self):
+        ids = [song["id"] for song in build_index().suggest("Roch")]
+        assert ids == ["s120", "s12"]
+
+    def test_limit_and_empty_query(self):
+        index = build_index()
+        assert len(index.suggest("r", limit=1)) == 1
+        assert index.suggest("  ") == []
+        assert index.suggest("zzz") == []
+
+    def test_update_and_remove(self):
+        index = build_index()
+        index.set_song("s12", 12, "Jésus est là", "fr")
+        assert [song["id"] for song in index.suggest("roch")] == ["s120"]
+        assert index.suggest("jesus")[0]["title"] == "Jésus est là"
+        index.remove_song("s12")
+        assert index.suggest("jesus") == []
+        assert [song["id"] for song in index.suggest("12")] == ["s120"]
+        assert len(index) == 3
+        assert "s120" in index and "s12" not in index
+
+    def test_lookup_is_fast(self):
+        index = SongSuggestIndex()
+        for number in range(1, 2001):
+            index.set_song(f"s{number}", number, f"Cantique de louange numéro {number}", "fr")
+        started = time.perf_counter()
+        for _ in range(100):
+            index.suggest("cantique de lou")
+        assert (time.perf_counter() - started) / 100 < 0.005
+
+
+@pytest.mark.asyncio
+class TestRefresh:
+    """Test incremental loading from Mongo"""
+
+    async def test_refresh_applies_changes(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        now = datetime.now(timezone.utc)
+        await db.songs.insert_many([
+            {"id": "a", "number": 1, "title": "Alléluia", "language": "fr", "active": True, "updatedAt": now},
+            {"id": "b", "number": 2, "title": "Béni soit", "language": "ht", "active": True, "updatedAt": now},
+        ])
+        index = SongSuggestIndex(refresh_seconds=3600)
+        await index.refresh(db)
+        assert len(index) == 2
+
+        later = now + timedelta(seconds=5)
+        await db.songs.update_one({"id": "a"}, {"$set": {"active": False, "updatedAt": later}})
+        await index.refresh(db)
+        assert len(index) == 2  # still within the refresh interval
+        index.mark_stale()
+        await index.refresh(db)
+        assert [song["id"] for song in index.suggest("al")] == []
+        assert index.suggest("beni")[0] == {"id": "b", "number": 2, "title": "Béni soit", "language": "ht"}
+
+    async def test_refresh_with_legacy_string_dates(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        now = datetime.now(timezone.utc)
+        await db.songs.insert_many([
+            {"id": "a", "number": 1, "title": "Alléluia", "language": "fr", "active": True, "updatedAt": "2025-12-01T00:00:00Z"},
+            {"id": "b", "number": 2, "title": "Béni soit", "language": "ht", "active": True, "updatedAt": now},
+        ])
+        index = SongSuggestIndex(refresh_seconds=0)
+        await index.refresh(db)
+        assert len(index) == 2
+
+        await db.songs.update_one({"id": "b"}, {"$set": {"title": "Gloire", "updatedAt": now + timedelta(seconds=5)}})
+        await index.refresh(db)
+        assert index.suggest("gloire")[0]["id"] == "b"
@@ -0,0 +1,79 @@
+"""
+Tests for the transaction helper
+"""
+import pytest
+from unittest.mock import Mock, AsyncMock, MagicMock
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import OperationFailure
+import services.transactions as transactions
+
+
+def make_client(with_transaction):
+    """Build a client mock whose session runs `with_transaction`"""
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    session.with_transaction = with_transaction
+    client = Mock()
+    client.start_session = AsyncMock(return_value=session)
+    return client, session
+
+
+@pytest.fixture(autouse=True)
+def reset_support_flag():
+    transactions._transactions_supported = None
+    yield
+    transactions._transactions_supported = None
+
+
+@pytest.mark.asyncio
+class TestRunInTransaction:
+    """Test transactional execution and the standalone fallback"""
+
+    async def test_runs_callback_with_session(self):
+        async def with_transaction(callback):
+            return await callback(session)
+
+        client, session = make_client(with_transaction)
+        callback = AsyncMock(return_value="done")
+
+        result = await transactions.run_in_transaction(client, callback)
+
+        assert result == "done"
+        callback.assert_awaited_once_with(session)
+        assert transactions._transactions_supported is True
+
+    async def test_falls_back_without_session_on_standalone(self):
+        async def with_transaction(callback):
+            raise OperationFailure("Transaction numbers are only allowed on a replica set member", code=20)
+
+        client, _ = make_client(with_transaction)
+        callback = AsyncMock(return_value="done")
+
+        result = await transactions.run_in_transaction(client, callback)
+
+        assert result == "done"
+        callback.assert_awaited_once_with(None)
+        assert transactions._transactions_supported is False
+
+        # Later calls skip the session entirely
+        await transactions.run_in_transaction(client, callback)
+        assert client.start_session.await_count == 1
+
+    async def test_callback_errors_propagate(self):
+        async def with_transaction(callback):
+            return await callback(session)
+
+        client, session = make_client(with_transaction)
+        callback = AsyncMock(side_effect=ValueError("boom"))
+
+        with pytest.raises(ValueError):
+            await transactions.run_in_transaction(client, callback)
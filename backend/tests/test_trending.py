@@ -0,0 +1,88 @@
+"""
+Tests for time-decayed trending scores
+"""
+import pytest
+import sys
+import os
+import math
+from datetime import datetime, timedelta, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.trending import download_log_weight, log_add, current_score, trending_update, recompute_trending
+
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+class TestWeights:
+    """Test decay arithmetic"""
+
+    def test_weight_doubles_every_half_life(self):
+        assert download_log_weight(NOW + timedelta(days=7), half_life_days=7) == pytest.approx(download_log_weight(NOW, half_life_days=7) + 1)
+
+    def test_current_score_decays(self):
+        stored = log_add(download_log_weight(NOW), download_log_weight(NOW - timedelta(days=7)))
+        assert current_score(stored, NOW) == pytest.approx(1.5)
+        assert current_score(stored, NOW + timedelta(days=7)) == pytest.approx(0.75)
+        assert current_score(None, NOW) == 0.0
+
+    def test_recent_downloads_outrank_old_favourites(self):
+        old_favourite = math.log2(40) + download_log_weight(NOW - timedelta(days=60))
+        recent = math.log2(3) + download_log_weight(NOW - timedelta(days=1))
+        assert recent > old_favourite
+
+    def test_no_overflow_far_from_epoch(self):
+        # Linear weights overflow a float after ~1000 half-lives
+        far = NOW + timedelta(days=3000)
+        stored = log_add(download_log_weight(far, half_life_days=1), download_log_weight(far, half_life_days=1))
+        assert current_score(stored, far, half_life_days=1) == pytest.approx(2.0)
+        with pytest.raises(OverflowError):
+            math.pow(2.0, download_log_weight(far, half_life_days=1))
+
+
+@pytest.mark.asyncio
+class TestUpdates:
+    """Test the stored score updates"""
+
+    async def test_update_pipeline_adds_in_log_space(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.songs.insert_many([{"id": "a", "trendingLog": None}, {"id": "b"}])
+        await db.songs.update_one({"id": "a"}, trending_update(1, NOW))
+        await db.songs.update_one({"id": "a"}, trending_update(3, NOW - timedelta(days=7)))
+        await db.songs.update_one({"id": "b"}, trending_update(2, NOW))
+
+        songs = {song["id"]: song async for song in db.songs.find({}, {"_id": 0})}
+        assert songs["a"]["downloadsCount"] == 4
+        assert current_score(songs["a"]["trendingLog"], NOW) == pytest.approx(2.5)
+        assert songs["b"]["downloadsCount"] == 2
+        assert current_score(songs["b"]["trendingLog"], NOW) == pytest.approx(2.0)
+
+
+@pytest.mark.asyncio
+class TestRecompute:
+    """Test rebuilding scores from the downloads log"""
+
+    async def test_recompute_from_downloads(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.songs.insert_many([{"id": "a"}, {"id": "b"}, {"id": "c", "trendingScore": 99.0}])
+        await db.downloads.insert_many([
+            {"songId": "a", "createdAt": NOW},
+            {"songId": "a", "createdAt": NOW - timedelta(days=7)},
+            {"songId": "b", "createdAt": NOW - timedelta(days=70)},
+            {"songId": "b", "createdAt": None},
+        ])
+        result = await recompute_trending(db)
+        assert result == {"songs": 3, "downloads": 3}
+
+        songs = {song["id"]: song async for song in db.songs.find({}, {"_id": 0})}
+        assert current_score(songs["a"]["trendingLog"], NOW) == pytest.approx(1.5)
+        assert songs["a"]["trendingLog"] > songs["b"]["trendingLog"]
+        assert songs["c"]["trendingLog"] is None
+        assert "trendingScore" not in songs["c"]
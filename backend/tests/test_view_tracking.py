@@ -0,0 +1,88 @@
+"""
+Tests for approximate unique-viewer tracking
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.view_tracking import HyperLogLog, ViewTracker, unique_viewers
+
+
+NOW = datetime(2026, 3, 15, 10, 0, tzinfo=timezone.utc)
+
+
+class TestHyperLogLog:
+    """Test the cardinality sketch"""
+
+    def test_small_counts_are_exact_enough(self):
+        sketch = HyperLogLog()
+        for i in range(50):
+            sketch.add(f"user-{i}")
+            sketch.add(f"user-{i}")
+        assert sketch.count() == pytest.approx(50, abs=2)
+
+    def test_large_counts_within_error(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"user-{i}")
+        assert sketch.count() == pytest.approx(20000, rel=0.1)
+
+    def test_merge_counts_union(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            a.add(f"user-{i}")
+        for i in range(2000, 5000):
+            b.add(f"user-{i}")
+        a.merge(b)
+        assert a.count() == pytest.approx(5000, rel=0.1)
+
+    def test_round_trip_registers(self):
+        sketch = HyperLogLog()
+        sketch.add("someone")
+        assert HyperLogLog(registers=bytes(sketch.registers)).count() == 1
+        with pytest.raises(ValueError):
+            HyperLogLog(registers=b"\x00" * 10)
+
+
+@pytest.mark.asyncio
+class TestViewTracker:
+    """Test in-memory recording and flushing"""
+
+    async def test_flush_merges_into_stored_sketch(self):
+        db = AsyncMongoMockClient(tz_aware=True)["test"]
+        tracker = ViewTracker()
+        for viewer in ("u1", "u2", "u1"):
+            tracker.record("a", viewer, NOW)
+        tracker.record("a", "u3", NOW + timedelta(days=1))
+        assert await tracker.flush(db) == 2
+        assert len(tracker) == 0
+
+        # Another process (or a later flush) with overlapping viewers
+        other = ViewTracker()
+        for viewer in ("u2", "u4"):
+            other.record("a", viewer, NOW)
+        await other.flush(db)
+
+        day = await db.song_views.find_one({"songId": "a", "day": "2026-03-15"})
+        assert day["views"] == 5 and day["rev"] == 2
+        assert HyperLogLog(registers=day["registers"]).count() == 3
+
+        assert await unique_viewers(db, "2026-03-15", "2026-03-16") == {"a": {"uniqueViewers": 4, "views": 6}}
+        assert await unique_viewers(db, "2026-03-16", "2026-03-16", "a") == {"a": {"uniqueViewers": 1, "views": 1}}
+
+    async def test_memory_bound_requests_flush(self):
+        tracker = ViewTracker(max_sketches=3)
+        for song in ("a", "b"):
+            tracker.record(song, "u1", NOW)
+        assert not tracker._flush_wanted.is_set()
+        tracker.record("c", "u1", NOW)
+        assert tracker._flush_wanted.is_set()
@@ -0,0 +1,57 @@
+"""
+Tests for per-subscriber PDF stamping
+"""
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from services import watermark
+from services.watermark import should_stamp, stamp_pdf
+
+
+def make_pdf(pages: int) -> bytes:
+    document = fitz.open()
+    for i in range(pages):
+        document.new_page().insert_text((72, 72), f"page {i + 1}")
+    return document.tobytes()
+
+
+class TestShouldStamp:
+    """Test the DOWNLOAD_WATERMARK modes"""
+
+    def test_modes(self):
+        pdf = {"type": "CHORDS_PDF", "contentType": "application/pdf"}
+        assert not should_stamp(pdf, "PREMIUM", mode="off")
+        assert should_stamp(pdf, "PREMIUM", mode="premium")
+        assert not should_stamp(pdf, "STANDARD", mode="premium")
+        assert should_stamp(pdf, "STANDARD", mode="all")
+
+    def test_images_are_never_stamped(self):
+        image = {"type": "PREVIEW_IMAGE", "contentType": "image/jpeg"}
+        assert not should_stamp(image, "PREMIUM", mode="all")
+
+
+class TestStampPdf:
+    """Test the worker-side stamping and document cache"""
+
+    def setup_method(self):
+        watermark._base_documents.clear()
+
+    def test_footer_on_every_page(self):
+        stamped = fitz.open(stream=stamp_pdf("k1", make_pdf(3), "Licensed to a@b.ht"), filetype="pdf")
+        assert stamped.page_count == 3
+        assert all("Licensed to a@b.ht" in page.get_text() for page in stamped)
+        assert "page 2" in stamped[1].get_text()
+
+    def test_cache_miss_without_data_returns_none(self):
+        assert stamp_pdf("missing", None, "footer") is None
+
+    def test_cached_base_document_is_reused(self):
+        stamp_pdf("k1", make_pdf(1), "first")
+        stamped = fitz.open(stream=stamp_pdf("k1", None, "second"), filetype="pdf")
+        text = stamped[0].get_text()
+        # Each copy only carries its own footer
+        assert "second" in text and "first" not in text
@@ -0,0 +1,59 @@
+"""
+Tests for streaming ZIP archives
+"""
+import io
+import zipfile
+import pytest
+import sys
+import os
+
+# Configure pytest-asyncio
+pytest_plugins = ('pytest_asyncio',)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.zip_stream import stream_zip, safe_member_name
+
+
+async def collect(members):
+    async def generate():
+        for member in members:
+            yield member
+    return [chunk async for chunk in stream_zip(generate())]
+
+
+@pytest.mark.asyncio
+class TestStreamZip:
+    """Test archive validity and chunking"""
+
+    async def test_archive_is_valid_and_streamed_per_member(self):
+        chunks = await collect([
+            ("01 - Song/chords.pdf", b"%PDF-1.4" * 500, None),
+            ("01 - Song/notes.txt", b"la la la " * 500, None),
+        ])
+
+        # One chunk per member plus the central directory
+        assert len(chunks) == 3
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        assert archive.testzip() is None
+        assert archive.read("01 - Song/notes.txt") == b"la la la " * 500
+
+    async def test_pdfs_stored_text_deflated(self):
+        chunks = await collect([
+            ("a.pdf", b"%PDF" * 100, None),
+            ("b.txt", b"text" * 100, None),
+        ])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        assert archive.getinfo("a.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("b.txt").compress_type == zipfile.ZIP_DEFLATED
+        # Sizes are in the local headers: no data descriptors needed
+        assert all(info.flag_bits & 0x08 == 0 for info in archive.infolist())
+
+    async def test_empty_archive(self):
+        chunks = await collect([])
+        assert zipfile.ZipFile(io.BytesIO(b"".join(chunks))).namelist() == []
+
+
+def test_safe_member_name():
+    assert safe_member_name("01 - AC/DC", "chords.pdf") == "01 - AC-DC/chords.pdf"
@@ -6,6 +6,9 @@ import { Music2, Download } from 'lucide-react';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+// Song fields a card renders, for listings that support ?fields=
+export const SONG_CARD_FIELDS = 'id,number,title,language,keyOriginal,tags,accessTier,resources';
+
 export const SongCard = ({ song }) => {
   const { t } = useLanguage();
   const [imageError, setImageError] = useState(false);
@@ -44,10 +44,13 @@ const translations = {
     downloadChords: 'Télécharger Accords PDF',
     downloadLyrics: 'Télécharger Paroles PDF',
     addToPlaylist: 'Ajouter à une Playlist',
+    addFavorite: 'Ajouter aux favoris',
+    removeFavorite: 'Retirer des favoris',
     key: 'Tonalité',
     tempo: 'Tempo',
     tags: 'Tags',
     relatedSongs: 'Chants Similaires',
+    usedTogether: 'Souvent utilisés ensemble',
     upgradeToDownload: 'Passez à un forfait supérieur pour télécharger',
     loginToDownload: 'Connectez-vous pour télécharger',
     
@@ -219,10 +222,13 @@ const translations = {
     downloadChords: 'Download Chords PDF',
     downloadLyrics: 'Download Lyrics PDF',
     addToPlaylist: 'Add to Playlist',
+    addFavorite: 'Add to favorites',
+    removeFavorite: 'Remove from favorites',
     key: 'Key',
     tempo: 'Tempo',
     tags: 'Tags',
     relatedSongs: 'Related Songs',
+    usedTogether: 'Often used together',
     upgradeToDownload: 'Upgrade your plan to download',
     loginToDownload: 'Login to download',
     
@@ -1,7 +1,7 @@
 import { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { useLanguage } from '../context/LanguageContext';
-import { SongCard } from '../components/SongCard';
+import { SongCard, SONG_CARD_FIELDS } from '../components/SongCard';
 import { Input } from '../components/ui/input';
 import { Button } from '../components/ui/button';
 import {
@@ -18,6 +18,7 @@ const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 export const Catalog = () => {
   const { t } = useLanguage();
   const [songs, setSongs] = useState([]);
+  const [facets, setFacets] = useState(null);
   const [loading, setLoading] = useState(true);
   const [search, setSearch] = useState('');
   const [language, setLanguage] = useState('');
@@ -31,10 +32,16 @@ export const Catalog = () => {
       if (search) params.append('search', search);
       if (language) params.append('language', language);
       if (accessTier) params.append('accessTier', accessTier);
+      const facetParams = new URLSearchParams(params);
       if (sort) params.append('sort', sort);
+      params.append('fields', SONG_CARD_FIELDS);
 
-      const response = await axios.get(`${API}/songs?${params.toString()}`);
+      const [response, facetResponse] = await Promise.all([
+        axios.get(`${API}/songs?${params.toString()}`),
+        axios.get(`${API}/songs/facets?${facetParams.toString()}`).catch(() => null)
+      ]);
       setSongs(response.data);
+      setFacets(facetResponse ? facetResponse.data : null);
     } catch (error) {
       console.error('Failed to fetch songs:', error);
     } finally {
@@ -46,6 +53,13 @@ export const Catalog = () => {
     fetchSongs();
   }, [fetchSongs]);
 
+  // "Français (34)" once facet counts are loaded
+  const withCount = (label, field, value) => {
+    if (!facets) return label;
+    const bucket = facets[field].find((b) => b.value === value);
+    return `${label} (${bucket ? bucket.count : 0})`;
+  };
+
   const handleSearch = (e) => {
     e.preventDefault();
     fetchSongs();
@@ -86,8 +100,8 @@ export const Catalog = () => {
                 </SelectTrigger>
                 <SelectContent className="bg-[#0F0F10] border-white/10">
                   <SelectItem value="all">{t('allLanguages')}</SelectItem>
-                  <SelectItem value="fr">{t('french')}</SelectItem>
-                  <SelectItem value="ht">{t('creole')}</SelectItem>
+                  <SelectItem value="fr">{withCount(t('french'), 'language', 'fr')}</SelectItem>
+                  <SelectItem value="ht">{withCount(t('creole'), 'language', 'ht')}</SelectItem>
                 </SelectContent>
               </Select>
 
@@ -97,8 +111,8 @@ export const Catalog = () => {
                 </SelectTrigger>
                 <SelectContent className="bg-[#0F0F10] border-white/10">
                   <SelectItem value="all">{t('allTiers')}</SelectItem>
-                  <SelectItem value="STANDARD">{t('standard')}</SelectItem>
-                  <SelectItem value="PREMIUM">{t('premium')}</SelectItem>
+                  <SelectItem value="STANDARD">{withCount(t('standard'), 'accessTier', 'STANDARD')}</SelectItem>
+                  <SelectItem value="PREMIUM">{withCount(t('premium'), 'accessTier', 'PREMIUM')}</SelectItem>
                 </SelectContent>
               </Select>
 
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
@@ -93,6 +93,10 @@ export const Playlists = () => {
   const [newPlaylistName, setNewPlaylistName] = useState('');
   const [newPlaylistType, setNewPlaylistType] = useState('USER');
 
+  // Version of the last write we saw, and the chain of pending writes
+  const playlistVersion = useRef(0);
+  const patchQueue = useRef(Promise.resolve());
+
   const sensors = useSensors(
     useSensor(PointerSensor),
     useSensor(KeyboardSensor, {
@@ -118,6 +122,7 @@ export const Playlists = () => {
   const fetchPlaylistDetail = async (playlistId) => {
     try {
       const response = await axios.get(`${API}/playlists/${playlistId}`);
+      playlistVersion.current = response.data.version || 0;
       setSelectedPlaylist(response.data);
     } catch (error) {
       console.error('Failed to fetch playlist:', error);
@@ -163,16 +168,44 @@ export const Playlists = () => {
     if (!selectedPlaylist) return;
     
     try {
-      await axios.delete(`${API}/playlists/${selectedPlaylist.id}/songs/${songId}`);
-      setSelectedPlaylist({
-        ...selectedPlaylist,
-        songs: selectedPlaylist.songs.filter(s => s.id !== songId),
-        songIds: selectedPlaylist.songIds.filter(id => id !== songId)
-      });
+      const response = await patchPlaylistSongs([{ op: 'remove', songId }]);
+      setSelectedPlaylist(current => ({
+        ...current,
+        songs: current.songs.filter(s => s.id !== songId),
+        songIds: response.data.songIds,
+        version: response.data.version
+      }));
       toast.success('Song removed');
     } catch (error) {
       console.error('Failed to remove song:', error);
-      toast.error('Failed to remove song');
+      handlePatchError(error, 'Failed to remove song');
+    }
+  };
+
+  // Send small move/insert/remove ops; the server rejects them with 409
+  // if someone else changed the playlist since our last write. Writes go
+  // one at a time, each with the version the previous one returned, so
+  // quick successive drags do not conflict with each other.
+  const patchPlaylistSongs = (ops) => {
+    const playlistId = selectedPlaylist.id;
+    const request = patchQueue.current.catch(() => {}).then(async () => {
+      const response = await axios.patch(`${API}/playlists/${playlistId}/songs`, {
+        version: playlistVersion.current,
+        ops
+      });
+      playlistVersion.current = response.data.version;
+      return response;
+    });
+    patchQueue.current = request;
+    return request;
+  };
+
+  const handlePatchError = (error, message) => {
+    if (error.response?.status === 409) {
+      toast.error('This playlist was changed by someone else. Reloaded the latest version.');
+      fetchPlaylistDetail(selectedPlaylist.id);
+    } else {
+      toast.error(message);
     }
   };
 
@@ -184,22 +217,26 @@ export const Playlists = () => {
       const newIndex = selectedPlaylist.songs.findIndex(s => s.id === over.id);
       
       const newSongs = arrayMove(selectedPlaylist.songs, oldIndex, newIndex);
-      const newSongIds = newSongs.map(s => s.id);
+      // songIds may also hold inactive songs, so target the position in songIds
+      const targetIndex = selectedPlaylist.songIds.indexOf(over.id);
       
       setSelectedPlaylist({
         ...selectedPlaylist,
         songs: newSongs,
-        songIds: newSongIds
+        songIds: arrayMove(selectedPlaylist.songIds, selectedPlaylist.songIds.indexOf(active.id), targetIndex)
       });
       
       // Update on server
       try {
-        await axios.put(`${API}/playlists/${selectedPlaylist.id}`, {
-          songIds: newSongIds
-        });
+        const response = await patchPlaylistSongs([{ op: 'move', songId: active.id, index: targetIndex }]);
+        setSelectedPlaylist(current => ({
+          ...current,
+          songIds: response.data.songIds,
+          version: response.data.version
+        }));
       } catch (error) {
         console.error('Failed to reorder:', error);
-        toast.error('Failed to save order');
+        handlePatchError(error, 'Failed to save order');
       }
     }
   };
@@ -13,7 +13,7 @@ import {
   DialogTrigger,
 } from '../components/ui/dialog';
 import { toast } from 'sonner';
-import { Music2, Download, Plus, ArrowLeft, Key, Clock, Tag, FileText, Lock, LogIn } from 'lucide-react';
+import { Music2, Download, Plus, ArrowLeft, Key, Clock, Tag, FileText, Lock, LogIn, Heart } from 'lucide-react';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -27,6 +27,7 @@ export const SongDetail = () => {
   const [downloading, setDownloading] = useState(false);
   const [playlistDialogOpen, setPlaylistDialogOpen] = useState(false);
   const [relatedSongs, setRelatedSongs] = useState([]);
+  const [relatedTitle, setRelatedTitle] = useState('relatedSongs');
   const [previewUrl, setPreviewUrl] = useState(null);
   const [previewLoading, setPreviewLoading] = useState(true);
   const [previewError, setPreviewError] = useState(false);
@@ -37,9 +38,17 @@ export const SongDetail = () => {
       const response = await axios.get(`${API}/songs/${id}`);
       setSong(response.data);
 
-      if (response.data.tags && response.data.tags.length > 0) {
-        const relatedResponse = await axios.get(`${API}/songs?tags=${response.data.tags[0]}`);
+      // Songs often used together, else songs sharing the first tag
+      const recommended = await axios.get(`${API}/songs/${id}/recommendations`).catch(() => null);
+      if (recommended && recommended.data.length > 0) {
+        setRelatedTitle('usedTogether');
+        setRelatedSongs(recommended.data.slice(0, 3));
+      } else if (response.data.tags && response.data.tags.length > 0) {
+        const relatedResponse = await axios.get(`${API}/songs?tags=${response.data.tags[0]}&fields=id,number,title`);
+        setRelatedTitle('relatedSongs');
         setRelatedSongs(relatedResponse.data.filter(s => s.id !== id).slice(0, 3));
+      } else {
+        setRelatedSongs([]);
       }
     } catch (error) {
       console.error('Failed to fetch song:', error);
@@ -100,20 +109,16 @@ export const SongDetail = () => {
 
     setDownloading(true);
     try {
-      const response = await axios.get(`${API}/songs/${id}/download/${resourceType}`);
-
-      const byteCharacters = atob(response.data.data);
-      const byteNumbers = new Array(byteCharacters.length);
-      for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
-      }
-      const byteArray = new Uint8Array(byteNumbers);
-      const blob = new Blob([byteArray], { type: response.data.contentType });
+      const response = await axios.get(`${API}/songs/${id}/download/${resourceType}`, {
+        params: { format: 'binary' },
+        responseType: 'blob'
+      });
+      const resource = song.resources?.find(r => r.type === resourceType);
 
-      const url = window.URL.createObjectURL(blob);
+      const url = window.URL.createObjectURL(response.data);
       const a = document.createElement('a');
       a.href = url;
-      a.download = response.data.filename;
+      a.download = resource?.filename || `${song.id}.pdf`;
       document.body.appendChild(a);
       a.click();
       window.URL.revokeObjectURL(url);
@@ -139,6 +144,18 @@ export const SongDetail = () => {
     }
   };
 
+  const handleToggleFavorite = async () => {
+    try {
+      const response = song.isFavorite
+        ? await axios.delete(`${API}/songs/${id}/favorite`)
+        : await axios.put(`${API}/songs/${id}/favorite`);
+      setSong({ ...song, isFavorite: response.data.isFavorite, favoritesCount: response.data.favoritesCount });
+    } catch (error) {
+      console.error('Failed to update favorite:', error);
+      toast.error('Failed to update favorites');
+    }
+  };
+
   const hasChordsPdf = song?.resources?.some(r => r.type === 'CHORDS_PDF');
   const hasLyricsPdf = song?.resources?.some(r => r.type === 'LYRICS_PDF');
 
@@ -324,6 +341,13 @@ export const SongDetail = () => {
                 </DialogContent>
               </Dialog>
             )}
+
+            {isAuthenticated && (
+              <Button className="btn-secondary" onClick={handleToggleFavorite} data-testid="favorite-btn">
+                <Heart className={`w-4 h-4 mr-2 ${song.isFavorite ? 'fill-[#D4AF37] text-[#D4AF37]' : ''}`} />
+                {song.isFavorite ? t('removeFavorite') : t('addFavorite')}
+              </Button>
+            )}
           </div>
         </div>
 
@@ -348,7 +372,7 @@ export const SongDetail = () => {
 
         {relatedSongs.length > 0 && (
           <div>
-            <h3 className="text-xl font-semibold mb-6">{t('relatedSongs')}</h3>
+            <h3 className="text-xl font-semibold mb-6">{t(relatedTitle)}</h3>
             <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
               {relatedSongs.map((relatedSong) => (
                 <Link
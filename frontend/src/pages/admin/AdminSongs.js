@@ -171,7 +171,7 @@ export const AdminSongs = () => {
     // Show loading toast for PDF uploads (preview generation)
     let loadingToast;
     if (resourceType === 'CHORDS_PDF') {
-      loadingToast = toast.loading('Uploading PDF and generating preview...');
+      loadingToast = toast.loading('Uploading PDF...');
     }
     
     try {
@@ -183,8 +183,8 @@ export const AdminSongs = () => {
         toast.dismiss(loadingToast);
       }
       
-      if (response.data.previewGenerated) {
-        toast.success('PDF uploaded and preview generated!');
+      if (response.data.previewJobId) {
+        toast.success('PDF uploaded! The preview is being generated.');
       } else {
         toast.success(`${resourceType.replace('_', ' ')} uploaded!`);
       }
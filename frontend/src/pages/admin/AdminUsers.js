@@ -57,7 +57,9 @@ export const AdminUsers = () => {
 
   const fetchUsers = async () => {
     try {
-      const response = await axios.get(`${API}/admin/users`);
+      const response = await axios.get(`${API}/admin/users`, {
+        params: { fields: 'id,email,displayName,plan,planExpiresAt,graceUntil,role,isAdmin,teamId' }
+      });
       setUsers(response.data);
     } catch (error) {
       console.error('Failed to fetch users:', error);